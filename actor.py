@@ -2,6 +2,7 @@
 
 import pygame
 import math
+import collections
 
 import common
 import serialize
@@ -18,6 +19,7 @@ class AlreadyMounted(Exception): """The actor was already mounted"""
 class NotMounted(Exception): """The actor was not mounted at all"""
 class PositionLocked(Exception): """The actor was locked in place"""
 class NoPhysicalConditions(Exception): """An actor was expected to have some physical conditions"""
+class ReadOnlyCollection(Exception): """The actor collection is shared and cannot be changed"""
 
 
 class PositionLock(object):
@@ -43,6 +45,10 @@ class Actor(common.Loggable, geometry.Rectangle, common.EventAware):
         serialize.O('lock', None, 'a lock object you can place to prevent an actor moving'),
     )
     
+    # The spatial and tag indexes of the world we are in - set by the world
+    _spatial_index = None
+    _actor_index = None
+    
     def __init__(self, tag, name=''):
         """Initialise the actor"""
         self.addLogger()
@@ -123,6 +129,8 @@ class Actor(common.Loggable, geometry.Rectangle, common.EventAware):
         
     def setLayerName(self, name):
         """Set the layer that we render to"""
+        if self._actor_index is not None:
+            self._actor_index.layerChanged(self, self.layer, name)
         self.layer = name
     
     def getLayerName(self):
@@ -140,7 +148,38 @@ class Actor(common.Loggable, geometry.Rectangle, common.EventAware):
                 coords = camera.getRelativeLocation(self)
             else: 
                 return # Cannot see me
-            self._visual.renderTo(interval, layer.getSurface(), coords)
+            layer.renderVisual(self._visual, interval, coords)
+    
+    def queueRender(self, queue, layer, camera, interval):
+        """Add our rendering to the render queue for our layer
+        
+        This is used instead of renderTo when the world batches the rendering
+        of the actors on a layer. Visuals that cannot be batched are rendered
+        directly after flushing the queue so that the order is kept.
+        
+        """
+        if self._visual:
+            if layer.static:
+                coords = self.getOrigin()
+            elif camera.canSee(self):
+                coords = camera.getRelativeLocation(self)
+            else: 
+                return # Cannot see me
+            layer.renderVisual(self._visual, interval, coords, queue)
+    
+    def getRenderState(self):
+        """Return a value that changes whenever the actor would render differently
+        
+        This is used by cached layers to tell when they need to be redrawn. Return
+        None if the state is not known and the actor must always be redrawn.
+        
+        """
+        if not self._visual:
+            return ()
+        state = self._visual.getRenderState()
+        if state is None:
+            return None
+        return (state,) + tuple(self.rect)
     
     def updateActor(self, interval, world):
         """Update the actor status"""
@@ -153,6 +192,11 @@ class Actor(common.Loggable, geometry.Rectangle, common.EventAware):
         """Called when we are being added to the world"""
         self.processEvent((events.E_ADDED_TO_WORLD, self))
         
+    def reset(self):
+        """Reset the actor so it can be used again (eg when it is taken from a pool)"""
+        self.active = True
+        self.visible = True
+        
     def setZoom(self, zoom):
         """Zoom in on this actor"""
         if self._visual:
@@ -233,9 +277,51 @@ class Actor(common.Loggable, geometry.Rectangle, common.EventAware):
             raise PositionLocked('The actor is locked in place: %s' % self.lock.reason)
         else:
             super(Actor, self).moveTo(x, y, override_lock=override_lock)
+            if self._spatial_index is not None:
+                self._spatial_index.updateItem(self)
             if not no_sync:
                 self.syncPhysics(spatial_only=True)
 
+    def setSpatial(self, x, y, w, h):
+        """Set the spatial details of ourself"""
+        super(Actor, self).setSpatial(x, y, w, h)
+        if self._spatial_index is not None:
+            self._spatial_index.updateItem(self)
+
+    def resizeBy(self, w, h):
+        """Resize the spatial by the given extent"""
+        super(Actor, self).resizeBy(w, h)
+        if self._spatial_index is not None:
+            self._spatial_index.updateItem(self)
+
+    def setSpatialIndex(self, index):
+        """Set the spatial index that tracks our location (None to stop tracking)"""
+        self._spatial_index = index
+
+    ### Tag and name ###
+
+    @property
+    def tag(self): return self._tag
+    @tag.setter
+    def tag(self, value):
+        """Set the tag for this actor"""
+        if self._actor_index is not None:
+            self._actor_index.tagChanged(self, self._tag, value)
+        self._tag = value
+
+    @property
+    def name(self): return self._name
+    @name.setter
+    def name(self, value):
+        """Set the name for this actor"""
+        if self._actor_index is not None:
+            self._actor_index.nameChanged(self, self._name, value)
+        self._name = value
+
+    def setActorIndex(self, index):
+        """Set the index that tracks our tag and name (None to stop tracking)"""
+        self._actor_index = index
+
 
 class ActorCollection(list):
     """A list of actors
@@ -297,6 +383,162 @@ class ActorCollection(list):
         """
         return ProxyLauncher(self)
 
+class FrozenActorCollection(ActorCollection):
+    """An actor collection that cannot be changed
+    
+    This is used for collections that are shared, like the cached actors
+    of a world. Create an ActorCollection from it if you need to change it.
+    
+    """
+    
+    def _readOnly(self, *args, **kw):
+        """We cannot be changed"""
+        raise ReadOnlyCollection('This collection is shared and cannot be changed - make a copy of it first')
+        
+    append = extend = insert = remove = pop = reverse = sort = _readOnly
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = __iadd__ = __imul__ = _readOnly
+    
+
+class ActorView(object):
+    """A live, read only view of a set of actors
+    
+    The view changes as actors are added to or removed from
+    the underlying set.
+    
+    """
+    
+    def __init__(self, actors):
+        """Initialise the view"""
+        self._actors = actors
+        
+    def __iter__(self):
+        """Iterate over the actors"""
+        return iter(self._actors)
+    
+    def __len__(self):
+        """Return the number of actors"""
+        return len(self._actors)
+    
+    def __contains__(self, actor):
+        """Return True if the actor is in the view"""
+        return actor in self._actors
+    
+    def getActors(self):
+        """Return a collection of the actors currently in the view"""
+        return ActorCollection(self._actors)
+
+
+class ActorIndex(object):
+    """An index of actors by their tag, name and layer
+    
+    The actors in the index tell it when their tag, name or layer
+    changes so the index is always up to date.
+    
+    """
+    
+    def __init__(self):
+        """Initialise the index"""
+        self._by_tag = {}
+        self._by_name = {}
+        self._by_layer = {}
+        # Changes whenever the actors with a tag change - used to tell when cached data is out of date
+        self.version = 0
+        
+    def clear(self):
+        """Remove all the actors"""
+        for actor in self.getActors():
+            actor.setActorIndex(None)
+        self._by_tag = {}
+        self._by_name = {}
+        self._by_layer = {}
+        self.version += 1
+        
+    def addActor(self, actor):
+        """Add an actor to the index"""
+        self.version += 1
+        self._by_tag.setdefault(actor.tag, set()).add(actor)
+        self._by_name.setdefault(actor.name, set()).add(actor)
+        self._by_layer.setdefault(actor.layer, collections.OrderedDict())[actor] = True
+        actor.setActorIndex(self)
+        
+    def removeActor(self, actor):
+        """Remove an actor from the index"""
+        self.version += 1
+        self._removeFrom(self._by_tag, actor.tag, actor, False)
+        self._removeFrom(self._by_name, actor.name, actor, True)
+        self._removeFromLayer(actor.layer, actor)
+        actor.setActorIndex(None)
+        
+    def _removeFrom(self, lookup, key, actor, remove_empty):
+        """Remove an actor from one of our lookups"""
+        actors = lookup.get(key)
+        if actors is not None:
+            actors.discard(actor)
+            #
+            # Tag sets are kept even when empty because views may be using them
+            if remove_empty and not actors:
+                del(lookup[key])
+                
+    def _removeFromLayer(self, layer, actor):
+        """Remove an actor from a layer bucket"""
+        actors = self._by_layer.get(layer)
+        if actors is not None:
+            actors.pop(actor, None)
+            if not actors:
+                del(self._by_layer[layer])
+        
+    def tagChanged(self, actor, old_tag, new_tag):
+        """Update the index when the tag of an actor changes"""
+        self.version += 1
+        self._removeFrom(self._by_tag, old_tag, actor, False)
+        self._by_tag.setdefault(new_tag, set()).add(actor)
+        
+    def nameChanged(self, actor, old_name, new_name):
+        """Update the index when the name of an actor changes"""
+        self._removeFrom(self._by_name, old_name, actor, True)
+        self._by_name.setdefault(new_name, set()).add(actor)
+        
+    def layerChanged(self, actor, old_layer, new_layer):
+        """Update the index when the layer of an actor changes"""
+        if old_layer != new_layer:
+            self._removeFromLayer(old_layer, actor)
+            self._by_layer.setdefault(new_layer, collections.OrderedDict())[actor] = True
+        
+    def getActors(self):
+        """Return all the actors in the index"""
+        actors = set()
+        for tagged in self._by_tag.itervalues():
+            actors.update(tagged)
+        return actors
+        
+    def getTagView(self, tag):
+        """Return a live view of the actors with the given tag"""
+        return ActorView(self._by_tag.setdefault(tag, set()))
+        
+    def findActorsByTag(self, tag):
+        """Return a collection of the actors with the given tag"""
+        return ActorCollection(self._by_tag.get(tag, ()))
+    
+    def findActorsByName(self, name):
+        """Return a collection of the actors with the given name"""
+        return ActorCollection(self._by_name.get(name, ()))
+    
+    def findActorByName(self, name):
+        """Return an actor with the given name or None if there isn't one"""
+        for actor in self._by_name.get(name, ()):
+            return actor
+        return None
+        
+    def getLayerNames(self):
+        """Return the names of the layers that have actors on them"""
+        return self._by_layer.keys()
+    
+    def getActorsOnLayer(self, layer):
+        """Return a list of the actors on a layer in the order they were added"""
+        actors = self._by_layer.get(layer)
+        return actors.keys() if actors else []
+
+
 class ProxyLauncher(object):
     
     def __init__(self, items):
@@ -521,34 +763,109 @@ class MountableActor(AbstractMountableActor):
     use this actor to create clusters either visually
     or functionally.
     
+    When the actor is in a world, moving or rotating it only marks
+    it as dirty. The mounted actors are moved and rotated once when the
+    world updates the transforms (after updating and before rendering)
+    or when you call updateTransforms.
+    
     """        
 
+    # Set when we have moved or rotated but our mounted actors have not followed
+    _transform_dirty = False
+    # Whether the pending moves and rotations should skip and sync the physics of our mounted actors
+    _pending_no_sync = False
+    _pending_sync_physical = False
+    # The angle that the offsets of our mounted actors are relative to
+    _mounted_angle = 0.0
+
+    def __init__(self, *args, **kw):
+        """Initialize the MountableActor"""
+        super(MountableActor, self).__init__(*args, **kw)
+        self._mounted_angle = self.angle
+
+    def init(self):
+        """Initialise from serialized form"""
+        super(MountableActor, self).init()
+        self._mounted_angle = self.angle
+
+    def mountActor(self, actor, (x, y), original_rotation=False, rotate_with_actor=True):
+        """Mount the actor with the given offset"""
+        self.updateTransforms()
+        if original_rotation and self.angle:
+            x, y = _rotateOffset(x, y, self.angle)
+            if rotate_with_actor:
+                actor.setAngle(self.angle)
+        return super(MountableActor, self).mountActor(actor, (x, y), False, rotate_with_actor)
+
+    def unmountActor(self, actor):
+        """Unmount the actor"""
+        self.updateTransforms()
+        super(MountableActor, self).unmountActor(actor)
+
+    def removedFromWorld(self, world):
+        """Called when we are being removed from the world"""
+        self.updateTransforms()
+        super(MountableActor, self).removedFromWorld(world)
+
     def moveTo(self, x, y, no_sync=False, override_lock=False):
         """Move this actor"""
         super(AbstractMountableActor, self).moveTo(x, y, no_sync=no_sync, override_lock=override_lock)
-        for actor, (dx, dy, rotate) in self._offsets.iteritems():
-            actor.moveTo(x+dx, y+dy, no_sync=no_sync, override_lock=True)
+        self._transformChanged(no_sync=no_sync)
             
     def setAngle(self, angle, sync_physical=False, override_lock=False):
         """Set the angle for the visual"""
         if self.lock and not override_lock:
             raise PositionLocked('Cannot rotate: %s' % self.lock.reason)
-        old_angle = self.getAngle()
         super(AbstractMountableActor, self).setAngle(angle, sync_physical=sync_physical, override_lock=override_lock)
+        self._transformChanged(sync_physical=sync_physical)
+
+    ### Transforms ###
+
+    def _transformChanged(self, no_sync=False, sync_physical=False):
+        """We moved or rotated - update the mounted actors now or when the world asks
+        
+        The physics of the mounted actors are only left alone if all the pending
+        moves asked for this and their angles are synced if any rotation asked.
+        
+        """
+        if self._transform_dirty:
+            self._pending_no_sync = self._pending_no_sync and no_sync
+            self._pending_sync_physical = self._pending_sync_physical or sync_physical
+        else:
+            self._transform_dirty = True
+            self._pending_no_sync = no_sync
+            self._pending_sync_physical = sync_physical
+            if self._world:
+                self._world.transformChanged(self)
+            else:
+                self.updateTransforms()
+
+    def updateTransforms(self):
+        """Move and rotate our mounted actors to follow us if we have changed"""
+        if not self._transform_dirty:
+            return
+        self._transform_dirty = False
+        no_sync, sync_physical = self._pending_no_sync, self._pending_sync_physical
+        x, y, angle = self.x, self.y, self.angle
+        #
+        # Rotate the offsets by the change in angle since we last updated
+        rotation = angle - self._mounted_angle
+        self._mounted_angle = angle
+        #
         for actor, (dx, dy, rotate) in self._offsets.iteritems():
-            if rotate:
+            if rotate and rotation:
+                dx, dy = _rotateOffset(dx, dy, rotation)
+                self._offsets[actor] = (dx, dy, rotate)
                 actor.setAngle(angle, sync_physical=sync_physical, override_lock=True)
-                #
-                # Now also rotate the position
-                off = pymunk.Vec2d(dx, dy)
-                off.rotate(math.radians(-(angle-old_angle))) # Pymunk's angles reversed compared to pygame
-                nx, ny = off
-                actor.moveTo(self.x + nx, self.y + ny, override_lock=True)
-                #
-                # Update the offsets so we stay in position
-                self._offsets[actor] = (nx, ny, rotate)
+            actor.moveTo(x+dx, y+dy, no_sync=no_sync, override_lock=True)
+            if isinstance(actor, MountableActor):
+                actor.updateTransforms()
 
-        
+
+def _rotateOffset(dx, dy, angle):
+    """Return an offset rotated by an angle in degrees (pygame's angles are reversed compared to pymunk)"""
+    c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    return dx*c + dy*s, dy*c - dx*s
 
 
 class PhysicallyMountableActor(AbstractMountableActor):
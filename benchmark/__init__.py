@@ -0,0 +1,11 @@
+"""Performance benchmarks for the engine
+
+The scenes module creates synthetic scenes from the real engine classes
+and the runner module runs them headless for a fixed number of frames,
+storing the results and comparing them against a baseline.
+
+Run the suite from the command line with,
+
+    python -m serge.benchmark.runner -o results.json -b baseline.json
+
+"""
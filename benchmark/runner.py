@@ -0,0 +1,182 @@
+"""Run the benchmark scenes and compare the results against a baseline"""
+
+import sys
+import time
+import json
+import platform
+from optparse import OptionParser
+
+if __name__ == '__main__':
+    #
+    # From the command line we never need a display or sound device - this must
+    # be set before the engine is imported. It is not set when we are imported
+    # so that it does not change the drivers for the rest of the process.
+    import os
+    os.environ.setdefault('SERGE_HEADLESS', '1')
+
+import serge.common
+import serge.engine
+import serge.render
+import serge.blocks.utils
+
+import scenes
+
+# Metrics are only flagged as regressions if they change by more than this many ms
+MIN_DIFFERENCE = 0.05
+
+
+def runScene(scene, frames=300, fps=60, display_mode=serge.render.D_OFFSCREEN, render_scale=1.0):
+    """Run a scene headless for a number of frames and return the results
+
+    :param scene: the scene to run
+    :param frames: the number of frames to run for
+    :param fps: the frame rate to simulate - each frame advances the simulation by 1/fps
+    :param display_mode: serge.render.D_OFFSCREEN to include rendering or D_NONE to only simulate
+    :param render_scale: the fraction of the screen resolution to render at
+
+    The sprites used by the scene are removed from the register afterwards.
+
+    """
+    engine = serge.engine.Engine(scenes.WIDTH, scenes.HEIGHT, 'Benchmark', display_mode=display_mode,
+        render_scale=render_scale)
+    serge.blocks.utils.createLayersForEngine(engine, scenes.LAYERS)
+    #
+    try:
+        start = time.time()
+        world = scene.createWorld(engine)
+        engine.setCurrentWorld(world)
+        setup_time = time.time() - start
+        #
+        start = time.time()
+        engine.run(fps, frames=frames)
+        run_time = time.time() - start
+    finally:
+        scenes.unregisterSprites()
+    #
+    stats = engine.getStats()
+    summary = stats.getPhaseSummary()
+    return {
+        'scene': scene.name,
+        'count': scene.count,
+        'frames': frames,
+        'setup_time': setup_time*1000.0,
+        'frame_time': run_time*1000.0/frames,
+        'hitches': stats.hitches,
+        'phases': dict([(name, {'mean': data['mean'], 'p95': data['p95'], 'max': data['max']})
+            for name, data in summary.iteritems()]),
+    }
+
+
+def runSuite(scene_list=None, frames=300, fps=60, display_mode=serge.render.D_OFFSCREEN, scale=1.0, log=None,
+        render_scale=1.0):
+    """Run a number of scenes and return the results keyed by scene
+
+    :param scene_list: a list of (scene class, count) to run (defaults to scenes.DEFAULT_SCENES)
+    :param scale: a factor to apply to the number of items in each scene
+    :param log: a file to write progress to
+    :param render_scale: the fraction of the screen resolution to render at
+
+    """
+    results = {}
+    for cls, count in (scene_list if scene_list is not None else scenes.DEFAULT_SCENES):
+        scene = cls(max(1, int(count*scale)))
+        result = results[scene.getKey()] = runScene(scene, frames, fps, display_mode, render_scale)
+        if log:
+            log.write('%-20s %8.3f ms/frame (setup %8.1f ms)\n' % (scene.getKey(), result['frame_time'], result['setup_time']))
+    #
+    return {
+        'version': serge.common.version,
+        'created': time.time(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'frames': frames,
+        'display_mode': display_mode,
+        'render_scale': render_scale,
+        'results': results,
+    }
+
+
+def saveResults(results, filename):
+    """Save the results to a file"""
+    with file(filename, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def loadResults(filename):
+    """Return results loaded from a file"""
+    with file(filename, 'r') as f:
+        return json.load(f)
+
+
+def compareResults(baseline, results, tolerance=0.1):
+    """Return a list of the regressions of the results against a baseline
+
+    A regression is when the frame time or the mean time of a phase is
+    more than the tolerance (a fraction) slower than the baseline. Scenes
+    that are not in the baseline are ignored.
+
+    The list contains (scene key, metric, baseline value, new value) tuples.
+
+    """
+    regressions = []
+    for key, result in sorted(results['results'].iteritems()):
+        try:
+            old = baseline['results'][key]
+        except KeyError:
+            continue
+        #
+        metrics = [('frame_time', old['frame_time'], result['frame_time'])]
+        for name, data in sorted(result['phases'].iteritems()):
+            if name in old['phases']:
+                metrics.append(('%s.mean' % name, old['phases'][name]['mean'], data['mean']))
+        #
+        for metric, old_value, new_value in metrics:
+            if new_value > old_value*(1.0 + tolerance) and new_value - old_value > MIN_DIFFERENCE:
+                regressions.append((key, metric, old_value, new_value))
+    #
+    return regressions
+
+
+def main(args=None):
+    """Run the benchmarks from the command line"""
+    parser = OptionParser()
+    parser.add_option("-o", "--output", dest="output", default='benchmark.json', type="str",
+                      help="file to write the results to")
+    parser.add_option("-b", "--baseline", dest="baseline", default='', type="str",
+                      help="baseline results file to compare against")
+    parser.add_option("-f", "--frames", dest="frames", default=300, type="int",
+                      help="number of frames to run each scene for")
+    parser.add_option("-s", "--scale", dest="scale", default=1.0, type="float",
+                      help="factor to scale the number of items in each scene by")
+    parser.add_option("-n", "--scenes", dest="scenes", default='', type="str",
+                      help="comma separated list of scenes to run (%s)" % ', '.join(sorted(scenes.SCENES)))
+    parser.add_option("-t", "--tolerance", dest="tolerance", default=0.1, type="float",
+                      help="fractional slowdown allowed before flagging a regression")
+    parser.add_option("-S", "--simulate", dest="simulate", default=False, action="store_true",
+                      help="only simulate - do not render")
+    parser.add_option("-r", "--render-scale", dest="render_scale", default=1.0, type="float",
+                      help="fraction of the screen resolution to render at")
+    (options, args) = parser.parse_args(args)
+    #
+    scene_list = scenes.DEFAULT_SCENES
+    if options.scenes:
+        names = options.scenes.split(',')
+        scene_list = [(cls, count) for cls, count in scenes.DEFAULT_SCENES if cls.name in names]
+    display_mode = serge.render.D_NONE if options.simulate else serge.render.D_OFFSCREEN
+    #
+    results = runSuite(scene_list, options.frames, display_mode=display_mode, scale=options.scale, log=sys.stdout,
+        render_scale=options.render_scale)
+    saveResults(results, options.output)
+    #
+    if options.baseline:
+        regressions = compareResults(loadResults(options.baseline), results, options.tolerance)
+        for key, metric, old_value, new_value in regressions:
+            sys.stdout.write('REGRESSION %-20s %-20s %8.3f -> %8.3f ms\n' % (key, metric, old_value, new_value))
+        if regressions:
+            return 1
+    #
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
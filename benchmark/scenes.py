@@ -0,0 +1,349 @@
+"""Synthetic scenes used to benchmark the engine
+
+Each scene builds a world using the real engine classes. The content
+of the scenes is generated from a fixed random seed so that every run
+of a scene does exactly the same work.
+
+"""
+
+import os
+import math
+import random
+import shutil
+import tempfile
+
+import pygame
+
+import serge.actor
+import serge.world
+import serge.zone
+import serge.visual
+import serge.physical
+import serge.blocks.tiled
+import serge.blocks.particles
+
+# The seed for all the random placements
+SEED = 1234
+
+# The size of the area that actors are placed in
+WIDTH = 800
+HEIGHT = 600
+
+# The layers that the scenes render to
+LAYERS = ('background', 'main', 'ui')
+
+# The size of the tiles in the tile map scene
+TILE_SIZE = 32
+TILE_TYPES = 4
+
+# The names of the sprites that the scenes use
+SPRITE_NAMES = ['bench-square', 'bench-ship'] + ['bench-tiles-%d' % (idx+1) for idx in range(TILE_TYPES)]
+
+
+def registerSprites():
+    """Register the sprites used by the scenes
+
+    The images are generated and saved to a temporary folder so that
+    the sprites go through the normal registration process. The folder
+    is removed once the sprites are loaded.
+
+    """
+    if serge.visual.Register.hasItem(SPRITE_NAMES[0]):
+        return
+    path = tempfile.mkdtemp(prefix='serge-benchmark-')
+    try:
+        _createSprites(path)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def unregisterSprites():
+    """Remove the sprites used by the scenes from the register"""
+    for name in SPRITE_NAMES:
+        if serge.visual.Register.hasItem(name):
+            serge.visual.Register.removeItem(name)
+
+
+def _createSprites(path):
+    """Create the images for the sprites in a folder and register them"""
+    #
+    # Simple square
+    square = pygame.Surface((16, 16), pygame.SRCALPHA, 32)
+    square.fill((255, 0, 0, 255))
+    pygame.image.save(square, os.path.join(path, 'square.png'))
+    #
+    # A ship that looks different when it is rotated
+    ship = pygame.Surface((32, 32), pygame.SRCALPHA, 32)
+    pygame.draw.polygon(ship, (0, 255, 0, 255), [(0, 0), (31, 16), (0, 31)])
+    pygame.image.save(ship, os.path.join(path, 'ship.png'))
+    #
+    # A sheet of tiles
+    tiles = pygame.Surface((TILE_SIZE*TILE_TYPES, TILE_SIZE), pygame.SRCALPHA, 32)
+    for idx in range(TILE_TYPES):
+        tiles.fill((0, 0, 64*idx, 255), (idx*TILE_SIZE, 0, TILE_SIZE, TILE_SIZE))
+    pygame.image.save(tiles, os.path.join(path, 'tiles.png'))
+    #
+    serge.visual.Register.registerItem('bench-square', os.path.join(path, 'square.png'))
+    serge.visual.Register.registerItem('bench-ship', os.path.join(path, 'ship.png'))
+    serge.visual.Register.registerMultipleItems(SPRITE_NAMES[2:], os.path.join(path, 'tiles.png'), TILE_TYPES)
+
+
+class MovingActor(serge.actor.Actor):
+    """An actor that moves with a constant velocity, wrapping around the scene"""
+
+    def __init__(self, tag, name, velocity):
+        """Initialise the MovingActor"""
+        super(MovingActor, self).__init__(tag, name)
+        self.velocity = velocity
+
+    def updateActor(self, interval, world):
+        """Update the actor position"""
+        vx, vy = self.velocity
+        self.moveTo((self.x + vx*interval/1000.0) % WIDTH, (self.y + vy*interval/1000.0) % HEIGHT)
+
+
+class RotatingActor(serge.actor.Actor):
+    """An actor that rotates at a constant rate"""
+
+    def __init__(self, tag, name, rate):
+        """Initialise the RotatingActor"""
+        super(RotatingActor, self).__init__(tag, name)
+        self.rate = rate
+
+    def updateActor(self, interval, world):
+        """Update the actor angle"""
+        self.setAngle((self.getAngle() + self.rate*interval/1000.0) % 360)
+
+
+class CounterActor(serge.actor.Actor):
+    """An actor showing text which changes every frame"""
+
+    def __init__(self, tag, name):
+        """Initialise the CounterActor"""
+        super(CounterActor, self).__init__(tag, name)
+        self.counter = 0
+        self.visual = serge.visual.Text('0', (255, 255, 255))
+
+    def updateActor(self, interval, world):
+        """Update the text"""
+        self.counter += 1
+        self.visual.setText(str(self.counter))
+
+
+class FountainEmitter(serge.blocks.particles.ParticleEmitter):
+    """A particle emitter that replaces its particles as soon as they expire"""
+
+    def __init__(self, tag, name, capacity, random):
+        """Initialise the FountainEmitter"""
+        super(FountainEmitter, self).__init__(tag, name, 'bench-square', 'main', capacity, gravity=(0, 100))
+        self.random = random
+
+    def updateActor(self, interval, world):
+        """Update the particles"""
+        super(FountainEmitter, self).updateActor(interval, world)
+        number = self.capacity - self.getNumberOfParticles()
+        if number:
+            self.emit(number,
+                [self.random.uniform(-100, 100) for idx in range(number)],
+                [self.random.uniform(-200, 0) for idx in range(number)],
+                [self.random.uniform(500, 3000) for idx in range(number)])
+
+
+class SwingingActor(serge.actor.MountableActor):
+    """A mountable actor that moves and rotates, taking its mounted actors with it"""
+
+    def __init__(self, tag, name, rate):
+        """Initialise the SwingingActor"""
+        super(SwingingActor, self).__init__(tag, name)
+        self.rate = rate
+        self.time = 0.0
+
+    def updateActor(self, interval, world):
+        """Update the actor position and angle"""
+        self.time += interval/1000.0
+        self.moveTo(self.x + math.cos(self.time), self.y + math.sin(self.time))
+        self.setAngle((self.getAngle() + self.rate*interval/1000.0) % 360)
+
+
+class Scene(object):
+    """A scene to benchmark
+
+    Subclasses implement populate to add actors to the world.
+
+    """
+
+    name = 'scene'
+    description = 'an empty scene'
+
+    def __init__(self, count):
+        """Initialise the Scene
+
+        :param count: the number of items in the scene
+
+        """
+        self.count = count
+        self.random = random.Random(SEED)
+
+    def getKey(self):
+        """Return the key to identify the results of this scene"""
+        return '%s-%d' % (self.name, self.count)
+
+    def createWorld(self, engine):
+        """Create the world for the scene in the engine"""
+        registerSprites()
+        world = serge.world.World(self.getKey())
+        zone = serge.zone.Zone()
+        zone.active = True
+        zone.setSpatial(-WIDTH, -HEIGHT, 3*WIDTH, 3*HEIGHT)
+        world.addZone(zone)
+        engine.addWorld(world)
+        self.populate(engine, world)
+        return world
+
+    def populate(self, engine, world):
+        """Add the items in the scene to the world"""
+
+    def _randomPosition(self):
+        """Return a random position in the scene"""
+        return self.random.uniform(0, WIDTH), self.random.uniform(0, HEIGHT)
+
+    def _randomVelocity(self, speed=100):
+        """Return a random velocity"""
+        return self.random.uniform(-speed, speed), self.random.uniform(-speed, speed)
+
+
+class ActorScene(Scene):
+    """Plain actors with sprites moving around the scene"""
+
+    name = 'actors'
+    description = 'moving actors with sprites'
+
+    def populate(self, engine, world):
+        """Add the items in the scene to the world"""
+        for idx in range(self.count):
+            actor = MovingActor('actor', 'actor-%d' % idx, self._randomVelocity())
+            actor.setSpriteName('bench-square')
+            actor.setLayerName('main')
+            actor.moveTo(*self._randomPosition())
+            world.addActor(actor)
+
+
+class RotatingScene(Scene):
+    """Sprites rotating every frame"""
+
+    name = 'rotating'
+    description = 'actors with sprites rotating every frame'
+
+    def populate(self, engine, world):
+        """Add the items in the scene to the world"""
+        for idx in range(self.count):
+            actor = RotatingActor('rotating', 'rotating-%d' % idx, self.random.uniform(-180, 180))
+            actor.setSpriteName('bench-ship')
+            actor.setLayerName('main')
+            actor.moveTo(*self._randomPosition())
+            world.addActor(actor)
+
+
+class TextScene(Scene):
+    """Text actors that change every frame"""
+
+    name = 'text'
+    description = 'text actors updating their text every frame'
+
+    def populate(self, engine, world):
+        """Add the items in the scene to the world"""
+        for idx in range(self.count):
+            actor = CounterActor('text', 'text-%d' % idx)
+            actor.setLayerName('ui')
+            actor.moveTo(*self._randomPosition())
+            world.addActor(actor)
+
+
+class PhysicsScene(Scene):
+    """Actors with physical bodies bouncing around"""
+
+    name = 'physics'
+    description = 'actors with pymunk bodies in a zone'
+
+    def populate(self, engine, world):
+        """Add the items in the scene to the world"""
+        for idx in range(self.count):
+            actor = serge.actor.Actor('ball', 'ball-%d' % idx)
+            actor.setSpriteName('bench-square')
+            actor.setLayerName('main')
+            actor.moveTo(*self._randomPosition())
+            actor.setPhysical(serge.physical.PhysicalConditions(
+                mass=1.0, radius=8.0, velocity=self._randomVelocity()))
+            world.addActor(actor)
+
+
+class MountedScene(Scene):
+    """Trees of mountable actors moved and rotated by their root"""
+
+    name = 'mounted'
+    description = 'deep trees of mounted actors'
+    depth = 5
+
+    def populate(self, engine, world):
+        """Add the items in the scene to the world"""
+        for tree in range(max(1, self.count // self.depth)):
+            root = parent = SwingingActor('root', 'root-%d' % tree, self.random.uniform(-90, 90))
+            root.setSpriteName('bench-ship')
+            root.setLayerName('main')
+            root.moveTo(*self._randomPosition())
+            for level in range(self.depth-1):
+                child = serge.actor.MountableActor('child', 'child-%d-%d' % (tree, level))
+                child.setSpriteName('bench-square')
+                child.setLayerName('main')
+                parent.mountActor(child, (16, 0))
+                parent = child
+            world.addActor(root)
+
+
+class TiledScene(Scene):
+    """A large tile map where each tile is an actor"""
+
+    name = 'tiled'
+    description = 'a large tile map with an actor for each tile'
+
+    def populate(self, engine, world):
+        """Add the items in the scene to the world"""
+        side = max(1, int(math.sqrt(self.count)))
+        tile_map = serge.blocks.tiled.TileMap()
+        tile_map.tilesets = [('bench-tiles', TILE_TYPES+1)]
+        tiles = [[self.random.randint(1, TILE_TYPES) for x in range(side)] for y in range(side)]
+        layer = tile_map.addLayer(serge.blocks.tiled.Layer(tile_map, 'ground', 'visual', tiles=tiles))
+        #
+        for x, y in layer.getLocationsWithTile():
+            actor = serge.actor.Actor('tile', 'tile-%d-%d' % (x, y))
+            actor.setSpriteName(tile_map.getSpriteName(layer.tiles[y][x]))
+            actor.setLayerName('background')
+            actor.setOrigin(x*TILE_SIZE, y*TILE_SIZE)
+            world.addActor(actor)
+
+
+class ParticleScene(Scene):
+    """A particle emitter with a large number of particles"""
+
+    name = 'particles'
+    description = 'a particle emitter that is kept full of particles'
+
+    def populate(self, engine, world):
+        """Add the items in the scene to the world"""
+        emitter = FountainEmitter('emitter', 'emitter', self.count, self.random)
+        emitter.moveTo(WIDTH/2, HEIGHT/2)
+        world.addActor(emitter)
+
+
+# The default scenes and the number of items in each
+DEFAULT_SCENES = (
+    (ActorScene, 1000),
+    (RotatingScene, 200),
+    (TextScene, 200),
+    (PhysicsScene, 300),
+    (MountedScene, 500),
+    (TiledScene, 4096),
+    (ParticleScene, 10000),
+)
+
+SCENES = dict([(cls.name, cls) for cls, _ in DEFAULT_SCENES])
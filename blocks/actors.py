@@ -50,6 +50,9 @@ class RepeatedVisualActor(serge.blocks.animations.AnimatedActor):
     
     """
 
+    # We render with RenderingLayer.renderVisual so we work at a lower resolution
+    supports_render_scale = True
+
     def __init__(self, tag, name=None, repeat=5, spacing=10, orientation='horizontal'):
         """Initialise the RepeatedVisualActor"""
         super(RepeatedVisualActor, self).__init__(tag, name)
@@ -101,7 +104,14 @@ class RepeatedVisualActor(serge.blocks.animations.AnimatedActor):
                         x, y = (ox + i*self._spacing, oy)
                     else:
                         x, y = (ox, oy + i*self._spacing)
-                    self._visual.renderTo(interval, renderer.getLayer(self.layer).getSurface(), (x, y))
+                    layer.renderVisual(self._visual, interval, (x, y))
+
+    def getRenderState(self):
+        """Return a value that changes whenever the actor would render differently"""
+        state = super(RepeatedVisualActor, self).getRenderState()
+        if state is None:
+            return None
+        return state + (self._current,)
 
     def reduceRepeat(self, amount=1):
         """Reduce the repeat by a certain amount"""
@@ -346,6 +356,12 @@ class AnimateThenDieActor(serge.actor.Actor):
         #
         if self.parent:
             self.moveTo(self.parent.x, self.parent.y)
+
+    def reset(self, parent=None):
+        """Reset the actor so it can be used again"""
+        super(AnimateThenDieActor, self).reset()
+        self.parent = parent
+        self.visual.resetAnimation(True)
             
     def updateActor(self, interval, world):
         """Update the actor"""
@@ -403,10 +403,10 @@ class AvoidActorsWithTag(Behaviour):
     def __call__(self, world, actor, interval):
         """Do the movement if we are within range"""
         encroachers = []
-        for target in world.findActorsByTag(self._tag):
+        for target in world.findActorsInRadius(actor.x, actor.y, self._distance):
             #
             # Check if we are outside of the given distance
-            if target != actor:
+            if target != actor and target.tag == self._tag:
                 dx = (target.x - actor.x)
                 dy = (target.y - actor.y)
                 dist = (dx**2 + dy**2)
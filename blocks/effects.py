@@ -35,6 +35,11 @@ class Effect(serge.actor.Actor):
         """Initialise the effect"""
         self.paused = False
         self.done_recorded = False
+
+    def reset(self):
+        """Reset the effect so it can be used again"""
+        super(Effect, self).reset()
+        self.init()
         
     def pause(self):
         """Pause the effect"""
@@ -77,6 +82,11 @@ class Pause(Effect):
         self.time = time
         self.time_passed = 0.0
         
+    def reset(self):
+        """Reset the pause so it can be used again"""
+        super(Pause, self).reset()
+        self.time_passed = 0.0
+        
     def updateActor(self, interval, world):
         """Update this effect"""
         #
@@ -122,6 +132,13 @@ class MethodCallFade(Effect):
         self.velocity = 0.0
         self.gone = 0.0
         
+    def reset(self):
+        """Reset the fade so it can be used again"""
+        super(MethodCallFade, self).reset()
+        self.current = self.start
+        self.velocity = 0.0
+        self.gone = 0.0
+        
     def updateActor(self, interval, world):
         """Update this effect"""
         #
@@ -199,6 +216,11 @@ class ColourPhaser(Effect):
         self._do_effect = False
         self.start_time = time.time()
 
+    def reset(self):
+        """Reset the phasing so it can be used again"""
+        super(ColourPhaser, self).reset()
+        self.start_time = time.time()
+
     def addedToWorld(self, world):
         """We were added to a wolrd"""
         super(ColourPhaser, self).addedToWorld(world)
@@ -251,6 +273,11 @@ class PanActor(Effect):
         self.linear = linear
         self.sx, self.sy = actor.x, actor.y
     
+    def reset(self):
+        """Reset the panning so it can be used again"""
+        super(PanActor, self).reset()
+        self.restart()
+        
     def restart(self):
         """Restart the panning"""
         renderer = serge.engine.CurrentEngine().getRenderer()
@@ -0,0 +1,404 @@
+"""Lightweight actors for very large numbers of simple objects like bullets or debris"""
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import serge.actor
+import serge.geometry
+import serge.render
+import serge.serialize
+import serge.visual
+
+
+class NumpyNotAvailable(Exception): """Numpy is needed for the particle emitter but was not found"""
+
+
+class Particle(object):
+    """A lightweight actor
+
+    Particles can be added to worlds and zones and are rendered like
+    actors but they use slots and share their visual with other particles
+    rather than having their own copy. They do not have loggers, event
+    handling, physics or serialization.
+
+    Shared visuals are not animated by the particles.
+
+    """
+
+    __slots__ = ('_tag', '_name', 'layer', 'visual', 'rect', 'active', 'visible', 'vx', 'vy',
+                 '_spatial_index', '_actor_index')
+
+    # We render with RenderingLayer.renderVisual so we work at a lower resolution
+    supports_render_scale = True
+
+    def __init__(self, tag, name='', visual=None, layer=''):
+        """Initialise the Particle
+
+        :param tag: the tag for the particle
+        :param name: the name of the particle
+        :param visual: the visual to render, which is shared and not copied
+        :param layer: the layer to render to
+
+        """
+        self._tag = tag
+        self._name = name
+        self._spatial_index = None
+        self._actor_index = None
+        self.layer = layer
+        self.active = True
+        self.visible = True
+        self.vx = self.vy = 0.0
+        self.rect = serge.geometry.SimpleRect(0, 0, 0, 0)
+        self.visual = None
+        if visual:
+            self.setVisual(visual)
+
+    def getNiceName(self):
+        """Return a nice name for this particle"""
+        return '%s [%s] <%s>' % (self.__class__.__name__, self._name or self._tag, hex(id(self)))
+
+    ### Tag and name ###
+
+    @property
+    def tag(self): return self._tag
+    @tag.setter
+    def tag(self, value):
+        """Set the tag for this particle"""
+        if self._actor_index is not None:
+            self._actor_index.tagChanged(self, self._tag, value)
+        self._tag = value
+
+    @property
+    def name(self): return self._name
+    @name.setter
+    def name(self, value):
+        """Set the name for this particle"""
+        if self._actor_index is not None:
+            self._actor_index.nameChanged(self, self._name, value)
+        self._name = value
+
+    def setActorIndex(self, index):
+        """Set the index that tracks our tag and name (None to stop tracking)"""
+        self._actor_index = index
+
+    def setSpatialIndex(self, index):
+        """Set the spatial index that tracks our location (None to stop tracking)"""
+        self._spatial_index = index
+
+    ### Visual ###
+
+    def setVisual(self, visual):
+        """Set the visual for this particle - the visual is shared and not copied"""
+        self.visual = visual
+        x, y = self.x, self.y
+        self.rect[2] = visual.width
+        self.rect[3] = visual.height
+        self.moveTo(x, y)
+
+    def setSpriteName(self, name):
+        """Set the visual to be the registered sprite with the given name"""
+        self.setVisual(serge.visual.Register.getItem(name))
+
+    def setLayerName(self, name):
+        """Set the layer that we render to"""
+        if self._actor_index is not None:
+            self._actor_index.layerChanged(self, self.layer, name)
+        self.layer = name
+
+    def getLayerName(self):
+        """Return our layer name"""
+        return self.layer
+
+    def setZoom(self, zoom):
+        """Zoom in on this particle - this does nothing as particles share their visual"""
+
+    def renderTo(self, renderer, interval):
+        """Render ourself to the given renderer"""
+        if self.visual and self.layer:
+            layer = renderer.getLayer(self.layer)
+            camera = renderer.camera
+            if layer.static:
+                coords = self.rect[0], self.rect[1]
+            elif camera.canSee(self):
+                coords = camera.getRelativeLocation(self)
+            else:
+                return
+            layer.renderVisual(self.visual, 0, coords)
+
+    def getRenderState(self):
+        """Return a value that changes whenever the particle would render differently"""
+        if not self.visual:
+            return ()
+        state = self.visual.getRenderState()
+        if state is None:
+            return None
+        return (state,) + tuple(self.rect)
+
+    ### World events ###
+
+    def updateActor(self, interval, world):
+        """Move the particle by its velocity"""
+        if self.vx or self.vy:
+            self.move(self.vx*interval/1000.0, self.vy*interval/1000.0)
+
+    def addedToWorld(self, world):
+        """Called when we are added to the world"""
+
+    def removedFromWorld(self, world):
+        """Called when we are removed from the world"""
+
+    def processEvent(self, event):
+        """Process an event - particles ignore events"""
+
+    def getPhysical(self):
+        """Return the physical conditions - particles have none"""
+        return None
+
+    ### Spatial ###
+
+    @property
+    def x(self): return self.rect[0] + self.rect[2]/2.0
+    @x.setter
+    def x(self, value):
+        self.moveTo(value, self.y)
+    @property
+    def y(self): return self.rect[1] + self.rect[3]/2.0
+    @y.setter
+    def y(self, value):
+        self.moveTo(self.x, value)
+    @property
+    def width(self): return self.rect[2]
+    @property
+    def height(self): return self.rect[3]
+
+    def setVelocity(self, vx, vy):
+        """Set the velocity in pixels per second"""
+        self.vx = vx
+        self.vy = vy
+
+    def moveTo(self, x, y):
+        """Move the center of the particle to the given location"""
+        rect = self.rect
+        rect[0] = x - rect[2]/2.0
+        rect[1] = y - rect[3]/2.0
+        if self._spatial_index is not None:
+            self._spatial_index.updateItem(self)
+
+    def move(self, dx, dy):
+        """Move the particle by an amount"""
+        rect = self.rect
+        self.moveTo(rect[0] + rect[2]/2.0 + dx, rect[1] + rect[3]/2.0 + dy)
+
+    def getSpatial(self):
+        """Return spatial details"""
+        return self.rect
+
+    def getOrigin(self):
+        """Return the left and top coords"""
+        return self.rect[0], self.rect[1]
+
+    def isInside(self, other):
+        """Return True if this particle is inside another"""
+        return other.rect.contains(self.rect) == 1
+
+    def isOverlapping(self, other):
+        """Return True if this particle overlaps another"""
+        return other.rect.colliderect(self.rect) == 1
+
+    def getDistanceFrom(self, other):
+        """Return the distance we are from another"""
+        return math.sqrt((self.x-other.x)**2 + (self.y-other.y)**2)
+
+
+class ParticleEmitter(serge.actor.Actor):
+    """An actor that manages a large number of simple particles
+
+    The positions, velocities, ages, lifetimes and animation frames of the
+    particles are held in numpy arrays and updated together each frame. The
+    particles are drawn from the cells of the emitter's sprite and blitted
+    together with a render queue. Particles are removed when they reach the end of
+    their lifetime.
+
+    Particles are not serialized - a restored emitter starts empty.
+
+    """
+
+    my_properties = (
+        serge.serialize.I('capacity', 1000, 'the maximum number of particles'),
+        serge.serialize.L('gravity', (0.0, 0.0), 'the acceleration applied to particles in pixels/s/s'),
+        serge.serialize.F('framerate', 0.0, 'the rate at which particles animate through the sprite cells'),
+    )
+
+    # We scale the particles ourself when rendering at a lower resolution
+    supports_render_scale = True
+
+    def __init__(self, tag, name, sprite_name, layer_name, capacity=1000, gravity=(0.0, 0.0), framerate=0.0):
+        """Initialise the ParticleEmitter
+
+        :param sprite_name: the sprite whose cells are used to draw the particles
+        :param capacity: the maximum number of live particles
+        :param gravity: an (x, y) acceleration in pixels/s/s applied to all particles
+        :param framerate: frames per second to animate particles through the cells (0 for no animation)
+
+        """
+        super(ParticleEmitter, self).__init__(tag, name)
+        #
+        self.capacity = capacity
+        self.gravity = gravity
+        self.framerate = framerate
+        self.setSpriteName(sprite_name)
+        self.setLayerName(layer_name)
+        self._createArrays()
+
+    def init(self):
+        """Initialise from serialized form"""
+        super(ParticleEmitter, self).init()
+        self._createArrays()
+
+    def _createArrays(self):
+        """Create the arrays to store the particles in"""
+        if numpy is None:
+            raise NumpyNotAvailable('The particle emitter requires numpy')
+        self._count = 0
+        self._px = numpy.zeros(self.capacity, float)
+        self._py = numpy.zeros(self.capacity, float)
+        self._vx = numpy.zeros(self.capacity, float)
+        self._vy = numpy.zeros(self.capacity, float)
+        self._age = numpy.zeros(self.capacity, float)
+        self._lifetime = numpy.zeros(self.capacity, float)
+        self._frame = numpy.zeros(self.capacity, int)
+
+    ### Particles ###
+
+    def emit(self, number, vx=0.0, vy=0.0, lifetime=1000.0, x=None, y=None, spread=0.0, frame=0):
+        """Emit new particles and return the number that were emitted
+
+        Any of vx, vy, lifetime, x, y and frame can be a single value or a
+        sequence with a value for each particle. Particles start at the
+        location of the emitter unless x and y are given. If spread is
+        given then a random amount of up to spread pixels/s is added to
+        each velocity component.
+
+        Particles are not emitted if the emitter is at capacity.
+
+        """
+        start = self._count
+        end = min(self.capacity, start + number)
+        n = end - start
+        if n <= 0:
+            return 0
+        #
+        self._px[start:end] = _values(self.x if x is None else x, n)
+        self._py[start:end] = _values(self.y if y is None else y, n)
+        self._vx[start:end] = _values(vx, n)
+        self._vy[start:end] = _values(vy, n)
+        self._lifetime[start:end] = _values(lifetime, n)
+        self._frame[start:end] = _values(frame, n)
+        self._age[start:end] = 0.0
+        if spread:
+            self._vx[start:end] += numpy.random.uniform(-spread, spread, n)
+            self._vy[start:end] += numpy.random.uniform(-spread, spread, n)
+        #
+        self._count = end
+        return n
+
+    def emitBurst(self, number, speed, lifetime=1000.0, spread=0.0):
+        """Emit particles moving outwards in random directions at the given speed"""
+        angles = numpy.random.uniform(0.0, 2*math.pi, number)
+        return self.emit(number, speed*numpy.cos(angles), speed*numpy.sin(angles), lifetime, spread=spread)
+
+    def getNumberOfParticles(self):
+        """Return the number of live particles"""
+        return self._count
+
+    def getParticleLocations(self):
+        """Return an array of the (x, y) locations of the live particles"""
+        return numpy.column_stack((self._px[:self._count], self._py[:self._count]))
+
+    def clearParticles(self):
+        """Remove all the particles"""
+        self._count = 0
+
+    def updateActor(self, interval, world):
+        """Move the particles and remove the ones that have expired"""
+        super(ParticleEmitter, self).updateActor(interval, world)
+        n = self._count
+        if not n:
+            return
+        #
+        # Integrate
+        dt = interval/1000.0
+        gx, gy = self.gravity
+        vx, vy = self._vx[:n], self._vy[:n]
+        if gx:
+            vx += gx*dt
+        if gy:
+            vy += gy*dt
+        self._px[:n] += vx*dt
+        self._py[:n] += vy*dt
+        self._age[:n] += interval
+        #
+        # Remove expired particles by packing the live ones to the front
+        alive = self._age[:n] < self._lifetime[:n]
+        live = int(numpy.count_nonzero(alive))
+        if live != n:
+            for array in (self._px, self._py, self._vx, self._vy, self._age, self._lifetime, self._frame):
+                array[:live] = array[:n][alive]
+            self._count = live
+
+    def getRenderState(self):
+        """Return a value that changes whenever the emitter would render differently
+        
+        Live particles are always moving so we cannot be cached.
+        
+        """
+        if self._count:
+            return None
+        return ()
+
+    def renderTo(self, renderer, interval):
+        """Render the particles to the given renderer"""
+        n = self._count
+        if not (n and self.visual and self.layer):
+            return
+        layer = renderer.getLayer(self.layer)
+        surface = layer.getSurface()
+        cells = [layer.getScaledImage(cell) for cell in self.visual.cells]
+        w, h = self.visual.width, self.visual.height
+        #
+        # Find the locations on the layer
+        if layer.static:
+            sx = (self._px[:n] - w/2)*layer.scale
+            sy = (self._py[:n] - h/2)*layer.scale
+        else:
+            camera = renderer.camera
+            cx, cy = camera.getOrigin()
+            sx = (self._px[:n] - w/2 - cx)*camera.zoom*layer.scale
+            sy = (self._py[:n] - h/2 - cy)*camera.zoom*layer.scale
+        w, h = w*layer.scale, h*layer.scale
+        #
+        # Cull the particles that are off the surface
+        visible = (sx > -w) & (sx < surface.get_width()) & (sy > -h) & (sy < surface.get_height())
+        sx, sy = sx[visible].astype(int), sy[visible].astype(int)
+        #
+        # Work out the cells
+        if len(cells) == 1:
+            images = [cells[0]]*len(sx)
+        else:
+            frames = self._frame[:n][visible]
+            if self.framerate:
+                frames = frames + (self._age[:n][visible]*self.framerate/1000.0).astype(int)
+            images = [cells[i] for i in (frames % len(cells)).tolist()]
+        #
+        queue = serge.render.RenderQueue(surface)
+        queue.addBlits(zip(images, zip(sx.tolist(), sy.tolist())))
+        queue.flush()
+
+
+def _values(value, number):
+    """Return a single value or the first number items of a sequence of values"""
+    return numpy.asarray(value)[:number] if numpy.ndim(value) else value
@@ -0,0 +1,85 @@
+"""Pools of actors that can be reused rather than created each time they are needed"""
+
+import serge.events
+
+
+class ActorPool(object):
+    """A pool of actors that are reused
+    
+    Creating actors can be expensive (eg copying the sprite and setting up
+    the events) so when actors are created and destroyed often, like
+    bullets or explosions, a pool can be used to reuse them. Actors are
+    taken from the pool with getActor, which calls the actor's reset method,
+    and they go back into the pool automatically when they are removed from
+    the world.
+    
+    """
+    
+    def __init__(self, actor_class, args=(), kw=None, sprite_name=None, layer_name=None, size=0, maximum=None):
+        """Initialise the ActorPool
+        
+        :param actor_class: the class of actor to create
+        :param args: the arguments to create the actor with
+        :param kw: the keyword arguments to create the actor with
+        :param sprite_name: the name of the sprite to set on new actors
+        :param layer_name: the name of the layer to set on new actors
+        :param size: the number of actors to create now
+        :param maximum: the most actors to keep in the pool (None for no limit)
+        
+        """
+        self.actor_class = actor_class
+        self.args = args
+        self.kw = kw if kw else {}
+        self.sprite_name = sprite_name
+        self.layer_name = layer_name
+        self.maximum = maximum
+        #
+        self._free = []
+        self._in_use = set()
+        for i in range(size):
+            self._free.append(self._createActor())
+            
+    def _createActor(self):
+        """Return a new actor for the pool"""
+        actor = self.actor_class(*self.args, **self.kw)
+        if self.sprite_name:
+            actor.setSpriteName(self.sprite_name)
+        if self.layer_name:
+            actor.setLayerName(self.layer_name)
+        actor.linkEvent(serge.events.E_REMOVED_FROM_WORLD, self._actorRemoved)
+        return actor
+        
+    def getActor(self, *args, **kw):
+        """Return an actor from the pool, creating one if the pool is empty
+        
+        The actor's reset method is called with the arguments.
+        
+        """
+        actor = self._free.pop() if self._free else self._createActor()
+        actor.reset(*args, **kw)
+        self._in_use.add(actor)
+        return actor
+        
+    def releaseActor(self, actor):
+        """Return an actor to the pool
+        
+        This happens automatically when an actor from the pool is removed
+        from the world.
+        
+        """
+        if actor in self._in_use:
+            self._in_use.remove(actor)
+            if self.maximum is None or len(self._free) < self.maximum:
+                self._free.append(actor)
+                
+    def _actorRemoved(self, actor, arg):
+        """An actor was removed from the world"""
+        self.releaseActor(actor)
+        
+    def getNumberFree(self):
+        """Return the number of actors waiting in the pool"""
+        return len(self._free)
+    
+    def getNumberInUse(self):
+        """Return the number of actors taken from the pool and not returned"""
+        return len(self._in_use)
@@ -4,6 +4,7 @@ import math
 import random
 
 import serge.sound
+import serge.geometry
 import serge.actor
 
 
@@ -226,6 +227,9 @@ class ActorsWithTagSound(AmbientSound):
         
     def get_scaled_volume(self, listener_position):
         """Update the sound volume according to the listener position"""
+        if serge.geometry.numpy:
+            return min(1.0, self.world.getTagPositions(self.tag).getFalloff(
+                listener_position[0], listener_position[1], self.dropoff))
         total = 0.0
         for actor in self.world.findActorsByTag(self.tag):
             dist = math.sqrt((listener_position[0]-actor.x)**2 +(listener_position[1]-actor.y)**2)
@@ -159,6 +159,13 @@ class SpriteText(serge.visual.Sprite):
                 (x+self.width/2-self.text_visual.width/2, 
                  y+self.height/2-self.text_visual.height/2))
 
+    def getRenderState(self):
+        """Return a value that changes whenever the sprite or text would render differently"""
+        state = super(SpriteText, self).getRenderState()
+        if state is None:
+            return None
+        return state, self.text_visual.getRenderState()
+
     def setText(self, text):
         """Set the text"""
         self.text_visual.setText(text)
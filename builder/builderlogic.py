@@ -78,10 +78,11 @@ class BuilderLogic(serge.common.Loggable):
 
     def renderTo(self, renderer, interval):
         """Update the builder display"""
-        self.mode.renderTo(interval, renderer.getLayer('builder').getSurface(), (20, 20))
-        self.coords.renderTo(interval, renderer.getLayer('builder').getSurface(), (150, 20))
+        layer = renderer.getLayer('builder')
+        layer.renderVisual(self.mode, interval, (20, 20))
+        layer.renderVisual(self.coords, interval, (150, 20))
         self.framerate.setText('Rate: %5.2f (%5.2f)' % (self.stats.current_frame_rate, self.stats.average_frame_rate))
-        self.framerate.renderTo(interval, renderer.getLayer('builder').getSurface(), (20, 35))
+        layer.renderVisual(self.framerate, interval, (20, 35))
           
     @property
     def world(self):
@@ -30,7 +30,8 @@ class Camera(common.Loggable, geometry.Rectangle):
           
     def canSeeActors(self, actors):
         """Return the actors that we can see from a list of actors"""
-        return [actor for actor in actors if self.canSee(actor)]
+        actors = list(actors)
+        return [actors[idx] for idx in self.rect.collidelistall([actor.rect for actor in actors])]
     
     def canSee(self, actor):
         """Return True if we can see the actor"""
@@ -77,6 +78,10 @@ class NullCamera(Camera):
         """Can we see it? Yes we can"""
         return True
     
+    def canSeeActors(self, actors):
+        """Return the actors that we can see - all of them"""
+        return list(actors)
+    
     def init(self):
         """Initialise"""
         self.addLogger()
@@ -1,3 +1,4 @@
+import os
 import sys
 import traceback
 import logging
@@ -12,6 +13,15 @@ version = '0.4.4.1'
 # enough to avoid that.
 NUM_AUDIO_CHANNELS = 32
 
+#
+# Set the SERGE_HEADLESS environment variable to run without a display
+# or sound device (eg on servers and for benchmarking). This must be done
+# before pygame is initialised, which happens when the engine is imported.
+HEADLESS = bool(os.environ.get('SERGE_HEADLESS'))
+if HEADLESS:
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
 #
 # Look for Pymunk
 try:
@@ -1,6 +1,8 @@
 """The main engine for Serge"""
 
 import time
+import csv
+import json
 import common
 import pygame
 import serialize
@@ -35,13 +37,20 @@ class Engine(common.Loggable, serialize.Serializable, common.EventAware):
         serialize.S('_current_world_name', '', 'the name of the current world'),
         serialize.L('_recent_worlds', [], 'the list of worlds recently visited'),
         serialize.B('fullscreen', False, 'whether to display in full screen or not'),
+        serialize.F('fixed_timestep', 0.0, 'the fixed simulation step in ms (0=use the frame interval)'),
+        serialize.I('max_catchup_steps', 5, 'the maximum number of fixed steps to run in a single frame'),
     )
     
-    def __init__(self, width=640, height=480, title='Serge', backcolour=(0,0,0), icon=None, fullscreen=False):
+    def __init__(self, width=640, height=480, title='Serge', backcolour=(0,0,0), icon=None, fullscreen=False,
+            display_mode=render.D_WINDOW, render_scale=1.0):
         """Initialise the engine
         
         :param width: width of the screen
         :param height: height of the screen
+        :param display_mode: render.D_WINDOW to show on screen, render.D_OFFSCREEN to render
+            without a display or render.D_NONE to only simulate
+        :param render_scale: the fraction of the screen resolution to render at (eg 0.5 to
+            render at half resolution and scale up to the screen)
         
         """
         self.title = title
@@ -52,7 +61,8 @@ class Engine(common.Loggable, serialize.Serializable, common.EventAware):
         SetCurrentEngine(self)
         super(Engine, self).__init__()
         self.clearWorlds()
-        self.renderer = render.Renderer(width, height, title, backcolour, icon, fullscreen)
+        self.renderer = render.Renderer(width, height, title, backcolour, icon, fullscreen, display_mode,
+            render_scale=render_scale)
         self.sprites = visual.Register
         self._stop_requested = False
         self._current_world_name = ''
@@ -61,7 +71,11 @@ class Engine(common.Loggable, serialize.Serializable, common.EventAware):
         self._mouse = input.Mouse(self)
         self._stats = EngineStats()
         self._recent_worlds = []
-        self._profiler = profiler.NullProfiler()
+        self._profiler = profiler.NULL_PROFILER
+        self.fixed_timestep = 0.0
+        self.max_catchup_steps = 5
+        self._accumulator = 0.0
+        self._interpolation = 1.0
                     
     def init(self):
         """Initialise ourself"""
@@ -86,6 +100,9 @@ class Engine(common.Loggable, serialize.Serializable, common.EventAware):
         self._builder = None
         self._keyboard = input.Keyboard()
         self._mouse = input.Mouse(self)
+        self._accumulator = 0.0
+        self._interpolation = 1.0
+        self._profiler = profiler.NULL_PROFILER
             
     def addWorld(self, world):
         """Add a world to the engine
@@ -198,37 +215,114 @@ class Engine(common.Loggable, serialize.Serializable, common.EventAware):
             self._current_world.updateWorld(interval)
         else:
             raise NoCurrentWorld('Cannot update when there is no current world')
+
+    ### Timestep ###
+    
+    def setFixedTimestep(self, interval, max_steps=5):
+        """Set the engine to update the simulation in fixed steps
+        
+        The world is then updated with steps of exactly interval ms, running
+        as many steps as are needed to catch up with the real time that has passed.
+        Rendering still happens once per frame. If more than max_steps would be needed
+        in a single frame then the extra time is dropped so that a slow frame does not
+        cause the simulation to spiral.
+        
+        :param interval: the size of the simulation step in ms (0 to use the frame interval)
+        :param max_steps: the maximum number of steps to take in one frame
+        
+        """
+        self.fixed_timestep = float(interval)
+        self.max_catchup_steps = max_steps
+        self._accumulator = 0.0
+        self._interpolation = 1.0
+        
+    def getFixedTimestep(self):
+        """Return the fixed simulation step in ms (0 means the frame interval is used)"""
+        return self.fixed_timestep
+        
+    def getInterpolation(self):
+        """Return the interpolation factor for rendering between simulation steps
+        
+        This is the fraction (0 to 1) of a fixed step that has elapsed since the last
+        simulation update. Actors can use this to blend between their previous and
+        current states when rendering. When not using a fixed timestep this is always 1.
         
-    def run(self, fps, endat=None):
+        """
+        return self._interpolation
+        
+    def _getSimulationSteps(self, interval):
+        """Return the list of intervals to update the simulation with for this frame"""
+        if not self.fixed_timestep:
+            self._interpolation = 1.0
+            self.renderer.setInterpolation(self._interpolation)
+            return [interval]
+        #
+        # Accumulate time and then consume it in fixed size steps
+        step = self.fixed_timestep
+        self._accumulator += interval
+        steps = int(self._accumulator // step)
+        if steps > self.max_catchup_steps:
+            #
+            # We have fallen too far behind - drop the whole steps we cannot do
+            self._accumulator -= steps*step
+            self._accumulator %= step
+            steps = self.max_catchup_steps
+        else:
+            self._accumulator -= steps*step
+        #
+        self._interpolation = self._accumulator/step
+        self.renderer.setInterpolation(self._interpolation)
+        return [step]*steps
+        
+    def run(self, fps, endat=None, frames=None):
         """Run the updates at the specified frames per second until the optional endtime
         
+        When the renderer is headless the engine does not wait between frames. Instead each
+        frame advances the simulation by 1/fps seconds so that many frames can be simulated
+        as fast as possible.
+        
         :param fps: the target frames per second (integer)
         :param endat: a time to stop the engine at (long), eg time.time()+60 to run for a minute
+        :param frames: the number of frames to run for before stopping
         
         """
         self.log.info('Engine starting (requested fps=%d)' % fps)
         clock = pygame.time.Clock()
         self._stop_requested = False
+        headless = self.renderer.isHeadless()
+        rendering = self.renderer.isRendering()
+        stats = self._stats
+        frame = 0
         while True:
             #
             # Watch for ending conditions
-            if self._stop_requested or (endat and time.time() >= endat):
+            if self._stop_requested or (endat and time.time() >= endat) or (frames is not None and frame >= frames):
                 break
+            frame += 1
             #
             # Main render activity
             try:
                 #
-                # Pause
-                clock.tick(fps)
+                # Pause - unless we are headless when we run as fast as possible
+                if headless:
+                    clock.tick()
+                    interval = 1000.0/fps if fps else clock.get_time()
+                else:
+                    clock.tick(fps)
+                    interval = clock.get_time()
                 #
                 # Do the update for our actors
-                interval = clock.get_time()
+                stats.startFrame()
+                self._profiler.startFrame()
                 if self._current_world:
-                    self.updateWorld(interval)
+                    for step in self._getSimulationSteps(interval):
+                        self.updateWorld(step)
+                stats.endPhase(P_UPDATE)
                 #
                 # Do builder work if needed
                 if self._builder:
                     self._builder.updateBuilder(interval)
+                stats.endPhase(P_BUILDER)
                 #
                 # Events that may have happened
                 self._handleEvents()
@@ -236,32 +330,29 @@ class Engine(common.Loggable, serialize.Serializable, common.EventAware):
                 self._mouse.update(interval)
                 self._keyboard.update(interval)
                 pygame.event.clear()
+                stats.endPhase(P_INPUT)
                 # Sound
                 sound.Music.update(interval)
                 sound.Sounds.update(interval)                
+                stats.endPhase(P_SOUND)
                 if self._current_world:
                     self.processEvents()
+                stats.endPhase(P_EVENTS)
                 #
-                # Get ready to render
-                self._stats.beforeRender()
-                self.renderer.preRender()
-                #
-                # Render the active world
-                if self._current_world:
-                    self._current_world.renderTo(self.renderer, interval)
-                #
-                # Render the builder if needed
-                if self._builder:
-                    self._builder.renderTo(self.renderer, interval)
-                #
-                # And render all of our layers
-                self.renderer.render()
-                self.processEvent((events.E_AFTER_RENDER, self))
-                self._stats.afterRender()
-                #
-                # Show the screen
-                pygame.display.flip()
-                self._stats.recordFrame()
+                # Render if we need to
+                if rendering:
+                    self._renderFrame(interval)
+                    #
+                    # Show the screen
+                    if not headless:
+                        dirty = self.renderer.getDirtyRects()
+                        if dirty is None:
+                            pygame.display.flip()
+                        elif dirty:
+                            pygame.display.update(dirty)
+                        stats.endPhase(P_FLIP)
+                self._profiler.endFrame()
+                stats.recordFrame()
                 #
             except NotImplementedError, err:
                 self.log.error('Failed in main loop: %s' % err)
@@ -270,14 +361,38 @@ class Engine(common.Loggable, serialize.Serializable, common.EventAware):
         self.processEvent((events.E_AFTER_STOP, self))
         self.log.info('Engine info: %s' % (self._stats,))
         
-    def runAsync(self, fps, endat=None):
+    def _renderFrame(self, interval):
+        """Render the current world and builder to the renderer"""
+        #
+        # Get ready to render
+        self._stats.beforeRender()
+        self.renderer.preRender()
+        self._stats.endPhase(P_PRERENDER)
+        #
+        # Render the active world
+        if self._current_world:
+            self._current_world.renderTo(self.renderer, interval)
+        #
+        # Render the builder if needed
+        if self._builder:
+            self._builder.renderTo(self.renderer, interval)
+        self._stats.endPhase(P_RENDER)
+        #
+        # And render all of our layers
+        self.renderer.render()
+        self.processEvent((events.E_AFTER_RENDER, self))
+        self._stats.endPhase(P_COMPOSITE)
+        self._stats.afterRender()
+        
+    def runAsync(self, fps, endat=None, frames=None):
         """Run the engine asynchronously
         
         :param fps: the target frames per second (integer)
         :param endat: a time to stop the engine at (long), eg time.time()+60 to run for a minute
+        :param frames: the number of frames to run for before stopping
         
         """
-        self.runner = threading.Thread(target=self.run, args=(fps, endat))
+        self.runner = threading.Thread(target=self.run, args=(fps, endat, frames))
         self.runner.setDaemon(True)
         self.runner.start()
 
@@ -340,30 +455,136 @@ class Engine(common.Loggable, serialize.Serializable, common.EventAware):
 
     ### Profiling ###
     
-    def profilingOn(self):
-        """Turn the profiling on"""
-        self._profiler = profiler.PROFILER
+    def profilingOn(self, hierarchical=False):
+        """Turn the profiling on
+        
+        :param hierarchical: if True then use a HierarchicalProfiler to record nested spans for each frame
+        
+        """
+        self._profiler = profiler.HierarchicalProfiler() if hierarchical else profiler.PROFILER
+        
+    def profilingOff(self):
+        """Turn the profiling off"""
+        self._profiler = profiler.NULL_PROFILER
+        
+    def setProfiler(self, the_profiler):
+        """Set the profiler to use"""
+        self._profiler = the_profiler
         
     def getProfiler(self):
         """Return the current profiler"""
         return self._profiler
         
 
+# The phases of the main loop that are timed by the engine stats
+P_UPDATE = 'update'
+P_BUILDER = 'builder'
+P_INPUT = 'input'
+P_SOUND = 'sound'
+P_EVENTS = 'events'
+P_PRERENDER = 'prerender'
+P_RENDER = 'render'
+P_COMPOSITE = 'composite'
+P_FLIP = 'flip'
+P_FRAME = 'frame'
+
+PHASES = (P_UPDATE, P_BUILDER, P_INPUT, P_SOUND, P_EVENTS, P_PRERENDER, P_RENDER, P_COMPOSITE, P_FLIP)
+
+
+class TimingBuffer(object):
+    """A fixed size ring buffer of timings
+    
+    Once the buffer is full the oldest timings are overwritten so the
+    statistics always reflect the most recent frames.
+    
+    """
+    
+    def __init__(self, size):
+        """Initialise the buffer"""
+        self.size = size
+        self.clear()
+        
+    def clear(self):
+        """Clear all the timings"""
+        self._values = [0.0]*self.size
+        self._index = 0
+        self._count = 0
+        
+    def addValue(self, value):
+        """Add a timing to the buffer"""
+        self._values[self._index] = value
+        self._index = (self._index + 1) % self.size
+        if self._count < self.size:
+            self._count += 1
+            
+    def getValues(self):
+        """Return the timings in the order they were added"""
+        if self._count < self.size:
+            return self._values[:self._count]
+        else:
+            return self._values[self._index:] + self._values[:self._index]
+        
+    def getCount(self):
+        """Return the number of timings in the buffer"""
+        return self._count
+        
+    def getLast(self):
+        """Return the most recent timing"""
+        return self._values[self._index-1] if self._count else 0.0
+        
+    def getPercentile(self, percentile):
+        """Return the timing at the given percentile (0-100)"""
+        if not self._count:
+            return 0.0
+        values = sorted(self._values[:self._count])
+        return values[min(self._count-1, int(self._count*percentile/100.0))]
+        
+    def getMax(self):
+        """Return the maximum timing"""
+        return max(self._values[:self._count]) if self._count else 0.0
+        
+    def getMean(self):
+        """Return the mean timing"""
+        return sum(self._values[:self._count])/self._count if self._count else 0.0
+        
+
 class EngineStats(object):
-    """Statistic for the engine"""
+    """Statistic for the engine
+    
+    As well as the overall frame rate, the time spent in each phase of 
+    the main loop (see PHASES) is recorded for the most recent frames. All 
+    phase times are in ms. A frame that takes longer than the hitch
+    threshold is counted as a hitch and the phase that took the longest 
+    in that frame is blamed for it.
     
-    def __init__(self):
-        """Initialise the stats"""
+    """
+    
+    def __init__(self, history=600, hitch_threshold=50.0):
+        """Initialise the stats
+        
+        :param history: the number of frames to keep timings for
+        :param hitch_threshold: the frame time in ms above which a frame counts as a hitch
+        
+        """
         self.start_time = time.time()
         self.average_frame_rate = 0.0
         self.current_frame_rate = 0.0
         self.last_frame = None
         self.last_render = None
         self.average_render_time = 0.0
+        self.hitch_threshold = hitch_threshold
+        self._phases = dict([(name, TimingBuffer(history)) for name in PHASES + (P_FRAME,)])
+        self._frame_phases = {}
+        self._recorded_phases = set()
+        self._mark = None
+        self._frame_start = None
+        self.hitches = 0
+        self.hitches_by_phase = dict([(name, 0) for name in PHASES])
         
     def recordFrame(self):
         """Record a frame"""
         now = time.time()
+        self._endFrame(now)
         if self.last_frame:
             try:
                 self.current_frame_rate = 1.0/(now - self.last_frame)
@@ -382,10 +603,96 @@ class EngineStats(object):
         """Record that we are after a rendering cycle"""
         self.average_render_time = (59*self.average_render_time + (time.time() - self.last_render))/60.0
 
+    ### Phases ###
+    
+    def startFrame(self):
+        """Record that we are starting the work for a frame"""
+        self._mark = self._frame_start = time.time()
+        self._frame_phases = {}
+        
+    def endPhase(self, name):
+        """Record that a phase of the frame has ended
+        
+        The phase is taken to have started when the last phase ended (or
+        when the frame was started).
+        
+        """
+        if self._mark is None:
+            return
+        now = time.time()
+        self._frame_phases[name] = self._frame_phases.get(name, 0.0) + (now - self._mark)*1000.0
+        self._mark = now
+        
+    def _endFrame(self, now):
+        """Store the phase timings for the frame that has just finished"""
+        if self._frame_start is None:
+            return
+        total = (now - self._frame_start)*1000.0
+        for name in PHASES:
+            self._phases[name].addValue(self._frame_phases.get(name, 0.0))
+        self._phases[P_FRAME].addValue(total)
+        self._recorded_phases.update(self._frame_phases)
+        #
+        # Watch for hitches and blame the slowest phase
+        if total > self.hitch_threshold and self._frame_phases:
+            self.hitches += 1
+            _, worst = max([(duration, name) for name, duration in self._frame_phases.iteritems()])
+            self.hitches_by_phase[worst] += 1
+        #
+        self._mark = self._frame_start = None
+
+    def getPhase(self, name):
+        """Return the timing buffer for a phase"""
+        return self._phases[name]
+        
+    def getPhaseSummary(self):
+        """Return a dictionary summarising the timings of each phase
+        
+        The result is keyed by the phase name and each entry has the
+        mean, p50, p95, p99 and max timings in ms and the number of hitches
+        blamed on that phase (all of them for the frame). Phases that have
+        never been recorded, eg the flip when headless, are left out.
+        
+        """
+        summary = {}
+        for name, timings in self._phases.iteritems():
+            if name != P_FRAME and name not in self._recorded_phases:
+                continue
+            summary[name] = {
+                'mean': timings.getMean(),
+                'p50': timings.getPercentile(50),
+                'p95': timings.getPercentile(95),
+                'p99': timings.getPercentile(99),
+                'max': timings.getMax(),
+                'hitches': self.hitches if name == P_FRAME else self.hitches_by_phase.get(name, 0),
+            }
+        return summary
+        
+    def exportJSON(self, filename):
+        """Export the phase summary and per-frame timings to a JSON file"""
+        data = {
+            'frames': self._phases[P_FRAME].getCount(),
+            'hitches': self.hitches,
+            'hitch_threshold': self.hitch_threshold,
+            'summary': self.getPhaseSummary(),
+            'timings': dict([(name, timings.getValues()) for name, timings in self._phases.iteritems()]),
+        }
+        with file(filename, 'w') as f:
+            json.dump(data, f, indent=2)
+            
+    def exportCSV(self, filename):
+        """Export the per-frame timings of each phase to a CSV file (one row per frame)"""
+        names = PHASES + (P_FRAME,)
+        columns = [self._phases[name].getValues() for name in names]
+        with file(filename, 'wb') as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            writer.writerows(zip(*columns))
+            
     def __repr__(self):
         """Nice representation"""
-        return '(current fps=%f, ave fps=%f, ave render=%fs)' % (
-            self.current_frame_rate, self.average_frame_rate, self.average_render_time)
+        return '(current fps=%f, ave fps=%f, ave render=%fs, hitches=%d)' % (
+            self.current_frame_rate, self.average_frame_rate, self.average_render_time, self.hitches)
         
         
 ### Allow people to find the current engine ###
@@ -14,6 +14,12 @@ import serialize
 # Occurs when one object collides with another
 E_COLLISION = 'collision'
 
+# Occur when actors with tags being checked by the world (World.addCollisionTags)
+# start to overlap, continue to overlap on each update and stop overlapping
+E_COLLISION_ENTER = 'collision-enter'
+E_COLLISION_STAY = 'collision-stay'
+E_COLLISION_EXIT = 'collision-exit'
+
 # Mouse events related to the left mouse button
 #  - down is when the button is held down (fires continuously)
 #  - up is when the button is released
@@ -3,9 +3,16 @@
 import pygame
 import math
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 import common
 import serialize
 
+class NumpyNotAvailable(Exception): """Numpy is needed for the operation but was not found"""
+
 # Some shapes
 RECTANGLE = 1
 CIRCLE = 2
@@ -13,7 +20,15 @@ FRAME = 3 # Rectangle with sides as walls and center is open
 
 
 class SimpleRect(list):
-    """A simple rectangle implementation"""
+    """A simple rectangle implementation
+    
+    The collision tests use floating point coordinates but otherwise
+    follow the same rules as pygame.Rect in pygame 1.9.2 and later. A
+    rectangle with no width or height collides with a rectangle that it
+    is strictly inside of but not with one whose left or top edge it lies
+    on (older versions of pygame say that these do collide).
+    
+    """
     
     def __init__(self, *args):
         """Initialise the rectangle"""
@@ -21,20 +36,27 @@ class SimpleRect(list):
     
     def colliderect(self, other):
         """Return True if this rectangle collides with another"""
-        r1 = pygame.rect.Rect(self)
-        r2 = pygame.rect.Rect(other)
-        return r1.colliderect(r2)
+        x1, y1, w1, h1 = self
+        x2, y2, w2, h2 = other
+        return x1 < x2 + w2 and y1 < y2 + h2 and x1 + w1 > x2 and y1 + h1 > y2
         
     def contains(self, other):
         """Return True if this rectangle contains another"""
-        r1 = pygame.rect.Rect(self)
-        r2 = pygame.rect.Rect(other)
-        return r1.contains(r2)
+        x1, y1, w1, h1 = self
+        x2, y2, w2, h2 = other
+        return (x1 <= x2 and y1 <= y2 and x1 + w1 >= x2 + w2 and y1 + h1 >= y2 + h2 and 
+                x1 + w1 > x2 and y1 + h1 > y2)
 
     def collidepoint(self, x, y):
         """Return True if this rectangle collides with another"""
-        r1 = pygame.rect.Rect(self)
-        return r1.collidepoint(x, y)
+        return self[0] <= x < self[0] + self[2] and self[1] <= y < self[1] + self[3]
+
+    def collidelistall(self, rects):
+        """Return the indexes of all the rectangles in a list that collide with this one"""
+        x1, y1, w1, h1 = self
+        r1, b1 = x1 + w1, y1 + h1
+        return [idx for idx, (x2, y2, w2, h2) in enumerate(rects)
+                if x1 < x2 + w2 and y1 < y2 + h2 and r1 > x2 and b1 > y2]
 
     def inflate(self, w, h):
         """Inflate to new width and height staying in the same centered place"""
@@ -162,6 +184,14 @@ class Rectangle(SpatialObject, serialize.Serializable):
         else:
             return math.sqrt((self.x-other[0])**2 + (self.y-other[1])**2)
     
+    def getEdgeDistanceFrom(self, other):
+        """Return the distance between our closest edge and the closest edge of another (0 if we overlap)"""
+        x1, y1, w1, h1 = self.rect
+        x2, y2, w2, h2 = other.rect
+        dx = max(x2 - (x1 + w1), x1 - (x2 + w2), 0)
+        dy = max(y2 - (y1 + h1), y1 - (y2 + h2), 0)
+        return math.sqrt(dx*dx + dy*dy)
+    
     def move(self, dx, dy):
         """Move the actor"""
         self.moveTo(self.x+dx, self.y+dy)
@@ -228,3 +258,178 @@ class Point(Rectangle):
     def isOverlapping(self, other):
         """Return True if this object overlaps another"""
         return self.isInside(other)
+
+
+class SpatialHash(object):
+    """A uniform grid index of spatial objects
+    
+    Objects are stored in each grid cell that their rectangle
+    overlaps. Queries only look at the cells covering the query
+    area so they do not scale with the total number of objects.
+    Queries return candidates from the cells - the results should
+    be checked exactly where that matters.
+    
+    Objects covering more than max_cells cells (eg backgrounds) are
+    kept in a separate list and are always returned as candidates.
+    
+    The hash also remembers which objects have been updated so that
+    you can find out which objects have moved since you last asked.
+    The version is changed whenever an object is added, removed or
+    updated.
+    
+    """
+    
+    def __init__(self, cell_size=64, max_cells=64):
+        """Initialise the SpatialHash"""
+        self.cell_size = float(cell_size)
+        self.max_cells = max_cells
+        self.version = 0
+        self.clear()
+        
+    def clear(self):
+        """Remove all the objects"""
+        self.version += 1
+        self._cells = {}
+        self._items = {}
+        self._large = set()
+        self._updated = set()
+        
+    def _getCellRange(self, x, y, w, h):
+        """Return the range of cells covering the rectangle"""
+        size = self.cell_size
+        return (int(math.floor(x/size)), int(math.floor(y/size)), 
+                int(math.floor((x+w)/size)), int(math.floor((y+h)/size)))
+        
+    def addItem(self, item):
+        """Add an object to the index"""
+        self.version += 1
+        cells = self._getCellRange(*item.rect)
+        self._items[item] = cells
+        x0, y0, x1, y1 = cells
+        if (x1-x0+1)*(y1-y0+1) > self.max_cells:
+            self._large.add(item)
+            return
+        for cx in xrange(x0, x1+1):
+            for cy in xrange(y0, y1+1):
+                self._cells.setdefault((cx, cy), set()).add(item)
+                
+    def removeItem(self, item):
+        """Remove an object from the index"""
+        self.version += 1
+        x0, y0, x1, y1 = self._items.pop(item)
+        self._updated.discard(item)
+        if item in self._large:
+            self._large.remove(item)
+            return
+        for cx in xrange(x0, x1+1):
+            for cy in xrange(y0, y1+1):
+                cell = self._cells[(cx, cy)]
+                cell.discard(item)
+                if not cell:
+                    del(self._cells[(cx, cy)])
+                    
+    def updateItem(self, item):
+        """Update the location of an object that has moved or changed size"""
+        self.version += 1
+        self._updated.add(item)
+        if self._items.get(item) != self._getCellRange(*item.rect):
+            self.removeItem(item)
+            self.addItem(item)
+            
+    def popUpdatedItems(self):
+        """Return the objects updated since the last call and forget them"""
+        updated, self._updated = self._updated, set()
+        return updated
+        
+    def hasItem(self, item):
+        """Return True if the object is in the index"""
+        return item in self._items
+        
+    def getItems(self):
+        """Return all the objects in the index"""
+        return self._items.keys()
+        
+    def findAtPoint(self, x, y):
+        """Return the objects that may contain the point"""
+        size = self.cell_size
+        results = set(self._large)
+        results.update(self._cells.get((int(math.floor(x/size)), int(math.floor(y/size))), ()))
+        return results
+        
+    def findInRectangle(self, x, y, w, h):
+        """Return the objects that may overlap the rectangle"""
+        x0, y0, x1, y1 = self._getCellRange(x, y, w, h)
+        results = set(self._large)
+        cells = self._cells
+        for cx in xrange(x0, x1+1):
+            for cy in xrange(y0, y1+1):
+                cell = cells.get((cx, cy))
+                if cell:
+                    results.update(cell)
+        return results
+        
+    def findInRadius(self, x, y, radius):
+        """Return the objects whose centers are within the radius of the point"""
+        r2 = radius*radius
+        results = set()
+        for item in self.findInRectangle(x-radius, y-radius, 2*radius, 2*radius):
+            ix, iy, iw, ih = item.rect
+            dx, dy = ix + iw/2.0 - x, iy + ih/2.0 - y
+            if dx*dx + dy*dy <= r2:
+                results.add(item)
+        return results
+
+
+class PointGroup(object):
+    """The locations of a group of spatial objects held in a numpy array
+    
+    The group answers proximity questions about all the objects at once
+    using array operations. The locations are taken when the group is
+    created so create a new group when the objects move (World.getTagPositions
+    does this for you).
+    
+    """
+    
+    def __init__(self, items):
+        """Initialise the PointGroup"""
+        if numpy is None:
+            raise NumpyNotAvailable('Point groups require numpy')
+        self.items = list(items)
+        self.positions = numpy.array([(item.x, item.y) for item in self.items], float).reshape((len(self.items), 2))
+        self._indexes = dict((item, idx) for idx, item in enumerate(self.items))
+        
+    def __len__(self):
+        """Return the number of objects"""
+        return len(self.items)
+        
+    def getDistances(self, x, y):
+        """Return an array of the distance of each object from a point"""
+        return numpy.hypot(self.positions[:, 0] - x, self.positions[:, 1] - y)
+    
+    def findNearest(self, x, y, exclude=None):
+        """Return the (object, distance) of the object nearest to a point or (None, None) if there is none
+        
+        :param exclude: an object to ignore (eg the object you are finding the nearest to)
+        
+        """
+        distances = self.getDistances(x, y)
+        if exclude in self._indexes:
+            distances[self._indexes[exclude]] = numpy.inf
+        if len(distances):
+            idx = distances.argmin()
+            if distances[idx] != numpy.inf:
+                return self.items[idx], float(distances[idx])
+        return None, None
+        
+    def findInRadius(self, x, y, radius):
+        """Return the objects whose centers are within a radius of a point"""
+        return [self.items[idx] for idx in numpy.flatnonzero(self.getDistances(x, y) <= radius)]
+    
+    def getFalloff(self, x, y, distance):
+        """Return the sum of a linear falloff from each object to a point
+        
+        Each object contributes 1.0 at its center falling to 0.0 at the
+        distance away.
+        
+        """
+        return float(numpy.maximum(0.0, 1.0 - self.getDistances(x, y)/distance).sum())
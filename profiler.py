@@ -1,13 +1,19 @@
 """Stores profiling information to help optimize game times"""
 
 import time
+import json
+import collections
 
 class NullProfiler(object):
     """A profiler that does nothing at all.
     
-    This is used as the default profiler as it is fast.
+    This is used as the default profiler as it is fast. Code that calls the
+    profiler in a tight loop should check the enabled flag and skip
+    the calls altogether when it is False.
     
     """
+    
+    enabled = False
 
     def __init__(self):
         """Initialise the NullProfiler"""
@@ -31,11 +37,19 @@ class NullProfiler(object):
 
     def byTag(self, tag):
         """Return data for action by the tag"""
+
+    def startFrame(self):
+        """Called by the engine when a new frame starts"""
+        
+    def endFrame(self):
+        """Called by the engine when a frame has finished"""
    
    
 class Profiler(NullProfiler):
     """A profiler to collect statistics from the game execution"""
 
+    enabled = True
+
     def __init__(self):
         """Initialise the Profiler"""
         self._data = {
@@ -59,7 +73,11 @@ class Profiler(NullProfiler):
     def end(self):
         """Start an activity with an actor"""
         started, actor, activity = self._activities.pop()
-        duration = time.time()-started
+        if actor is not None:
+            self._record(actor, activity, time.time()-started)
+        
+    def _record(self, actor, activity, duration):
+        """Record the duration of an activity for an actor"""
         #
         # Name
         record = self._data['names'].setdefault(actor.name, {})
@@ -67,7 +85,7 @@ class Profiler(NullProfiler):
         record[activity] = (times+1, duration+total)
         #
         # Tag
-        record = self._data['tags'].setdefault(actor.tag, {})
+        record = self._data['tags'].setdefault(getattr(actor, 'tag', None), {})
         times, total = record.get(activity, (0, 0))
         record[activity] = (times+1, duration+total)
         
@@ -79,5 +97,96 @@ class Profiler(NullProfiler):
         """Return data for action by the tag"""
         return self._data['tags'][tag]
 
+
+class HierarchicalProfiler(Profiler):
+    """A profiler that records nested spans of activities for each frame
+    
+    As well as the statistics collected by the Profiler, each activity is
+    recorded as a span inside the activity that was running when it started.
+    The spans can be exported as Chrome trace events (view them in 
+    chrome://tracing) or as folded stacks for flame graph tools.
+    
+    """
+    
+    def __init__(self, max_events=100000):
+        """Initialise the HierarchicalProfiler
+        
+        :param max_events: the maximum number of spans to keep for the trace (oldest are dropped)
+        
+        """
+        super(HierarchicalProfiler, self).__init__()
+        self._origin = time.time()
+        self._events = collections.deque(maxlen=max_events)
+        self._stacks = {}
+        self._frame = 0
+        
+    def start(self, actor, activity):
+        """Start an activity with an actor"""
+        name = activity if actor is None else '%s:%s' % (activity, getattr(actor, 'tag', actor.name))
+        path = '%s;%s' % (self._activities[-1][3], name) if self._activities else name
+        # Entries are (start time, actor, activity, path, time spent in children)
+        self._activities.append([time.time(), actor, activity, path, 0.0])
+    
+    def end(self):
+        """End the current activity"""
+        started, actor, activity, path, children = self._activities.pop()
+        duration = time.time()-started
+        if self._activities:
+            self._activities[-1][4] += duration
+        #
+        self._stacks[path] = self._stacks.get(path, 0.0) + duration - children
+        self._events.append((path.rsplit(';', 1)[-1], activity, started, duration, 
+                             len(self._activities), self._frame, actor.name if actor else ''))
+        if actor is not None:
+            self._record(actor, activity, duration)
+
+    def startFrame(self):
+        """Called by the engine when a new frame starts"""
+        self._frame += 1
+        self.start(None, 'frame')
+        
+    def endFrame(self):
+        """Called by the engine when a frame has finished"""
+        #
+        # Close any spans that were left open (eg by an exception)
+        while self._activities:
+            self.end()
+
+    def getFrameCount(self):
+        """Return the number of frames recorded"""
+        return self._frame
         
+    def getStacks(self):
+        """Return a dictionary of the self time (in s) spent in each stack of activities
+        
+        The keys are the semi-colon separated names of the nested activities.
+        
+        """
+        return dict(self._stacks)
+        
+    def getTraceEvents(self):
+        """Return the spans as a list of Chrome trace event dictionaries"""
+        return [{
+                'name': name, 'cat': activity, 'ph': 'X', 
+                'ts': (started-self._origin)*1000000.0, 'dur': duration*1000000.0,
+                'pid': 1, 'tid': 1, 'args': {'frame': frame, 'depth': depth, 'actor': actor_name},
+            } for name, activity, started, duration, depth, frame, actor_name in self._events]
+        
+    def exportChromeTrace(self, filename):
+        """Export the spans to a file in the Chrome trace event format"""
+        with file(filename, 'w') as f:
+            json.dump({'traceEvents': self.getTraceEvents(), 'displayTimeUnit': 'ms'}, f)
+            
+    def exportFlameGraph(self, filename):
+        """Export the stacks to a file in the folded format used by flame graph tools
+        
+        Each line is the stack followed by the self time in microseconds.
+        
+        """
+        with file(filename, 'w') as f:
+            for path, duration in sorted(self._stacks.iteritems()):
+                f.write('%s %d\n' % (path, int(duration*1000000)))
+
+
+NULL_PROFILER = NullProfiler()
 PROFILER = Profiler()
@@ -1,5 +1,7 @@
 """Classes to perform rendering"""
 
+import os
+import weakref
 import pygame
 
 import common
@@ -11,6 +13,30 @@ import events
 class DuplicateLayer(Exception): """The layer was already present"""
 class UnknownLayer(Exception): """The layer was not found"""
 class NoLayer(Exception): """A layer was not found when one was expected"""
+class InvalidSurfaceFormat(Exception): """The surface format for a layer was not recognized"""
+
+# Display modes for the renderer
+D_WINDOW = 0 # Render to a window on the display
+D_OFFSCREEN = 1 # Render to surfaces but never show them on a display
+D_NONE = 2 # Do not render at all - only simulate
+
+# When there are more than this many dirty rectangles they are combined into one
+MAX_DIRTY_RECTS = 32
+
+# Surface formats for layers
+F_ALPHA = 0 # A surface with per-pixel alpha
+F_OPAQUE = 1 # An opaque surface in the display format that hides everything beneath it
+F_COLOUR_KEY = 2 # A surface in the display format where COLOUR_KEY is transparent
+
+# The transparent colour for colour keyed layers
+COLOUR_KEY = (255, 0, 255)
+
+# The colours to clear each format of surface to
+CLEAR_COLOURS = {
+    F_ALPHA: (0, 0, 0, 0),
+    F_OPAQUE: (0, 0, 0),
+    F_COLOUR_KEY: COLOUR_KEY,
+}
 
 
 class Renderer(common.Loggable, serialize.Serializable, common.EventAware):
@@ -25,9 +51,14 @@ class Renderer(common.Loggable, serialize.Serializable, common.EventAware):
         serialize.O('camera', None, 'the camera for this renderer'),
         serialize.O('icon', None, 'the icon for the main window'),
         serialize.B('fullscreen', False, 'whether to display in full screen or not'),
+        serialize.I('display_mode', D_WINDOW, 'how to display the rendering (D_WINDOW, D_OFFSCREEN or D_NONE)'),
+        serialize.B('dirty_rects', False, 'whether to only redraw and update the parts of the screen that change'),
+        serialize.F('render_scale', 1.0, 'the fraction of the screen resolution to render at'),
+        serialize.B('smooth_scale', False, 'whether to smooth the rendering when scaling it to the screen'),
     )
     
-    def __init__(self, width=640, height=480, title='Serge', backcolour=(0,0,0), icon=None, fullscreen=False):
+    def __init__(self, width=640, height=480, title='Serge', backcolour=(0,0,0), icon=None, fullscreen=False,
+            display_mode=D_WINDOW, dirty_rects=False, render_scale=1.0, smooth_scale=False):
         """Initialise the Renderer"""
         self.addLogger()
         self.initEvents()
@@ -37,6 +68,10 @@ class Renderer(common.Loggable, serialize.Serializable, common.EventAware):
         self.layers = []
         self.backcolour = backcolour
         self.fullscreen = fullscreen
+        self.display_mode = display_mode
+        self.dirty_rects = dirty_rects
+        self.render_scale = render_scale
+        self.smooth_scale = smooth_scale
         self.camera = camera.Camera()
         self.camera.setSpatial(0, 0, self.width, self.height)
         self.icon = icon
@@ -49,13 +84,28 @@ class Renderer(common.Loggable, serialize.Serializable, common.EventAware):
         self.addLogger()
         self.initEvents()
         self._sort_needed = False
+        self._interpolation = 1.0
+        self._dirty = None
+        self._dirty_mode = False
+        self._full_redraw = True
+        self._active_layers = []
+        self._layers_by_name = dict([(layer.name, layer) for layer in self.layers])
+        #
+        # When headless we still need a display surface (for converting images etc) but
+        # we use the dummy driver so that nothing is shown. When we are not rendering at
+        # all the display, and so the layers, are a single pixel to save their memory.
+        if self.isHeadless():
+            self._useDummyDisplay()
         pygame.display.set_caption(self.title)
+        size = (self.width, self.height) if self.isRendering() else (1, 1)
         # 
         # Tried the following with flags but no impact pygame.FULLSCREEN|pygame.HWSURFACE|pygame.DOUBLEBUF
-        flags = pygame.FULLSCREEN if self.fullscreen else 0
-        self.surface = pygame.display.set_mode((self.width, self.height), flags | pygame.HWSURFACE)
+        flags = pygame.FULLSCREEN if self.fullscreen and not self.isHeadless() else 0
+        self.surface = pygame.display.set_mode(size, flags | pygame.HWSURFACE)
+        self._createBuffer()
         for layer in self.layers:
-            layer.setSurface(pygame.Surface((self.width, self.height), pygame.SRCALPHA, 32))
+            layer.scale = self.render_scale
+            layer.setSurface(self.createSurface(layer.surface_format))
             layer.init()
         self.camera.init()
         self.camera.resizeTo(self.width, self.height)
@@ -64,6 +114,23 @@ class Renderer(common.Loggable, serialize.Serializable, common.EventAware):
         #
         self._render_layer_dict = None
         
+    def _useDummyDisplay(self):
+        """Switch pygame to use the dummy video driver"""
+        if pygame.display.get_init() and pygame.display.get_driver() == 'dummy':
+            return
+        self.log.info('Switching to the dummy display driver for headless rendering')
+        pygame.display.quit()
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        pygame.display.init()
+        
+    def isHeadless(self):
+        """Return True if the renderer is not showing anything on the display"""
+        return self.display_mode != D_WINDOW
+        
+    def isRendering(self):
+        """Return True if the renderer should be rendering at all"""
+        return self.display_mode != D_NONE
+        
     ### Layers ###
     
     def addLayer(self, layer):
@@ -73,6 +140,7 @@ class Renderer(common.Loggable, serialize.Serializable, common.EventAware):
             raise DuplicateLayer('The layer %s is already in the renderer' % layer)
         else:
             self.layers.append(layer)
+            self._layers_by_name[layer.name] = layer
         self._sort_needed = True
         self.resetSurfaces()
         #
@@ -83,8 +151,14 @@ class Renderer(common.Loggable, serialize.Serializable, common.EventAware):
 
     def getLayer(self, name):
         """Return the named layer"""
+        layer = self._layers_by_name.get(name)
+        if layer is not None and layer.name == name:
+            return layer
+        #
+        # The layer may have been renamed
         for layer in self.layers:
             if layer.name == name:
+                self._layers_by_name[name] = layer
                 return layer
         else:
             raise UnknownLayer('No layer with name "%s" was found' % (name,))
@@ -107,7 +181,9 @@ class Renderer(common.Loggable, serialize.Serializable, common.EventAware):
         """
         self._sortLayers()
         for layer in self.getLayers():
+            layer.scale = self.render_scale
             layer.initSurface(self)
+        self.invalidate()
 
     def getLayers(self):
         """Return all the layers"""
@@ -119,6 +195,8 @@ class Renderer(common.Loggable, serialize.Serializable, common.EventAware):
             self.layers.remove(layer)
         except ValueError:
             raise UnknownLayer('The layer %s was not found' % layer.getNiceName())
+        self._layers_by_name = dict([(layer.name, layer) for layer in self.layers])
+        self.invalidate()
         #
         # Update the layer dictionary cache
         self.getRenderingOrderDictionary()
@@ -131,6 +209,8 @@ class Renderer(common.Loggable, serialize.Serializable, common.EventAware):
     def clearLayers(self):
         """Clear all the layers"""
         self.layers = []
+        self._layers_by_name = {}
+        self.invalidate()
         
     def _sortLayers(self):
         """Sort the layers into the right order"""
@@ -152,6 +232,11 @@ class Renderer(common.Loggable, serialize.Serializable, common.EventAware):
         #
         return [actor for _, actor in actor_list]
 
+    def orderLayerNames(self, names):
+        """Return the layer names sorted into the order that they should be rendered"""
+        layers = dict([(layer.name, layer.order) for layer in self.getLayers()])
+        return sorted(names, key=lambda name: layers.get(name, 0))
+
     def getRenderingOrder(self, layer):
         """Return the order that a layer will be rendered in (0 = first)"""
         try:
@@ -187,14 +272,32 @@ class Renderer(common.Loggable, serialize.Serializable, common.EventAware):
 
     def clearSurface(self):
         """Clear the surface"""
-        self.surface.fill(self.backcolour)
+        self._buffer.fill(self.backcolour)
 
     def preRender(self):
         """Prepare for new rendering"""
-        self.clearSurface()
+        #
+        # Dirty rectangles only work when all the layers have their own surface and we are not scaling
+        active = [layer for layer in self.getLayers() if layer.active]
+        self._dirty_mode = (self.dirty_rects and self._buffer is self.surface and 
+            all(layer.supports_dirty_rects for layer in active))
+        if self._dirty_mode:
+            self._dirty = []
+            if self._full_redraw or active != self._active_layers:
+                self._active_layers = active
+                self.addDirtyRect(self.surface.get_rect())
+                for layer in self.getLayers():
+                    layer.invalidate()
+                self._full_redraw = False
+        else:
+            self._dirty = None
+            self._full_redraw = True
+            self.clearSurface()
+        #
         for layer in self.getLayers():
             if layer.active:
-                layer.clearSurface()
+                if not (layer.cached or self._dirty_mode):
+                    layer.clearSurface()
                 layer.preRender()
                 
     def render(self):
@@ -210,16 +313,160 @@ class Renderer(common.Loggable, serialize.Serializable, common.EventAware):
             self._sortLayers()
         #
         # Render all layers
-        for layer in self.layers:
-            if layer.active:
-                layer.render(self.surface)
+        if self._dirty_mode:
+            self._renderDirty()
+        else:
+            for layer in self.layers:
+                if layer.active:
+                    layer.render(self._buffer)
+            #
+            # Scale up to the screen
+            if self._buffer is not self.surface:
+                if self.smooth_scale and self._buffer.get_bitsize() >= 24 and self.surface.get_bitsize() >= 24:
+                    pygame.transform.smoothscale(self._buffer, self.surface.get_size(), self.surface)
+                else:
+                    pygame.transform.scale(self._buffer, self.surface.get_size(), self.surface)
         #
         self.processEvent((events.E_AFTER_RENDER, self))            
 
+    def _renderDirty(self):
+        """Render only the dirty parts of the layers"""
+        if len(self._dirty) > MAX_DIRTY_RECTS:
+            self._dirty = [self._dirty[0].unionall(self._dirty[1:])]
+        for rect in self._dirty:
+            self.surface.fill(self.backcolour, rect)
+            for layer in self.layers:
+                if layer.active:
+                    layer.renderRect(self.surface, rect)
+
+    ### Dirty rectangles ###
+    
+    def setDirtyRects(self, dirty_rects):
+        """Determine whether to only redraw the parts of the screen that change
+        
+        With dirty rectangles the layers are not cleared each frame. Instead the
+        parts of the screen where actors were and are now are cleared and redrawn,
+        for actors that have changed their render state, and only those parts of the
+        screen are updated on the display. Anything else that draws directly on a
+        layer must call addDirtyRect. Dirty rectangles are not used when there are
+        active virtual layers.
+        
+        """
+        self.dirty_rects = dirty_rects
+        self.invalidate()
+        
+    def isUsingDirtyRects(self):
+        """Return True if we are only redrawing the dirty parts of the screen this frame"""
+        return self._dirty_mode
+        
+    def addDirtyRect(self, rect):
+        """Add a rectangle of the screen that needs redrawing this frame
+        
+        Use this if you draw directly on a layer surface when using dirty
+        rectangles. The rectangle is ignored when we are not using dirty
+        rectangles.
+        
+        """
+        if self._dirty is not None:
+            rect = pygame.Rect(rect).clip(self.surface.get_rect())
+            if rect.width and rect.height and not any(dirty.contains(rect) for dirty in self._dirty):
+                self._dirty.append(rect)
+            
+    def getDirtyRects(self):
+        """Return the list of rectangles of the screen that changed or None if it all changed"""
+        return self._dirty
+        
+    def invalidate(self):
+        """Force all of the screen to be redrawn on the next frame
+        
+        When rendering at a lower resolution the images are scaled again,
+        so call this if you draw directly on the surface of a visual.
+        
+        """
+        self._full_redraw = True
+        RenderingLayer.clearScaledImages()
+
     def getSurface(self):
         """Return the overall surface"""
         return self.surface  
     
+    def getRenderSurface(self):
+        """Return the surface that the layers are composed on to
+        
+        This is the overall surface unless we are rendering at a lower
+        resolution, in which case it is a smaller buffer that is scaled
+        up to the overall surface.
+        
+        """
+        return self._buffer
+        
+    def getRenderSize(self):
+        """Return the size that we render at - a single pixel if we are not rendering"""
+        return self._buffer.get_size()
+    
+    def setRenderScale(self, render_scale, smooth_scale=None):
+        """Set the fraction of the screen resolution that we render at
+        
+        Rendering at a lower resolution is faster because there are fewer
+        pixels to draw and compose. The layers are composed in a smaller
+        buffer which is scaled up to the screen once per frame. The camera,
+        actors and mouse all still use screen coordinates.
+        
+        Dirty rectangles are not used when the render scale is not 1.
+        
+        Actors that override renderTo and draw on their layer's surface
+        themselves expect a surface the size of the screen. Unless the
+        actor's supports_render_scale attribute is True (ie it renders using
+        RenderingLayer.renderVisual) it is rendered on a temporary screen
+        sized surface which is then scaled down, which is much slower.
+        
+        """
+        self.render_scale = render_scale
+        if smooth_scale is not None:
+            self.smooth_scale = smooth_scale
+        self._createBuffer()
+        self.resetSurfaces()
+        
+    def _createBuffer(self):
+        """Create the buffer that we compose the layers on to"""
+        if self.render_scale == 1.0 or not self.isRendering():
+            self._buffer = self.surface
+        else:
+            size = (max(1, int(self.width*self.render_scale)), max(1, int(self.height*self.render_scale)))
+            self._buffer = pygame.Surface(size).convert()
+        
+    def createSurface(self, surface_format=F_ALPHA):
+        """Return a new surface with the given format the size that we render at
+        
+        Opaque and colour keyed surfaces are converted to the display format
+        and do not have per-pixel alpha so they are much faster to blit.
+        
+        """
+        size = self.getRenderSize()
+        if surface_format == F_ALPHA:
+            return pygame.Surface(size, pygame.SRCALPHA, 32)
+        elif surface_format == F_OPAQUE:
+            return pygame.Surface(size).convert()
+        elif surface_format == F_COLOUR_KEY:
+            surface = pygame.Surface(size).convert()
+            surface.set_colorkey(COLOUR_KEY)
+            return surface
+        else:
+            raise InvalidSurfaceFormat('The surface format "%s" is not recognized' % (surface_format,))
+    
+    def setInterpolation(self, interpolation):
+        """Set the interpolation factor between the last two simulation steps"""
+        self._interpolation = interpolation
+        
+    def getInterpolation(self):
+        """Return the interpolation factor between the last two simulation steps
+        
+        When the engine runs with a fixed timestep this is the fraction of a 
+        step that has passed since the last simulation update (0 to 1).
+        
+        """
+        return self._interpolation
+        
     ### Camera stuff ###
     
     def setCamera(self, camera):
@@ -235,6 +482,38 @@ class Renderer(common.Loggable, serialize.Serializable, common.EventAware):
         return (self.width, self.height)
     
 
+
+class RenderQueue(object):
+    """A queue of images to blit to a surface
+    
+    The images are blitted together in a single call when the queue
+    is flushed, which is much faster than blitting them one at a time.
+    
+    """
+    
+    def __init__(self, surface):
+        """Initialise the RenderQueue"""
+        self.surface = surface
+        self.blits = []
+        
+    def addBlit(self, image, (x, y)):
+        """Add an image to blit at the given location"""
+        self.blits.append((image, (x, y)))
+        
+    def addBlits(self, blits):
+        """Add a sequence of (image, (x, y)) to blit"""
+        self.blits.extend(blits)
+        
+    def flush(self):
+        """Blit all the images in the queue"""
+        if self.blits:
+            if hasattr(self.surface, 'blits'):
+                self.surface.blits(self.blits, 0)
+            else:
+                for image, coords in self.blits:
+                    self.surface.blit(image, coords)
+            self.blits = []
+
            
 class RenderingLayer(common.Loggable, serialize.Serializable, common.EventAware):
     """A layer on which to render things
@@ -249,10 +528,31 @@ class RenderingLayer(common.Loggable, serialize.Serializable, common.EventAware)
         serialize.I('order', 0, 'the order to render (0=low)'),
         serialize.B('active', True, 'whether this layer is active'),
         serialize.B('static', False, 'whether this layer is static with respect to the camera'),
+        serialize.B('cached', False, 'whether the surface is kept and only redrawn when its actors change'),
+        serialize.I('surface_format', F_ALPHA, 'the format of the surface (F_ALPHA, F_OPAQUE or F_COLOUR_KEY)'),
     )
     
-    def __init__(self, name, order):
-        """Initialise the Layer"""
+    # Whether the layer can redraw parts of its surface when the renderer uses dirty rectangles
+    supports_dirty_rects = False
+    
+    # The scale of the surface compared to the screen - set by the renderer
+    scale = 1.0
+    
+    # Images scaled for rendering at a lower resolution, shared by all layers
+    _scaled_images = weakref.WeakKeyDictionary()
+    
+    # Visuals that cannot be blitted, rendered and scaled for a lower resolution, with their render state
+    _scaled_visuals = weakref.WeakKeyDictionary()
+    
+    def __init__(self, name, order, surface_format=F_ALPHA):
+        """Initialise the Layer
+        
+        :param surface_format: F_ALPHA for a layer with transparency, F_OPAQUE for
+            a layer that covers everything beneath it or F_COLOUR_KEY for a layer
+            where COLOUR_KEY is transparent - eg backgrounds and tiles that do
+            not need per-pixel alpha
+        
+        """
         super(RenderingLayer, self).__init__()
         self.initEvents()
         self.name = name
@@ -260,10 +560,18 @@ class RenderingLayer(common.Loggable, serialize.Serializable, common.EventAware)
         self.surface = None
         self.active = True
         self.static = False
+        self.cached = False
+        self.surface_format = surface_format
+        self._render_state = None
+        self._rendered = None
+        self._view = None
+        self._full_surface = None
+        self._scaled_state = None
 
     def setSurface(self, surface):
         """Set our surface"""
         self.surface = surface
+        self.invalidate()
 
     def getSurface(self):
         """Return the surface"""
@@ -281,11 +589,225 @@ class RenderingLayer(common.Loggable, serialize.Serializable, common.EventAware)
         """Determine whether this layer is static with respect to camera movements or not"""
         self.static = static
         
+    def setCached(self, cached):
+        """Determine whether the surface is kept between frames
+        
+        A cached layer is not cleared each frame. It is only cleared and
+        redrawn when the render state of the actors on it, or the camera,
+        changes. If you draw on the layer or change a visual in a way that
+        is not detected then call invalidate to force a redraw.
+        
+        """
+        self.cached = cached
+        self.invalidate()
+        
+    def invalidate(self):
+        """Force a cached layer to be redrawn on the next frame"""
+        self._render_state = None
+        self._rendered = None
+        
+    def needsRedraw(self, actors, camera):
+        """Return True if a cached layer needs to redraw the given actors
+        
+        The surface is cleared when a redraw is needed.
+        
+        """
+        state = [] if self.static else [camera.getOrigin(), camera.zoom]
+        for actor in actors:
+            if actor.active and actor.visible:
+                actor_state = actor.getRenderState()
+                if actor_state is None:
+                    state = None
+                    break
+                state.append((id(actor), actor_state))
+        #
+        if state is None or state != self._render_state:
+            self._render_state = state
+            self.clearSurface()
+            return True
+        return False
+        
+    def findDirtyRects(self, actors, camera):
+        """Return the screen rectangles that need redrawing for the given actors
+        
+        The rectangles are where actors were and are now for any actor that has
+        been added, removed or has changed its render state since the last
+        frame. The whole surface is dirty if the camera moves (for a non-static
+        layer) or an actor does not know its render state now or did not know
+        it last frame (since it may have drawn outside its rectangle). The
+        dirty rectangles are cleared on the surface.
+        
+        """
+        full = self.surface.get_rect()
+        view = None if self.static else (camera.getOrigin(), camera.zoom)
+        everything = self._rendered is None or view != self._view or \
+            any(state is None for state, rect in self._rendered.itervalues())
+        #
+        # Find where each actor is rendered
+        rendered = {}
+        for actor in actors:
+            if actor.active and actor.visible:
+                state = actor.getRenderState()
+                everything = everything or state is None
+                if self.static:
+                    x, y = actor.getOrigin()
+                else:
+                    x, y = camera.getRelativeLocation(actor)
+                # Allow a pixel for rounding to the screen
+                rendered[id(actor)] = (state, pygame.Rect(x-1, y-1, actor.width+2, actor.height+2))
+        #
+        # Find the changes
+        if everything:
+            rects = [full]
+        else:
+            rects = []
+            for key, (state, rect) in rendered.iteritems():
+                previous = self._rendered.get(key)
+                if previous is None:
+                    rects.append(rect)
+                elif previous != (state, rect):
+                    rects.extend((previous[1], rect))
+            for key, (state, rect) in self._rendered.iteritems():
+                if key not in rendered:
+                    rects.append(rect)
+            rects = [rect.clip(full) for rect in rects]
+            rects = [rect for rect in rects if rect.width and rect.height]
+        #
+        self._rendered = rendered
+        self._view = view
+        for rect in rects:
+            self.clearRect(rect)
+        return rects
+        
+    def renderVisual(self, visual, interval, (x, y), queue=None):
+        """Render a visual to our surface at the given screen location
+        
+        If a render queue is given then the visual is added to the queue
+        if it can be batched - visuals that override renderTo without
+        also overriding getBlit are always rendered with renderTo. When
+        we are rendering at a lower resolution the location and images
+        are scaled to our surface.
+        
+        """
+        if queue is None and self.scale == 1.0:
+            visual.renderTo(interval, self.surface, (x, y))
+            return
+        #
+        blit = visual.getBlit(interval, (x, y)) if _canBlit(visual) else None
+        if blit is None:
+            if queue:
+                queue.flush()
+            if self.scale == 1.0:
+                visual.renderTo(interval, self.surface, (x, y))
+            else:
+                self.surface.blit(self._getScaledRendering(visual, interval), (x*self.scale, y*self.scale))
+        else:
+            image, (bx, by) = blit
+            if self.scale != 1.0:
+                image, bx, by = self.getScaledImage(image), bx*self.scale, by*self.scale
+            if queue:
+                queue.addBlit(image, (bx, by))
+            else:
+                self.surface.blit(image, (bx, by))
+        
+    @classmethod
+    def clearScaledImages(cls):
+        """Forget all the images that have been scaled for rendering at a lower resolution"""
+        cls._scaled_images.clear()
+        cls._scaled_visuals.clear()
+        
+    def getScaledImage(self, image):
+        """Return an image scaled to our surface
+        
+        The scaled images are cached until the original image is no longer used
+        or clearScaledImages is called. Drawing on the original image is not
+        detected so call clearScaledImages (or Renderer.invalidate) if you do this.
+        
+        """
+        if self.scale == 1.0:
+            return image
+        cache = self._scaled_images.setdefault(image, {})
+        try:
+            return cache[self.scale]
+        except KeyError:
+            scaled = cache[self.scale] = self._scaleImage(image)
+            return scaled
+            
+    def startFullSize(self, renderer):
+        """Start rendering actors that draw on our surface themselves at full size
+        
+        When we are at a lower resolution, until stopFullSize is called our surface
+        is a temporary surface the size of the screen (and our scale is 1) so a run
+        of these actors can be drawn on it and then scaled down together.
+        
+        """
+        size = (renderer.width, renderer.height)
+        if self._full_surface is None or self._full_surface.get_size() != size:
+            self._full_surface = pygame.Surface(size, pygame.SRCALPHA, 32)
+        self._full_surface.fill((0, 0, 0, 0))
+        self._scaled_state = (self.surface, self.scale)
+        self.surface, self.scale = self._full_surface, 1.0
+        
+    def stopFullSize(self):
+        """Stop rendering at full size and scale the part that was drawn on down to our surface"""
+        full = self.surface
+        self.surface, self.scale = self._scaled_state
+        self._scaled_state = None
+        rect = full.get_bounding_rect()
+        if rect.width and rect.height:
+            self.surface.blit(self._scaleImage(full.subsurface(rect)), (int(rect.x*self.scale), int(rect.y*self.scale)))
+        
+    def _getScaledRendering(self, visual, interval):
+        """Return a visual rendered at full size and scaled to our surface
+        
+        The result is reused until the render state of the visual changes. Visuals
+        that do not know their render state are rendered and scaled every time.
+        
+        """
+        state = visual.getRenderState() if hasattr(visual, 'getRenderState') else None
+        if state is not None:
+            try:
+                cached_state, scale, scaled = self._scaled_visuals[visual]
+            except KeyError:
+                pass
+            else:
+                if scale == self.scale and cached_state == state:
+                    return scaled
+        #
+        # Render at full size and then scale it down
+        image = pygame.Surface((int(visual.width), int(visual.height)), pygame.SRCALPHA, 32)
+        visual.renderTo(interval, image, (0, 0))
+        scaled = self._scaleImage(image)
+        if state is not None:
+            self._scaled_visuals[visual] = (state, self.scale, scaled)
+        return scaled
+        
+    def _scaleImage(self, image):
+        """Return an image scaled to our surface"""
+        w, h = image.get_size()
+        size = (max(1, int(w*self.scale)), max(1, int(h*self.scale)))
+        if image.get_bitsize() >= 24 and image.get_colorkey() is None:
+            return pygame.transform.smoothscale(image, size)
+        else:
+            return pygame.transform.scale(image, size)
+        
+    def isRenderedIn(self, actor, rect):
+        """Return True if the actor was rendered within a rectangle during the last findDirtyRects"""
+        try:
+            return self._rendered[id(actor)][1].colliderect(rect)
+        except KeyError:
+            return False
+        
     ### Serializing ###
     
     def init(self):
         """Initialise from serialized state"""
         self.initEvents()
+        self._render_state = None
+        self._rendered = None
+        self._view = None
+        self._full_surface = None
+        self._scaled_state = None
         
     ### Rendering ###
           
@@ -293,6 +815,10 @@ class RenderingLayer(common.Loggable, serialize.Serializable, common.EventAware)
         """Clear our surface"""
         raise NotImplementedError
     
+    def clearRect(self, rect):
+        """Clear part of our surface"""
+        raise NotImplementedError
+    
     def preRender(self):
         """Called before the layer has anything rendered to"""
         self.processEvent((events.E_BEFORE_RENDER, self))
@@ -301,6 +827,10 @@ class RenderingLayer(common.Loggable, serialize.Serializable, common.EventAware)
         """Render to a surface"""
         raise NotImplementedError
         
+    def renderRect(self, surface, rect):
+        """Render part of our surface to the same part of another surface"""
+        raise NotImplementedError
+        
     def postRender(self):
         """Called after the layer has has had everything rendered on it"""
         self.processEvent((events.E_AFTER_RENDER, self))
@@ -315,22 +845,32 @@ class Layer(RenderingLayer):
     
     """
 
+    supports_dirty_rects = True
+
     def initSurface(self, renderer):
         """Create the surface that we need to draw on
         
         We create a surface that is identical to the background for the
-        main renderer.
+        main renderer, in the format that we need.
         
         """
-        self.setSurface(pygame.Surface((renderer.width, renderer.height), pygame.SRCALPHA, 32))
+        self.setSurface(renderer.createSurface(self.surface_format))
      
     def clearSurface(self):
         """Clear our surface"""
-        self.surface.fill((0,0,0,0))
+        self.surface.fill(CLEAR_COLOURS[self.surface_format])
+
+    def clearRect(self, rect):
+        """Clear part of our surface"""
+        self.surface.fill(CLEAR_COLOURS[self.surface_format], rect)
 
     def render(self, surface):
         """Render to a surface"""
         surface.blit(self.surface, (0,0))
+
+    def renderRect(self, surface, rect):
+        """Render part of our surface to the same part of another surface"""
+        surface.blit(self.surface, rect, rect)
     
 class VirtualLayer(RenderingLayer):
     """A rendering layer that doesn't have its own surface
@@ -350,7 +890,7 @@ class VirtualLayer(RenderingLayer):
         try:
             self.setSurface(renderer.getLayerBefore(self).getSurface())
         except NoLayer:
-            self.setSurface(renderer.getSurface())
+            self.setSurface(renderer.getRenderSurface())
             
     def clearSurface(self):
         """Clear our surface
@@ -367,3 +907,19 @@ class VirtualLayer(RenderingLayer):
         
         """
         pass    
+
+
+# Visual classes that can be rendered with getBlit - those that do not override renderTo
+# below the class that defines getBlit
+_blittable = {}
+
+def _canBlit(a_visual):
+    """Return True if a visual can be rendered using its getBlit method"""
+    cls = a_visual.__class__
+    try:
+        return _blittable[cls]
+    except KeyError:
+        owner = ([base for base in getattr(cls, '__mro__', ()) if 'getBlit' in base.__dict__] or [None])[0]
+        result = _blittable[cls] = owner is not None and \
+            getattr(cls.renderTo, 'im_func', None) is getattr(owner.renderTo, 'im_func', None)
+        return result
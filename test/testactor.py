@@ -2,6 +2,7 @@
 
 import unittest
 import os
+import math
 import pymunk
 
 from helper import *
@@ -601,6 +602,7 @@ class TestActor(unittest.TestCase):
         cc = w2.findActorByName('c')
         #
         aa.moveTo(100, 100)
+        w2.updateTransforms()
         self.assertEqual((110, 120), (bb.x, bb.y))
         self.assertEqual((140, 160), (cc.x, cc.y))
         #
@@ -609,6 +611,88 @@ class TestActor(unittest.TestCase):
         self.assertRaises(serge.actor.PositionLocked, bb.setAngle, 10)
         self.assertRaises(serge.actor.PositionLocked, cc.setAngle, 10)
         
+    def testMountedActorsInWorldMoveWhenTransformsUpdate(self):
+        """testMountedActorsInWorldMoveWhenTransformsUpdate: mounted actors in the world should move once when transforms update"""
+        a = serge.actor.MountableActor('main', 'a')
+        b = serge.actor.MountableActor('b', 'b')
+        c = serge.actor.Actor('c', 'c')
+        a.mountActor(b, (10, 0))
+        b.mountActor(c, (10, 0))
+        self.w.addActor(a)
+        moves = []
+        c.moveTo = lambda x, y, **kw: moves.append((x, y)) or serge.actor.Actor.moveTo(c, x, y, **kw)
+        #
+        a.moveTo(100, 100)
+        a.moveTo(200, 100)
+        a.setAngle(90)
+        self.assertEqual((20, 0), (c.x, c.y))
+        self.assertEqual([], moves)
+        #
+        self.w.updateWorld(0)
+        self.assertEqual((200, 80), (round(c.x), round(c.y)))
+        self.assertEqual((90, 90), (b.getAngle(), c.getAngle()))
+        self.assertEqual(1, len(moves))
+        #
+        # Should not move again if nothing changed
+        self.w.updateTransforms()
+        self.assertEqual(1, len(moves))
+        
+    def testMountedActorsInWorldKeepPhysicsSyncing(self):
+        """testMountedActorsInWorldKeepPhysicsSyncing: mounted actors in the world should follow the physics sync options"""
+        a = serge.actor.MountableActor('main', 'a')
+        b = serge.actor.Actor('b', 'b')
+        b.setPhysical(serge.physical.PhysicalConditions(mass=1, radius=1))
+        a.mountActor(b, (10, 0))
+        self.w.addActor(a)
+        self.w.updateTransforms()
+        body = b.getPhysical().body
+        start = tuple(body.position)
+        #
+        # Moves that do not sync should leave the body alone
+        a.moveTo(100, 100, no_sync=True)
+        a.moveTo(200, 100, no_sync=True)
+        self.w.updateTransforms()
+        self.assertEqual((210, 100), (b.x, b.y))
+        self.assertEqual(start, tuple(body.position))
+        #
+        # A move that syncs should sync
+        a.moveTo(300, 100, no_sync=True)
+        a.moveTo(400, 100)
+        self.w.updateTransforms()
+        self.assertEqual((410, 100), tuple(body.position))
+        #
+        # Rotations should sync the angle when asked
+        a.setAngle(90)
+        self.w.updateTransforms()
+        self.assertEqual(0, body.angle)
+        a.setAngle(180, sync_physical=True)
+        self.w.updateTransforms()
+        self.assertAlmostEqual(math.radians(-180), body.angle)
+        
+    def testMountedActorsMoveWhenRemovedFromWorld(self):
+        """testMountedActorsMoveWhenRemovedFromWorld: mounted actors should be updated when removed from the world"""
+        a = serge.actor.MountableActor('main', 'a')
+        b = serge.actor.Actor('b', 'b')
+        a.mountActor(b, (10, 20))
+        self.w.addActor(a)
+        a.moveTo(100, 100)
+        self.w.removeActor(a)
+        self.assertEqual((110, 120), (b.x, b.y))
+        a.moveTo(200, 200)
+        self.assertEqual((210, 220), (b.x, b.y))
+        
+    def testCanPreRotateMountedActorInWorld(self):
+        """testCanPreRotateMountedActorInWorld: should mount against the initial rotation when in the world"""
+        a = serge.actor.MountableActor('main')
+        self.w.addActor(a)
+        a.setAngle(90)
+        a.moveTo(100, 100)
+        b = serge.actor.Actor('b')
+        a.mountActor(b, (10, 0), original_rotation=True)
+        self.w.updateTransforms()
+        self.assertEqual(90, b.getAngle())
+        self.assertEqual((100, 90), (round(b.x), round(b.y)))
+
     ### Mounting actors to other actors - physical version using pymunk ###
     
     def testCanMountActorPhysical(self):
@@ -0,0 +1,103 @@
+"""Tests for the benchmark suite"""
+
+import unittest
+import os
+
+from helper import *
+
+import serge.render
+import serge.engine
+import serge.visual
+import serge.benchmark.scenes
+import serge.benchmark.runner
+
+
+class TestBenchmark(unittest.TestCase):
+    """Tests for the Benchmark"""
+
+    def setUp(self):
+        """Set up the tests"""
+
+    def tearDown(self):
+        """Tear down the tests"""
+
+    ### Scenes ###
+
+    def testCanRunAllScenes(self):
+        """testCanRunAllScenes: should be able to run all the scenes"""
+        for cls, count in serge.benchmark.scenes.DEFAULT_SCENES:
+            result = serge.benchmark.runner.runScene(cls(10), frames=3)
+            self.assertEqual(cls.name, result['scene'])
+            self.assertEqual(3, result['frames'])
+            self.assert_(result['frame_time'] > 0.0)
+            self.assert_('update' in result['phases'])
+
+    def testScenesCleanUp(self):
+        """testScenesCleanUp: running a scene should not leave sprites or files behind"""
+        import tempfile
+        before = set(os.listdir(tempfile.gettempdir()))
+        serge.benchmark.runner.runScene(serge.benchmark.scenes.TiledScene(10), frames=2)
+        for name in serge.benchmark.scenes.SPRITE_NAMES:
+            self.assertFalse(serge.visual.Register.hasItem(name))
+        created = set(os.listdir(tempfile.gettempdir())) - before
+        self.assertEqual([], [name for name in created if name.startswith('serge-benchmark-')])
+        self.assertEqual(None, os.environ.get('SERGE_HEADLESS'))
+
+    def testScenesAreReproducible(self):
+        """testScenesAreReproducible: scenes should place actors in the same place each time"""
+        locations = []
+        for i in range(2):
+            e = serge.engine.Engine()
+            w = serge.benchmark.scenes.ActorScene(20).createWorld(e)
+            locations.append(sorted([(a.name, a.x, a.y) for a in w.getActors()]))
+        self.assertEqual(locations[0], locations[1])
+
+    def testMountedSceneBuildsTrees(self):
+        """testMountedSceneBuildsTrees: the mounted scene should create trees of actors"""
+        e = serge.engine.Engine()
+        w = serge.benchmark.scenes.MountedScene(10).createWorld(e)
+        self.assertEqual(10, len(w.getActors()))
+        self.assertEqual(2, len(w.findActorsByTag('root')))
+
+    def testCanSimulateOnly(self):
+        """testCanSimulateOnly: should be able to run without rendering"""
+        result = serge.benchmark.runner.runScene(
+            serge.benchmark.scenes.ActorScene(10), frames=3, display_mode=serge.render.D_NONE)
+        self.assert_('render' not in result['phases'])
+        self.assert_('update' in result['phases'])
+
+    def testCanRunAtLowerResolution(self):
+        """testCanRunAtLowerResolution: should be able to run at a lower resolution"""
+        result = serge.benchmark.runner.runScene(serge.benchmark.scenes.ActorScene(10), frames=3, render_scale=0.5)
+        self.assertEqual(3, result['frames'])
+
+    ### Results ###
+
+    def testCanSaveAndLoadResults(self):
+        """testCanSaveAndLoadResults: should be able to store results"""
+        results = serge.benchmark.runner.runSuite([(serge.benchmark.scenes.ActorScene, 10)], frames=2)
+        serge.benchmark.runner.saveResults(results, j('bench.json'))
+        loaded = serge.benchmark.runner.loadResults(j('bench.json'))
+        self.assertEqual(['actors-10'], loaded['results'].keys())
+        self.assertEqual(2, loaded['results']['actors-10']['frames'])
+
+    def testCanFindRegressions(self):
+        """testCanFindRegressions: should be able to find regressions against a baseline"""
+        baseline = {'results': {
+            'actors-10': {'frame_time': 10.0, 'phases': {'update': {'mean': 2.0}, 'render': {'mean': 5.0}}},
+            'text-10': {'frame_time': 10.0, 'phases': {}},
+        }}
+        results = {'results': {
+            'actors-10': {'frame_time': 10.5, 'phases': {'update': {'mean': 3.0}, 'render': {'mean': 4.0}}},
+            'text-10': {'frame_time': 12.0, 'phases': {}},
+            'tiled-10': {'frame_time': 100.0, 'phases': {}},
+        }}
+        self.assertEqual([
+                ('actors-10', 'update.mean', 2.0, 3.0),
+                ('text-10', 'frame_time', 10.0, 12.0),
+            ], serge.benchmark.runner.compareResults(baseline, results, 0.1))
+        self.assertEqual([], serge.benchmark.runner.compareResults(baseline, results, 1.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
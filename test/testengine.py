@@ -3,6 +3,8 @@
 import unittest
 import time
 import os
+import csv
+import json
 import pygame
 
 from helper import *
@@ -323,8 +325,88 @@ class TestEngine(unittest.TestCase, VisualTester):
         self.e.detachBuilder()
         self.e.run(fps=60, endat=time.time()+1)
         self.assertEqual(0, d.counter)
-        
-    
+
+    ### Fixed timestep ###
+
+    def testVariableTimestepIsDefault(self):
+        """testVariableTimestepIsDefault: by default the frame interval is used for updates"""
+        self.assertEqual(0.0, self.e.getFixedTimestep())
+        self.assertEqual([27], self.e._getSimulationSteps(27))
+        self.assertEqual(1.0, self.e.getInterpolation())
+
+    def testFixedTimestepAccumulates(self):
+        """testFixedTimestepAccumulates: fixed timestep should accumulate time into steps"""
+        self.e.setFixedTimestep(10)
+        self.assertEqual([], self.e._getSimulationSteps(5))
+        self.assertAlmostEqual(0.5, self.e.getInterpolation())
+        self.assertEqual([10.0], self.e._getSimulationSteps(7))
+        self.assertAlmostEqual(0.2, self.e.getInterpolation())
+        self.assertEqual([10.0, 10.0, 10.0], self.e._getSimulationSteps(28))
+        self.assertAlmostEqual(0.0, self.e.getInterpolation())
+        self.assertAlmostEqual(0.0, self.e.getRenderer().getInterpolation())
+
+    def testFixedTimestepLimitsCatchup(self):
+        """testFixedTimestepLimitsCatchup: should not run more than the maximum catchup steps"""
+        self.e.setFixedTimestep(10, max_steps=3)
+        self.assertEqual([10.0, 10.0, 10.0], self.e._getSimulationSteps(105))
+        self.assertAlmostEqual(0.5, self.e.getInterpolation())
+        self.assertEqual([10.0], self.e._getSimulationSteps(5))
+
+    def testCanRunWithFixedTimestep(self):
+        """testCanRunWithFixedTimestep: should be able to run with a fixed timestep"""
+        w1 = IntervalWorld('test1')
+        self.e.addWorld(w1)
+        self.e.setCurrentWorld(w1)
+        self.e.setFixedTimestep(5)
+        self.e.run(fps=60, endat=time.time()+1)
+        self.assertEqual(set([5.0]), set(w1.intervals))
+        self.assert_(abs(sum(w1.intervals)-1000)<=50)
+
+    ### Headless ###
+
+    def testCanRunForFrames(self):
+        """testCanRunForFrames: should be able to run for a number of frames"""
+        w1 = TestWorld('test1')
+        self.e.addWorld(w1)
+        self.e.setCurrentWorld(w1)
+        self.e.run(fps=60, frames=20)
+        self.assertEqual(20, w1.reps)
+
+    def testHeadlessRunsUncapped(self):
+        """testHeadlessRunsUncapped: headless engine should not wait between frames"""
+        self.e = serge.engine.Engine(display_mode=serge.render.D_OFFSCREEN)
+        w1 = IntervalWorld('test1')
+        self.e.addWorld(w1)
+        self.e.setCurrentWorld(w1)
+        start = time.time()
+        self.e.run(fps=60, frames=120)
+        self.assert_(time.time()-start < 1.0)
+        self.assertEqual(120, len(w1.intervals))
+        self.assertEqual(set([1000.0/60]), set(w1.intervals))
+
+    def testSimulateOnlySkipsRendering(self):
+        """testSimulateOnlySkipsRendering: simulate only engine should not render the world"""
+        self.e = serge.engine.Engine(display_mode=serge.render.D_NONE)
+        w1 = RenderCountWorld('test1')
+        self.e.addWorld(w1)
+        self.e.setCurrentWorld(w1)
+        self.e.run(fps=60, frames=10)
+        self.assertEqual(0, w1.renders)
+        #
+        # Nothing is allocated for the display or layers
+        r = self.e.getRenderer()
+        l = r.addLayer(serge.render.Layer('one', 0))
+        self.assertEqual((1, 1), r.getSurface().get_size())
+        self.assertEqual((1, 1), l.getSurface().get_size())
+        self.assertEqual((640, 480), (r.width, r.height))
+        #
+        self.e = serge.engine.Engine(display_mode=serge.render.D_OFFSCREEN)
+        w1 = RenderCountWorld('test1')
+        self.e.addWorld(w1)
+        self.e.setCurrentWorld(w1)
+        self.e.run(fps=60, frames=10)
+        self.assertEqual(10, w1.renders)
+
     ### Serializing ###
     
     def testCanSerializeEngine(self):
@@ -533,9 +615,207 @@ class TestEngine(unittest.TestCase, VisualTester):
         self.assertTrue(p.byTag('act1')['renderActor'][1] > 0.0)
         self.assertEqual(1, p.byTag('act2')['renderActor'][0])
         self.assertTrue(p.byTag('act2')['renderActor'][1] > 0.0)
+
+    def testProfilingOffDoesNotRecord(self):
+        """testProfilingOffDoesNotRecord: with profiling off nothing should be recorded"""
+        w = serge.world.World('test')
+        self.e.addWorld(w)
+        z = serge.zone.Zone()
+        z.active = True
+        w.addZone(z)
+        w.addActor(serge.actor.Actor('act1', 'a'))
+        #
+        w.updateWorld(0)
+        w.renderTo(self.e.getRenderer(), 0)
+        self.assertEqual([], serge.profiler.PROFILER.getNames())
+        #
+        self.e.profilingOn()
+        self.e.profilingOff()
+        w.updateWorld(0)
+        self.assertEqual([], serge.profiler.PROFILER.getNames())
+
+    def testWorldWithoutEngineHasNullProfiler(self):
+        """testWorldWithoutEngineHasNullProfiler: a world not in an engine should not profile"""
+        w = serge.world.World('test')
+        self.assertFalse(w.getProfiler().enabled)
+
+    def testHierarchicalProfilerRecordsSpans(self):
+        """testHierarchicalProfilerRecordsSpans: hierarchical profiler should record nested spans"""
+        self.e.profilingOn(hierarchical=True)
+        w = serge.world.World('test')
+        self.e.addWorld(w)
+        z = serge.zone.Zone()
+        z.active = True
+        w.addZone(z)
+        w.addActor(serge.actor.Actor('act1', 'a'))
+        w.addActor(serge.actor.Actor('act2', 'b'))
+        self.e.setCurrentWorld(w)
+        #
+        self.e.run(60, frames=3)
+        #
+        p = self.e.getProfiler()
+        self.assertEqual(3, p.getFrameCount())
+        self.assertEqual(3, p.byName('a')['updateActor'][0])
+        stacks = p.getStacks()
+        self.assert_('frame;updateZone;updateActor:act1' in stacks)
+        self.assert_('frame;updateZone;updateActor:act2' in stacks)
+        self.assert_('frame;renderWorld;renderActor:act1' in stacks)
+        #
+        events = p.getTraceEvents()
+        frames = [e for e in events if e['name'] == 'frame']
+        actors = [e for e in events if e['name'] == 'updateActor:act1']
+        self.assertEqual(3, len(frames))
+        self.assertEqual(3, len(actors))
+        self.assertEqual(2, actors[0]['args']['depth'])
+        self.assertEqual('a', actors[0]['args']['actor'])
+        self.assert_(frames[0]['ts'] <= actors[0]['ts'])
+        self.assert_(frames[0]['dur'] >= actors[0]['dur'])
+
+    def testHierarchicalProfilerCanExport(self):
+        """testHierarchicalProfilerCanExport: should be able to export chrome trace and flame graph"""
+        p = serge.profiler.HierarchicalProfiler()
+        a = serge.actor.Actor('act1', 'a')
+        p.startFrame()
+        p.start(a, 'updateActor')
+        p.end()
+        p.endFrame()
+        #
+        p.exportChromeTrace(j('trace.json'))
+        data = json.load(file(j('trace.json')))
+        self.assertEqual(['frame', 'updateActor:act1'], sorted([e['name'] for e in data['traceEvents']]))
+        self.assertEqual(set(['X']), set([e['ph'] for e in data['traceEvents']]))
+        #
+        p.exportFlameGraph(j('stacks.txt'))
+        lines = file(j('stacks.txt')).read().splitlines()
+        self.assertEqual(['frame', 'frame;updateActor:act1'], [line.split()[0] for line in lines])
         
-                        
-        
+
+
+class TestEngineStats(unittest.TestCase):
+    """Tests for the EngineStats"""
+
+    def setUp(self):
+        """Set up the tests"""
+        self.s = serge.engine.EngineStats(history=10, hitch_threshold=20.0)
+
+    def tearDown(self):
+        """Tear down the tests"""
+
+    ### Timing buffer ###
+
+    def testBufferKeepsRecentValues(self):
+        """testBufferKeepsRecentValues: timing buffer should keep the most recent values"""
+        b = serge.engine.TimingBuffer(5)
+        for i in range(8):
+            b.addValue(i)
+        self.assertEqual(5, b.getCount())
+        self.assertEqual([3, 4, 5, 6, 7], b.getValues())
+        self.assertEqual(7, b.getLast())
+        self.assertEqual(7, b.getMax())
+        self.assertEqual(5, b.getMean())
+
+    def testBufferPercentiles(self):
+        """testBufferPercentiles: timing buffer should calculate percentiles"""
+        b = serge.engine.TimingBuffer(100)
+        for i in range(100):
+            b.addValue(99-i)
+        self.assertEqual(50, b.getPercentile(50))
+        self.assertEqual(95, b.getPercentile(95))
+        self.assertEqual(99, b.getPercentile(99))
+        self.assertEqual(99, b.getPercentile(100))
+        self.assertEqual(0.0, serge.engine.TimingBuffer(10).getPercentile(50))
+
+    ### Phases ###
+
+    def testCanRecordPhases(self):
+        """testCanRecordPhases: should record the time of each phase"""
+        self.s.startFrame()
+        time.sleep(0.01)
+        self.s.endPhase(serge.engine.P_UPDATE)
+        self.s.endPhase(serge.engine.P_INPUT)
+        self.s.recordFrame()
+        update = self.s.getPhase(serge.engine.P_UPDATE)
+        self.assertEqual(1, update.getCount())
+        self.assert_(update.getLast() >= 9.0)
+        self.assert_(self.s.getPhase(serge.engine.P_INPUT).getLast() < 5.0)
+        self.assertEqual(0.0, self.s.getPhase(serge.engine.P_FLIP).getLast())
+        self.assert_(self.s.getPhase(serge.engine.P_FRAME).getLast() >= update.getLast())
+
+    def testHitchesBlameSlowestPhase(self):
+        """testHitchesBlameSlowestPhase: hitches should be counted against the slowest phase"""
+        self.s.startFrame()
+        self.s.endPhase(serge.engine.P_UPDATE)
+        time.sleep(0.03)
+        self.s.endPhase(serge.engine.P_FLIP)
+        self.s.recordFrame()
+        #
+        self.s.startFrame()
+        self.s.endPhase(serge.engine.P_UPDATE)
+        self.s.recordFrame()
+        #
+        self.assertEqual(1, self.s.hitches)
+        self.assertEqual(1, self.s.hitches_by_phase[serge.engine.P_FLIP])
+        self.assertEqual(0, self.s.hitches_by_phase[serge.engine.P_UPDATE])
+        summary = self.s.getPhaseSummary()
+        self.assertEqual(1, summary[serge.engine.P_FLIP]['hitches'])
+        self.assertEqual(1, summary[serge.engine.P_FRAME]['hitches'])
+        self.assert_(summary[serge.engine.P_FLIP]['max'] >= 29.0)
+
+    def testSummaryOnlyHasRecordedPhases(self):
+        """testSummaryOnlyHasRecordedPhases: the summary should leave out phases that were never recorded"""
+        for i in range(2):
+            self.s.startFrame()
+            self.s.endPhase(serge.engine.P_UPDATE)
+            if i:
+                time.sleep(0.03)
+                self.s.endPhase(serge.engine.P_RENDER)
+            self.s.recordFrame()
+        summary = self.s.getPhaseSummary()
+        self.assertEqual(set([serge.engine.P_UPDATE, serge.engine.P_RENDER, serge.engine.P_FRAME]), set(summary))
+        self.assertEqual(1, summary[serge.engine.P_FRAME]['hitches'])
+        self.assertEqual(1, summary[serge.engine.P_RENDER]['hitches'])
+        self.assertEqual(0, summary[serge.engine.P_UPDATE]['hitches'])
+        #
+        # The flip is not recorded when headless
+        e = serge.engine.Engine(display_mode=serge.render.D_OFFSCREEN)
+        e.run(60, frames=2)
+        summary = e.getStats().getPhaseSummary()
+        self.assert_(serge.engine.P_FLIP not in summary)
+        self.assert_(serge.engine.P_RENDER in summary)
+
+    def testEngineRecordsPhases(self):
+        """testEngineRecordsPhases: running the engine should record phase timings"""
+        e = serge.engine.Engine()
+        e.run(60, frames=5)
+        for name in serge.engine.PHASES:
+            self.assertEqual(5, e.getStats().getPhase(name).getCount())
+
+    ### Exporting ###
+
+    def testCanExportJSON(self):
+        """testCanExportJSON: should be able to export timings to JSON"""
+        for i in range(3):
+            self.s.startFrame()
+            self.s.endPhase(serge.engine.P_RENDER)
+            self.s.recordFrame()
+        self.s.exportJSON(j('stats.json'))
+        data = json.load(file(j('stats.json')))
+        self.assertEqual(3, data['frames'])
+        self.assertEqual(3, len(data['timings']['render']))
+        self.assert_('p95' in data['summary']['render'])
+
+    def testCanExportCSV(self):
+        """testCanExportCSV: should be able to export timings to CSV"""
+        for i in range(3):
+            self.s.startFrame()
+            self.s.endPhase(serge.engine.P_RENDER)
+            self.s.recordFrame()
+        self.s.exportCSV(j('stats.csv'))
+        rows = list(csv.reader(file(j('stats.csv'))))
+        self.assertEqual(list(serge.engine.PHASES) + ['frame'], rows[0])
+        self.assertEqual(4, len(rows))
+
+
 class TestWorld(serge.world.World):
     def __init__(self, name, maxreps=1000):
         """Init"""
@@ -550,7 +830,27 @@ class TestWorld(serge.world.World):
         self.reps += 1
         if self.reps >= self.maxreps:
             self.engine.stop()
-            
+
+class IntervalWorld(serge.world.World):
+    def __init__(self, name):
+        """Init"""
+        super(IntervalWorld, self).__init__(name)
+        self.intervals = []
+
+    def updateWorld(self, interval):
+        """Update me"""
+        self.intervals.append(interval)
+
+class RenderCountWorld(serge.world.World):
+    def __init__(self, name):
+        """Init"""
+        super(RenderCountWorld, self).__init__(name)
+        self.renders = 0
+
+    def renderTo(self, renderer, interval):
+        """Render me"""
+        self.renders += 1
+
 class TestBuilder():
     def __init__(self):
         self.counter = 0
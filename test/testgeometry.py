@@ -1,6 +1,7 @@
 """Tests for Geometry stuff"""
 
 import unittest
+import pygame
 
 import serge.geometry
 import serge.actor
@@ -54,6 +55,45 @@ class TestGeometry(unittest.TestCase):
                 p1 = serge.geometry.Rectangle(x, y, 3, 3)
                 self.assertEqual(False, p1.isOverlapping(s))
         
+    def testOverlapUsesFloats(self):
+        """testOverlapUsesFloats: overlaps should not truncate the coordinates"""
+        s = serge.geometry.Rectangle(0, 0, 10.5, 10.5)
+        self.assertEqual(True, serge.geometry.Rectangle(10.2, 10.2, 1, 1).isOverlapping(s))
+        self.assertEqual(False, serge.geometry.Rectangle(10.5, 0, 1, 1).isOverlapping(s))
+        self.assertEqual(True, serge.geometry.Rectangle(-0.5, 0, 1, 1).isOverlapping(s))
+        self.assertEqual(False, serge.geometry.Rectangle(-0.5, 0, 0.5, 1).isOverlapping(s))
+        self.assertEqual(True, serge.geometry.Rectangle(0.5, 0.5, 10, 10).isInside(s))
+        self.assertEqual(False, serge.geometry.Rectangle(0.6, 0.5, 10, 10).isInside(s))
+        
+    def testRectsMatchPygame(self):
+        """testRectsMatchPygame: rectangle tests should match pygame for whole numbers"""
+        rects = [(x, y, w, h) for x in range(0, 4) for y in range(0, 4) for w in range(0, 3) for h in range(0, 3)]
+        for r1 in rects:
+            s = serge.geometry.SimpleRect(*r1)
+            p = pygame.Rect(r1)
+            for r2 in rects:
+                self.assertEqual(p.colliderect(r2) == 1, s.colliderect(r2), 'colliderect %s %s' % (r1, r2))
+                self.assertEqual(p.contains(r2) == 1, s.contains(r2), 'contains %s %s' % (r1, r2))
+            for x, y in [(0, 0), (1, 2), (2, 2), (4, 4)]:
+                self.assertEqual(p.collidepoint(x, y) == 1, s.collidepoint(x, y))
+            
+    def testZeroSizeRectsOnEdgeDoNotCollide(self):
+        """testZeroSizeRectsOnEdgeDoNotCollide: rectangles with no size on the left or top edge should not collide"""
+        s = serge.geometry.SimpleRect(1, 1, 2, 2)
+        self.assertEqual(False, serge.geometry.SimpleRect(1, 1, 0, 2).colliderect(s))
+        self.assertEqual(False, serge.geometry.SimpleRect(1, 1, 2, 0).colliderect(s))
+        self.assertEqual(False, s.colliderect(serge.geometry.SimpleRect(1, 1, 0, 0)))
+        self.assertEqual(True, serge.geometry.SimpleRect(2, 1, 0, 2).colliderect(s))
+        self.assertEqual(True, serge.geometry.SimpleRect(1.5, 1.5, 0, 0).colliderect(s))
+        self.assertEqual([1], s.collidelistall([(1, 1, 0, 2), (2, 2, 0, 0)]))
+        
+    def testCanCollideWithList(self):
+        """testCanCollideWithList: should be able to find collisions with a list of rectangles"""
+        s = serge.geometry.SimpleRect(0, 0, 10, 10)
+        rects = [(5, 5, 10, 10), (10, 0, 5, 5), (-5, -5, 5.5, 5.5), (2, 2, 0, 0), (20, 20, 1, 1)]
+        self.assertEqual([0, 2, 3], s.collidelistall(rects))
+        self.assertEqual([], s.collidelistall([]))
+        
     def testIsInsidePoint(self):
         """testIsInsidePoint: if try is inside for point should get false"""
         s = serge.geometry.Rectangle.fromCenter(10, 20, 10, 10)
@@ -224,6 +264,100 @@ class TestGeometry(unittest.TestCase):
         self.assertEqual(10, a.getDistanceFrom((60, 60)))
         self.assertEqual(10, b.getDistanceFrom((50, 60)))
 
+    def testCanGetEdgeDistanceFrom(self):
+        """testCanGetEdgeDistanceFrom: should be able to get distance between edges"""
+        a = serge.geometry.Rectangle(0, 0, 10, 10)
+        b = serge.geometry.Rectangle(20, 0, 10, 10)
+        c = serge.geometry.Rectangle(13, 14, 10, 10)
+        self.assertEqual(10, a.getEdgeDistanceFrom(b))
+        self.assertEqual(10, b.getEdgeDistanceFrom(a))
+        self.assertEqual(5, a.getEdgeDistanceFrom(c))
+        self.assertEqual(4, b.getEdgeDistanceFrom(c))
+        self.assertEqual(0, c.getEdgeDistanceFrom(serge.geometry.Rectangle(15, 15, 1, 1)))
+
+    ### Spatial hash ###
+    
+    def testCanFindInSpatialHash(self):
+        """testCanFindInSpatialHash: should be able to find items by location"""
+        h = serge.geometry.SpatialHash(10)
+        a = serge.geometry.Rectangle(5, 5, 10, 10)
+        b = serge.geometry.Rectangle(100, 100, 10, 10)
+        h.addItem(a)
+        h.addItem(b)
+        self.assertEqual(set([a]), h.findAtPoint(12, 12))
+        self.assertEqual(set([b]), h.findAtPoint(105, 105))
+        self.assertEqual(set(), h.findAtPoint(50, 50))
+        self.assertEqual(set([a, b]), h.findInRectangle(0, 0, 100, 100))
+        self.assertEqual(set([a]), h.findInRadius(0, 0, 20))
+        self.assertEqual(set(), h.findInRadius(0, 0, 10))
+        
+    def testCanUpdateSpatialHash(self):
+        """testCanUpdateSpatialHash: should be able to move and remove items"""
+        h = serge.geometry.SpatialHash(10)
+        a = serge.geometry.Rectangle(5, 5, 10, 10)
+        h.addItem(a)
+        a.moveTo(105, 105)
+        h.updateItem(a)
+        self.assertEqual(set(), h.findAtPoint(10, 10))
+        self.assertEqual(set([a]), h.findAtPoint(105, 105))
+        self.assertEqual(True, h.hasItem(a))
+        h.removeItem(a)
+        self.assertEqual(False, h.hasItem(a))
+        self.assertEqual(set(), h.findAtPoint(105, 105))
+        self.assertEqual({}, h._cells)
+        
+    def testSpatialHashRemembersUpdatedItems(self):
+        """testSpatialHashRemembersUpdatedItems: should be able to find the items that were updated"""
+        h = serge.geometry.SpatialHash(10)
+        a = serge.geometry.Rectangle(5, 5, 10, 10)
+        b = serge.geometry.Rectangle(100, 100, 10, 10)
+        h.addItem(a)
+        h.addItem(b)
+        self.assertEqual(set(), h.popUpdatedItems())
+        h.updateItem(a)
+        self.assertEqual(set([a]), h.popUpdatedItems())
+        self.assertEqual(set(), h.popUpdatedItems())
+        h.updateItem(b)
+        h.removeItem(b)
+        self.assertEqual(set(), h.popUpdatedItems())
+        
+    def testSpatialHashHandlesLargeItems(self):
+        """testSpatialHashHandlesLargeItems: large items should always be candidates"""
+        h = serge.geometry.SpatialHash(10, max_cells=4)
+        a = serge.geometry.Rectangle(0, 0, 1000, 1000)
+        h.addItem(a)
+        self.assertEqual(set([a]), h.findAtPoint(-500, -500))
+        self.assertEqual({}, h._cells)
+        h.removeItem(a)
+        self.assertEqual(set(), h.findAtPoint(500, 500))
+
+    ### Point groups ###
+    
+    def testCanCreatePointGroup(self):
+        """testCanCreatePointGroup: should be able to create a group of points"""
+        a = serge.geometry.Rectangle.fromCenter(10, 20, 2, 2)
+        b = serge.geometry.Rectangle.fromCenter(30, 40, 2, 2)
+        g = serge.geometry.PointGroup([a, b])
+        self.assertEqual(2, len(g))
+        self.assertEqual([[10, 20], [30, 40]], g.positions.tolist())
+        self.assertEqual(0, len(serge.geometry.PointGroup([])))
+        
+    def testCanFindInPointGroup(self):
+        """testCanFindInPointGroup: should be able to find points in a group"""
+        a = serge.geometry.Rectangle.fromCenter(0, 0, 2, 2)
+        b = serge.geometry.Rectangle.fromCenter(30, 40, 2, 2)
+        c = serge.geometry.Rectangle.fromCenter(100, 0, 2, 2)
+        g = serge.geometry.PointGroup([a, b, c])
+        self.assertEqual([0, 50, 100], g.getDistances(0, 0).tolist())
+        self.assertEqual((a, 0.0), g.findNearest(0, 0))
+        self.assertEqual((b, 50.0), g.findNearest(0, 0, exclude=a))
+        self.assertEqual((None, None), serge.geometry.PointGroup([a]).findNearest(0, 0, exclude=a))
+        self.assertEqual((None, None), serge.geometry.PointGroup([]).findNearest(0, 0))
+        self.assertEqual([a, b], g.findInRadius(0, 0, 50))
+        self.assertEqual([], g.findInRadius(-200, 0, 50))
+        self.assertAlmostEqual(1.5, g.getFalloff(0, 0, 100))
+        self.assertAlmostEqual(0.0, g.getFalloff(-200, 0, 100))
+
         
             
 
@@ -0,0 +1,249 @@
+"""Tests for the lightweight particles"""
+
+import unittest
+
+from helper import *
+
+import serge.visual
+import serge.world
+import serge.zone
+import serge.engine
+import serge.render
+import serge.blocks.particles
+
+
+class TestParticles(unittest.TestCase):
+    """Tests for the Particles"""
+
+    def setUp(self):
+        """Set up the tests"""
+        self.engine = serge.engine.Engine()
+        self.r = self.engine.getRenderer()
+        self.r.addLayer(serge.render.Layer('one', 0))
+        self.w = serge.world.World('test')
+        self.z = serge.zone.Zone()
+        self.z.active = True
+        self.w.addZone(self.z)
+        self.v = TestVisual()
+
+    def tearDown(self):
+        """Tear down the tests"""
+
+    ### Particles ###
+
+    def testParticlesHaveNoDictionary(self):
+        """testParticlesHaveNoDictionary: particles should use slots"""
+        p = serge.blocks.particles.Particle('bullet')
+        self.assertRaises(AttributeError, setattr, p, 'other', 1)
+
+    def testParticlesShareVisual(self):
+        """testParticlesShareVisual: particles should share their visual"""
+        p1 = serge.blocks.particles.Particle('bullet', visual=self.v)
+        p2 = serge.blocks.particles.Particle('bullet', visual=self.v)
+        self.assert_(p1.visual is p2.visual)
+        self.assertEqual((10, 20), (p1.width, p1.height))
+
+    def testCanMoveParticles(self):
+        """testCanMoveParticles: should be able to move particles"""
+        p = serge.blocks.particles.Particle('bullet', visual=self.v)
+        p.moveTo(100, 200)
+        self.assertEqual((100, 200), (p.x, p.y))
+        self.assertEqual((95, 190), p.getOrigin())
+        p.move(10, 20)
+        self.assertEqual((110, 220), (p.x, p.y))
+
+    def testCanSetParticleLocation(self):
+        """testCanSetParticleLocation: should be able to set the x and y of particles like actors"""
+        p = serge.blocks.particles.Particle('bullet', visual=self.v)
+        self.w.addActor(p)
+        p.x = 100
+        p.y += 200
+        self.assertEqual((100, 200), (p.x, p.y))
+        self.assertEqual([p], self.w.findActorsAt(100, 200))
+        self.assertEqual([], self.w.findActorsAt(0, 0))
+        
+    def testCanAddParticlesToWorld(self):
+        """testCanAddParticlesToWorld: should be able to add particles to the world"""
+        p1 = serge.blocks.particles.Particle('bullet', 'b1', visual=self.v)
+        p2 = serge.blocks.particles.Particle('debris', visual=self.v)
+        p1.moveTo(100, 100)
+        self.w.addActors([p1, p2])
+        self.assertEqual(set([p1, p2]), self.z.actors)
+        self.assertEqual([p1], self.w.findActorsByTag('bullet'))
+        self.assertEqual(p1, self.w.findActorByName('b1'))
+        self.assertEqual([p1], self.w.findActorsAt(100, 100))
+        #
+        p1.tag = 'debris'
+        self.assertEqual(set([p1, p2]), set(self.w.findActorsByTag('debris')))
+        self.w.removeActor(p1)
+        self.assertEqual([p2], self.w.getActors())
+
+    def testParticlesMoveWithVelocity(self):
+        """testParticlesMoveWithVelocity: particles should move with their velocity"""
+        p = serge.blocks.particles.Particle('bullet', visual=self.v)
+        p.setVelocity(100, -50)
+        self.w.addActor(p)
+        self.w.updateWorld(100)
+        self.assertEqual((10, -5), (p.x, p.y))
+        self.assertEqual([p], self.w.findActorsAt(10, -5))
+
+    def testParticlesRender(self):
+        """testParticlesRender: particles should render their visual"""
+        p1 = serge.blocks.particles.Particle('bullet', visual=self.v, layer='one')
+        p2 = serge.blocks.particles.Particle('bullet', visual=self.v)
+        p2.setLayerName('one')
+        p1.moveTo(100, 100)
+        p2.moveTo(200, 100)
+        p3 = serge.blocks.particles.Particle('bullet', visual=self.v, layer='one')
+        p3.visible = False
+        self.w.addActors([p1, p2, p3])
+        self.w.renderTo(self.r, 0)
+        self.assertEqual([(95, 90), (195, 90)], self.v.rendered)
+
+
+class TestParticleEmitter(unittest.TestCase):
+    """Tests for the ParticleEmitter"""
+
+    def setUp(self):
+        """Set up the tests"""
+        serge.visual.Register.clearItems()
+        serge.visual.Register.registerItem('green', p('greenrect.png'))
+        self.engine = serge.engine.Engine()
+        self.r = self.engine.getRenderer()
+        self.r.addLayer(serge.render.Layer('one', 0))
+        self.w = serge.world.World('test')
+        self.z = serge.zone.Zone()
+        self.z.active = True
+        self.w.addZone(self.z)
+        self.e = serge.blocks.particles.ParticleEmitter('emitter', 'e', 'green', 'one', capacity=10)
+        self.e.moveTo(100, 200)
+        self.w.addActor(self.e)
+
+    def tearDown(self):
+        """Tear down the tests"""
+
+    ### Emitting ###
+
+    def testCanEmit(self):
+        """testCanEmit: should be able to emit particles"""
+        self.assertEqual(0, self.e.getNumberOfParticles())
+        self.assertEqual(3, self.e.emit(3))
+        self.assertEqual(3, self.e.getNumberOfParticles())
+        self.assertEqual([[100, 200]]*3, self.e.getParticleLocations().tolist())
+
+    def testCanEmitWithValuesForEachParticle(self):
+        """testCanEmitWithValuesForEachParticle: should be able to emit with values for each particle"""
+        self.e.emit(2, x=[10, 20], y=5)
+        self.assertEqual([[10, 5], [20, 5]], self.e.getParticleLocations().tolist())
+
+    def testEmitLimitedByCapacity(self):
+        """testEmitLimitedByCapacity: should not emit beyond the capacity"""
+        self.assertEqual(8, self.e.emit(8))
+        self.assertEqual(2, self.e.emit(8, x=range(8), y=range(8)))
+        self.assertEqual(0, self.e.emit(1))
+        self.assertEqual(10, self.e.getNumberOfParticles())
+        self.assertEqual([0, 1], self.e.getParticleLocations()[8:, 0].tolist())
+
+    def testCanEmitBurst(self):
+        """testCanEmitBurst: should be able to emit a burst"""
+        self.e.emitBurst(5, 100)
+        self.w.updateWorld(1000)
+        for x, y in self.e.getParticleLocations():
+            self.assertAlmostEqual(100, ((x-100)**2 + (y-200)**2)**0.5)
+
+    def testCanClear(self):
+        """testCanClear: should be able to clear the particles"""
+        self.e.emit(5)
+        self.e.clearParticles()
+        self.assertEqual(0, self.e.getNumberOfParticles())
+
+    ### Updating ###
+
+    def testParticlesMove(self):
+        """testParticlesMove: particles should move with their velocity and gravity"""
+        self.e.gravity = (0, 100)
+        self.e.emit(2, vx=[10, -10], vy=0)
+        self.w.updateWorld(500)
+        self.assertEqual([[105, 225], [95, 225]], self.e.getParticleLocations().tolist())
+
+    def testParticlesExpire(self):
+        """testParticlesExpire: particles should be removed at the end of their life"""
+        self.e.emit(3, x=[1, 2, 3], y=0, lifetime=[100, 300, 200])
+        self.w.updateWorld(150)
+        self.assertEqual([2, 3], self.e.getParticleLocations()[:, 0].tolist())
+        self.w.updateWorld(100)
+        self.assertEqual([2], self.e.getParticleLocations()[:, 0].tolist())
+        self.w.updateWorld(100)
+        self.assertEqual(0, self.e.getNumberOfParticles())
+
+    ### Rendering ###
+
+    def testParticlesRender(self):
+        """testParticlesRender: particles should render to the layer"""
+        surface = self.r.getLayer('one').getSurface()
+        self.e.emit(2, x=[100, 300], y=[100, 300])
+        self.e.emit(1, x=-100, y=-100)
+        self.w.renderTo(self.r, 0)
+        self.assertEqual((0, 255, 0), tuple(surface.get_at((100, 100)))[:3])
+        self.assertEqual((0, 255, 0), tuple(surface.get_at((300, 300)))[:3])
+        self.assertNotEqual((0, 255, 0), tuple(surface.get_at((200, 200)))[:3])
+
+    def testParticlesRenderRelativeToCamera(self):
+        """testParticlesRenderRelativeToCamera: particles should render relative to the camera"""
+        surface = self.r.getLayer('one').getSurface()
+        self.r.getCamera().moveTo(self.r.width/2 + 1000, self.r.height/2)
+        self.e.emit(1, x=1100, y=100)
+        self.w.renderTo(self.r, 0)
+        self.assertEqual((0, 255, 0), tuple(surface.get_at((100, 100)))[:3])
+
+    def testExpiredParticlesAreClearedWithDirtyRects(self):
+        """testExpiredParticlesAreClearedWithDirtyRects: particles outside the emitter should be cleared when they expire"""
+        self.r.setDirtyRects(True)
+        surface = self.r.getLayer('one').getSurface()
+        self.e.emit(1, x=400, y=400, lifetime=100)
+        self._renderFrame()
+        self.assertEqual((0, 255, 0), tuple(surface.get_at((400, 400)))[:3])
+        #
+        self.w.updateWorld(200)
+        self.assertEqual(0, self.e.getNumberOfParticles())
+        self._renderFrame()
+        self.assertEqual([self.r.getSurface().get_rect()], self.r.getDirtyRects())
+        self.assertNotEqual((0, 255, 0), tuple(surface.get_at((400, 400)))[:3])
+        #
+        # Once nothing changes there is nothing to redraw
+        self._renderFrame()
+        self.assertEqual([], self.r.getDirtyRects())
+
+    def _renderFrame(self):
+        """Render a frame"""
+        self.r.preRender()
+        self.w.renderTo(self.r, 0)
+        self.r.render()
+
+    def testParticlesRenderAtLowerResolution(self):
+        """testParticlesRenderAtLowerResolution: particles should be scaled when rendering at a lower resolution"""
+        self.r.setRenderScale(0.5)
+        surface = self.r.getLayer('one').getSurface()
+        self.e.emit(1, x=300, y=300)
+        self.w.renderTo(self.r, 0)
+        self.assertEqual((0, 255, 0), tuple(surface.get_at((150, 150)))[:3])
+        self.assertNotEqual((0, 255, 0), tuple(surface.get_at((135, 135)))[:3])
+
+
+class TestVisual(object):
+    """A visual item"""
+
+    width = 10
+    height = 20
+
+    def __init__(self):
+        """Initialise the TestVisual"""
+        self.rendered = []
+
+    def renderTo(self, interval, surface, coords):
+        """Render me"""
+        self.rendered.append(tuple(coords))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+"""Tests for the actor pools"""
+
+import unittest
+
+from helper import *
+
+import serge.actor
+import serge.visual
+import serge.world
+import serge.zone
+import serge.blocks.actors
+import serge.blocks.effects
+import serge.blocks.pools
+
+
+class TestPools(unittest.TestCase):
+    """Tests for the Pools"""
+
+    def setUp(self):
+        """Set up the tests"""
+        serge.visual.Register.clearItems()
+        serge.visual.Register.registerItem('green', p('greenrect.png'))
+        self.w = serge.world.World('test')
+        self.z = serge.zone.Zone()
+        self.z.active = True
+        self.w.addZone(self.z)
+        self.pool = serge.blocks.pools.ActorPool(serge.actor.Actor, ('bullet',), sprite_name='green',
+            layer_name='main', size=2)
+
+    def tearDown(self):
+        """Tear down the tests"""
+
+    ### Pools ###
+
+    def testCanCreatePool(self):
+        """testCanCreatePool: should be able to create a pool of actors"""
+        self.assertEqual(2, self.pool.getNumberFree())
+        self.assertEqual(0, self.pool.getNumberInUse())
+
+    def testCanGetActors(self):
+        """testCanGetActors: should be able to get actors from the pool"""
+        a = self.pool.getActor()
+        self.assertEqual('bullet', a.tag)
+        self.assertEqual('green', a.getSpriteName())
+        self.assertEqual('main', a.getLayerName())
+        self.assertEqual(1, self.pool.getNumberFree())
+        self.assertEqual(1, self.pool.getNumberInUse())
+
+    def testPoolCreatesActorsWhenEmpty(self):
+        """testPoolCreatesActorsWhenEmpty: should create actors when the pool is empty"""
+        actors = set([self.pool.getActor() for i in range(4)])
+        self.assertEqual(4, len(actors))
+        self.assertEqual(0, self.pool.getNumberFree())
+        self.assertEqual(4, self.pool.getNumberInUse())
+
+    def testActorsAreReset(self):
+        """testActorsAreReset: actors should be reset when taken from the pool"""
+        a = self.pool.getActor()
+        a.active = a.visible = False
+        self.pool.releaseActor(a)
+        b = self.pool.getActor()
+        self.assert_(a is b)
+        self.assertEqual((True, True), (b.active, b.visible))
+
+    def testRemovedActorsReturnToPool(self):
+        """testRemovedActorsReturnToPool: actors removed from the world should go back in the pool"""
+        a = self.pool.getActor()
+        b = self.pool.getActor()
+        self.w.addActors([a, b])
+        self.w.removeActor(a)
+        self.assertEqual(1, self.pool.getNumberFree())
+        self.w.scheduleActorRemoval(b)
+        self.w.updateWorld(0)
+        self.assertEqual(2, self.pool.getNumberFree())
+        self.assertEqual(0, self.pool.getNumberInUse())
+        #
+        # Should be able to reuse
+        self.w.addActor(self.pool.getActor())
+        self.assertEqual(1, len(self.w.getActors()))
+
+    def testReusedActorNotRemovedBySchedule(self):
+        """testReusedActorNotRemovedBySchedule: a reused actor should not be removed by an old scheduled removal"""
+        a = self.pool.getActor()
+        self.w.addActor(a)
+        self.w.scheduleActorRemoval(a)
+        self.w.removeActor(a)
+        self.w.addActor(self.pool.getActor())
+        self.w.updateWorld(0)
+        self.assertEqual([a], self.w.getActors())
+
+    def testCanLimitPoolSize(self):
+        """testCanLimitPoolSize: should be able to limit the number of actors kept in the pool"""
+        pool = serge.blocks.pools.ActorPool(serge.actor.Actor, ('bullet',), maximum=1)
+        actors = [pool.getActor() for i in range(3)]
+        for actor in actors:
+            pool.releaseActor(actor)
+        self.assertEqual(1, pool.getNumberFree())
+        self.assertEqual(0, pool.getNumberInUse())
+
+    def testReleasingTwiceIsIgnored(self):
+        """testReleasingTwiceIsIgnored: releasing an actor twice should not add it twice"""
+        a = self.pool.getActor()
+        self.pool.releaseActor(a)
+        self.pool.releaseActor(a)
+        self.assertEqual(2, self.pool.getNumberFree())
+
+    def testCanPoolAnimateThenDieActors(self):
+        """testCanPoolAnimateThenDieActors: should be able to pool actors that remove themselves"""
+        serge.visual.Register.registerItem('anim', p('allrect.png'), 4, framerate=10, running=True, loop=False)
+        parent = serge.actor.Actor('parent')
+        parent.moveTo(100, 200)
+        pool = serge.blocks.pools.ActorPool(serge.blocks.actors.AnimateThenDieActor,
+            ('explosion', 'explosion', 'anim', 'main'), size=1)
+        a = pool.getActor(parent)
+        self.w.addActor(a)
+        self.assertEqual((100, 200), (a.x, a.y))
+        a.visual.running = False
+        self.w.updateWorld(0)
+        self.w.updateWorld(0)
+        self.assertEqual(1, pool.getNumberFree())
+        #
+        b = pool.getActor(None)
+        self.assert_(a is b)
+        self.assertEqual(True, b.visual.running)
+        self.assertEqual(None, b.parent)
+
+    def testPooledEffectsRunAgain(self):
+        """testPooledEffectsRunAgain: effects taken from the pool again should run for their full duration"""
+        pool = serge.blocks.pools.ActorPool(serge.blocks.effects.Pause, (1.0, None), size=1)
+        for i in range(2):
+            e = pool.getActor()
+            self.w.addActor(e)
+            self.w.updateWorld(600)
+            self.assertEqual([e], self.w.getActors())
+            self.w.updateWorld(600)
+            self.assertEqual([], self.w.getActors())
+            self.assertEqual(1, pool.getNumberFree())
+        #
+        values = []
+        pool = serge.blocks.pools.ActorPool(serge.blocks.effects.MethodCallFade, (values.append, 0.0, 10.0, 1.0),
+            {'motion': 'accelerated'}, size=1)
+        for i in range(2):
+            e = pool.getActor()
+            self.w.addActor(e)
+            self.w.updateWorld(600)
+            self.assertEqual([e], self.w.getActors())
+            self.assert_(0.0 < values[-1] < 10.0)
+            self.w.updateWorld(600)
+            self.assertEqual(10.0, values[-1])
+            self.assertEqual([], self.w.getActors())
+
+
+if __name__ == '__main__':
+    unittest.main()
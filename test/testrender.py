@@ -87,6 +87,13 @@ class TestRender(unittest.TestCase, VisualTester):
         """testFailIfGetByMissingName: should fail if try to get missing layer"""
         self.assertRaises(serge.render.UnknownLayer, self.r.getLayer, 'one')
         
+    def testCanGetLayerAfterRenaming(self):
+        """testCanGetLayerAfterRenaming: should be able to get a layer by name after it is renamed"""
+        self.r.addLayer(self.l1)
+        self.l1.name = 'new'
+        self.assertEqual(self.l1, self.r.getLayer('new'))
+        self.assertRaises(serge.render.UnknownLayer, self.r.getLayer, 'one')
+        
     def testCanGetRenderOrder(self):
         """testCanGetRenderOrder: should be able to retrieve rendering order by name"""
         self.r.addLayer(self.l1)
@@ -264,6 +271,41 @@ class TestRender(unittest.TestCase, VisualTester):
         self.assertEqual((255, 0, 0, 255), r.getSurface().get_at((50, 50)))
     
         
+    def testCanCreateLayersWithSurfaceFormats(self):
+        """testCanCreateLayersWithSurfaceFormats: should be able to create layers with different surface formats"""
+        r = serge.render.Renderer(200, 100)
+        alpha = r.addLayer(serge.render.Layer('alpha', 0))
+        opaque = r.addLayer(serge.render.Layer('opaque', 1, serge.render.F_OPAQUE))
+        keyed = r.addLayer(serge.render.Layer('keyed', 2, serge.render.F_COLOUR_KEY))
+        self.assertTrue(alpha.getSurface().get_flags() & pygame.SRCALPHA)
+        self.assertFalse(opaque.getSurface().get_flags() & pygame.SRCALPHA)
+        self.assertEqual(None, opaque.getSurface().get_colorkey())
+        self.assertFalse(keyed.getSurface().get_flags() & pygame.SRCALPHA)
+        self.assertEqual(serge.render.COLOUR_KEY, keyed.getSurface().get_colorkey()[:3])
+        #
+        self.assertRaises(serge.render.InvalidSurfaceFormat, r.addLayer, serge.render.Layer('bad', 3, 10))
+        
+    def testSurfaceFormatsRenderCorrectly(self):
+        """testSurfaceFormatsRenderCorrectly: opaque layers should hide layers beneath and colour keyed ones should not"""
+        r = serge.render.Renderer(200, 100)
+        alpha = r.addLayer(serge.render.Layer('alpha', 0))
+        opaque = r.addLayer(serge.render.Layer('opaque', 1, serge.render.F_OPAQUE))
+        keyed = r.addLayer(serge.render.Layer('keyed', 2, serge.render.F_COLOUR_KEY))
+        #
+        r.preRender()
+        self.assertEqual(serge.render.COLOUR_KEY, keyed.getSurface().get_at((50, 50))[:3])
+        alpha.getSurface().fill((255, 0, 0, 255))
+        keyed.getSurface().fill((0, 0, 255), (0, 0, 10, 10))
+        r.render()
+        self.assertEqual((0, 0, 255, 255), r.getSurface().get_at((5, 5)))
+        self.assertEqual((0, 0, 0, 255), r.getSurface().get_at((50, 50)))
+        #
+        opaque.active = False
+        r.preRender()
+        alpha.getSurface().fill((255, 0, 0, 255))
+        r.render()
+        self.assertEqual((255, 0, 0, 255), r.getSurface().get_at((50, 50)))
+    
     ### Serialize ###
     
     def testCanSerializeAndRestorCamera(self):
@@ -347,7 +389,379 @@ class TestRender(unittest.TestCase, VisualTester):
         self.l3.order = 10
         self.assertEqual([a1, a2, a3], self.r.orderActors([a3, a2, a1]))
         
+    def testCanOrderLayerNames(self):
+        """testCanOrderLayerNames: should be able to order layer names for rendering"""
+        self.l1.order = 10
+        self.l2.order = 20
+        self.l3.order = 30
+        self.r.addLayer(self.l1)
+        self.r.addLayer(self.l2)
+        self.r.addLayer(self.l3)
+        self.assertEqual(['one', 'two', 'three'], self.r.orderLayerNames(['three', 'one', 'two']))
+        self.l1.order = 30
+        self.l3.order = 10
+        self.assertEqual(['three', 'two', 'one'], self.r.orderLayerNames(['three', 'one', 'two']))
              
+    ### Render queues ###
+    
+    def testCanBlitWithRenderQueue(self):
+        """testCanBlitWithRenderQueue: should be able to batch blits with a render queue"""
+        surface = pygame.Surface((100, 100), pygame.SRCALPHA, 32)
+        red = pygame.Surface((10, 10), pygame.SRCALPHA, 32)
+        red.fill((255, 0, 0, 255))
+        blue = pygame.Surface((10, 10), pygame.SRCALPHA, 32)
+        blue.fill((0, 0, 255, 255))
+        q = serge.render.RenderQueue(surface)
+        q.addBlit(red, (10, 10))
+        q.addBlit(blue, (15, 15))
+        self.assertEqual((0, 0, 0, 0), surface.get_at((12, 12)))
+        q.flush()
+        self.assertEqual((255, 0, 0, 255), surface.get_at((12, 12)))
+        self.assertEqual((0, 0, 255, 255), surface.get_at((17, 17)))
+        self.assertEqual([], q.blits)
+        #
+        q.addBlits([(blue, (50, 50)), (red, (55, 55))])
+        q.flush()
+        self.assertEqual((0, 0, 255, 255), surface.get_at((52, 52)))
+        self.assertEqual((255, 0, 0, 255), surface.get_at((57, 57)))
+        
+    ### Cached Layers ###
+    
+    def _renderFrame(self, r, w):
+        """Render a frame"""
+        r.preRender()
+        w.renderTo(r, 0)
+        r.render()
+        
+    def testCachedLayerOnlyRedrawsWhenChanged(self):
+        """testCachedLayerOnlyRedrawsWhenChanged: cached layers should only redraw when their actors change"""
+        serge.visual.Register.registerItem('green', p('greenrect.png'))
+        e = serge.engine.Engine()
+        serge.blocks.utils.createWorldsForEngine(e, ['one'])
+        w = e.getWorld('one')
+        r = e.getRenderer()
+        l = serge.render.Layer('one', 0)
+        l.setCached(True)
+        r.addLayer(l)
+        green = serge.blocks.utils.addSpriteActorToWorld(w, 'a1', 'a1', 'green', 'one', (75, 75))
+        surface = l.getSurface()
+        #
+        self._renderFrame(r, w)
+        self.assertEqual((0, 255, 0, 255), surface.get_at((75, 75)))
+        #
+        # Nothing changed so the layer should be kept as it is
+        surface.set_at((200, 200), (255, 0, 0, 255))
+        self._renderFrame(r, w)
+        self.assertEqual((255, 0, 0, 255), surface.get_at((200, 200)))
+        self.assertEqual((0, 255, 0, 255), surface.get_at((75, 75)))
+        #
+        # Moving should redraw
+        green.moveTo(300, 300)
+        self._renderFrame(r, w)
+        self.assertEqual((0, 0, 0, 0), surface.get_at((200, 200)))
+        self.assertEqual((0, 0, 0, 0), surface.get_at((75, 75)))
+        self.assertEqual((0, 255, 0, 255), surface.get_at((300, 300)))
+        #
+        # Invalidating should redraw
+        surface.set_at((200, 200), (255, 0, 0, 255))
+        l.invalidate()
+        self._renderFrame(r, w)
+        self.assertEqual((0, 0, 0, 0), surface.get_at((200, 200)))
+        #
+        # Hiding and removing should redraw
+        green.visible = False
+        self._renderFrame(r, w)
+        self.assertEqual((0, 0, 0, 0), surface.get_at((300, 300)))
+        green.visible = True
+        self._renderFrame(r, w)
+        self.assertEqual((0, 255, 0, 255), surface.get_at((300, 300)))
+        w.removeActor(green)
+        self._renderFrame(r, w)
+        self.assertEqual((0, 0, 0, 0), surface.get_at((300, 300)))
+        
+    def testCachedLayerRedrawsForCameraAndAnimation(self):
+        """testCachedLayerRedrawsForCameraAndAnimation: cached layers should redraw when the camera moves or sprites animate"""
+        serge.visual.Register.registerItem('green', p('greenrect.png'))
+        e = serge.engine.Engine()
+        r = e.getRenderer()
+        l = serge.render.Layer('one', 0)
+        l.setCached(True)
+        r.addLayer(l)
+        a = serge.actor.Actor('a')
+        a.setSpriteName('green')
+        a.setLayerName('one')
+        camera = r.getCamera()
+        #
+        self.assertTrue(l.needsRedraw([a], camera))
+        self.assertFalse(l.needsRedraw([a], camera))
+        camera.moveTo(camera.x + 10, camera.y)
+        self.assertTrue(l.needsRedraw([a], camera))
+        self.assertFalse(l.needsRedraw([a], camera))
+        #
+        # Static layers ignore the camera
+        l.setStatic(True)
+        self.assertTrue(l.needsRedraw([a], camera))
+        camera.moveTo(camera.x + 10, camera.y)
+        self.assertFalse(l.needsRedraw([a], camera))
+        #
+        # Animated sprites always redraw
+        a.visual.framerate = 10
+        a.visual.running = True
+        self.assertTrue(l.needsRedraw([a], camera))
+        self.assertTrue(l.needsRedraw([a], camera))
+        
+    ### Dirty Rectangles ###
+    
+    def _createDirtyWorld(self):
+        """Create a world and renderer using dirty rectangles"""
+        serge.visual.Register.registerItem('green', p('greenrect.png'))
+        e = serge.engine.Engine()
+        serge.blocks.utils.createWorldsForEngine(e, ['one'])
+        w = e.getWorld('one')
+        r = e.getRenderer()
+        r.setDirtyRects(True)
+        l = serge.render.Layer('one', 0)
+        r.addLayer(l)
+        green = serge.blocks.utils.addSpriteActorToWorld(w, 'a1', 'a1', 'green', 'one', (75, 75))
+        return r, w, l, green
+        
+    def testDirtyRectsOnlyRedrawChanges(self):
+        """testDirtyRectsOnlyRedrawChanges: dirty rectangles should only redraw the parts that change"""
+        r, w, l, green = self._createDirtyWorld()
+        #
+        # Everything is drawn at first
+        self._renderFrame(r, w)
+        self.assertTrue(r.isUsingDirtyRects())
+        self.assertEqual([r.getSurface().get_rect()], r.getDirtyRects())
+        self.checkRect(l.getSurface(), (0, 255, 0, 255), 75, 75, 50, 50, 'green', black=(0, 0, 0, 0))
+        #
+        # Nothing changed
+        self._renderFrame(r, w)
+        self.assertEqual([], r.getDirtyRects())
+        #
+        # Moving should redraw where the actor was and is
+        l.getSurface().set_at((200, 200), (255, 0, 0, 255))
+        green.moveTo(300, 300)
+        self._renderFrame(r, w)
+        self.assertEqual([(49, 49, 52, 52), (274, 274, 52, 52)], r.getDirtyRects())
+        self.checkRect(l.getSurface(), (0, 255, 0, 255), 300, 300, 50, 50, 'green', black=(0, 0, 0, 0))
+        self.assertEqual((0, 0, 0, 0), l.getSurface().get_at((75, 75)))
+        self.assertEqual((255, 0, 0, 255), l.getSurface().get_at((200, 200)))
+        #
+        # Removing should redraw where the actor was
+        w.removeActor(green)
+        self._renderFrame(r, w)
+        self.assertEqual([(274, 274, 52, 52)], r.getDirtyRects())
+        self.assertEqual((0, 0, 0, 0), l.getSurface().get_at((300, 300)))
+        
+    def testDirtyRectsRedrawOverlappingActors(self):
+        """testDirtyRectsRedrawOverlappingActors: actors overlapping a dirty rectangle should be redrawn"""
+        r, w, l, green = self._createDirtyWorld()
+        serge.visual.Register.registerItem('blue', p('bluerect.png'))
+        blue = serge.blocks.utils.addSpriteActorToWorld(w, 'a2', 'a2', 'blue', 'one', (100, 75))
+        self._renderFrame(r, w)
+        self.assertEqual((0, 0, 255, 255), l.getSurface().get_at((90, 75)))
+        #
+        green.moveTo(40, 75)
+        self._renderFrame(r, w)
+        self.assertEqual((0, 0, 255, 255), l.getSurface().get_at((90, 75)))
+        self.assertEqual((0, 0, 255, 255), l.getSurface().get_at((76, 75)))
+        self.assertEqual((0, 255, 0, 255), l.getSurface().get_at((40, 75)))
+        
+    def testDirtyRectsRedrawAllWhenNeeded(self):
+        """testDirtyRectsRedrawAllWhenNeeded: dirty rectangles should redraw everything when they cannot tell what changed"""
+        r, w, l, green = self._createDirtyWorld()
+        full = [r.getSurface().get_rect()]
+        self._renderFrame(r, w)
+        #
+        # Camera moving
+        camera = r.getCamera()
+        camera.moveTo(camera.x + 10, camera.y)
+        self._renderFrame(r, w)
+        self.assertEqual(full, r.getDirtyRects())
+        self._renderFrame(r, w)
+        self.assertEqual([], r.getDirtyRects())
+        #
+        # Layers changing
+        l.active = False
+        self._renderFrame(r, w)
+        self.assertEqual(full, r.getDirtyRects())
+        l.active = True
+        self._renderFrame(r, w)
+        self.assertEqual(full, r.getDirtyRects())
+        r.invalidate()
+        self._renderFrame(r, w)
+        self.assertEqual(full, r.getDirtyRects())
+        #
+        # Animating
+        green.visual.framerate = 10
+        green.visual.frame_time = 100
+        green.visual.running = True
+        self._renderFrame(r, w)
+        self.assertEqual(full, r.getDirtyRects())
+        #
+        # Virtual layers and turning dirty rectangles off
+        r.addLayer(serge.render.VirtualLayer('two', 1))
+        self._renderFrame(r, w)
+        self.assertFalse(r.isUsingDirtyRects())
+        self.assertEqual(None, r.getDirtyRects())
+        r.removeLayerNamed('two')
+        r.setDirtyRects(False)
+        self._renderFrame(r, w)
+        self.assertEqual(None, r.getDirtyRects())
+        
+    def testDirtyRectsMoveActorsOnOnce(self):
+        """testDirtyRectsMoveActorsOnOnce: actors in more than one dirty rectangle should only be moved on once"""
+        r, w, l, green = self._createDirtyWorld()
+        big = serge.blocks.utils.addVisualActorToWorld(w, 'big', 'big', TestRecordingDrawing(200, 200), 'one', (200, 200))
+        other = serge.blocks.utils.addSpriteActorToWorld(w, 'a2', 'a2', 'green', 'one', (250, 250))
+        r.preRender()
+        w.renderTo(r, 10)
+        r.render()
+        self.assertEqual([10], big.visual.intervals)
+        #
+        # Moving both should give two dirty rectangles over the big actor
+        green.moveTo(125, 125)
+        other.moveTo(275, 275)
+        del big.visual.intervals[:]
+        r.preRender()
+        w.renderTo(r, 10)
+        r.render()
+        self.assertEqual(4, len(r.getDirtyRects()))
+        self.assertEqual(10, sum(big.visual.intervals))
+        self.assertEqual(10, big.visual.intervals[0])
+        
+    ### Render scale ###
+    
+    def testCanRenderAtLowerResolution(self):
+        """testCanRenderAtLowerResolution: should be able to render at a lower resolution"""
+        r = serge.render.Renderer(200, 100, render_scale=0.5, dirty_rects=True)
+        l = r.addLayer(serge.render.Layer('one', 0, serge.render.F_OPAQUE))
+        self.assertEqual((100, 50), r.getRenderSize())
+        self.assertEqual((200, 100), r.getSurface().get_size())
+        self.assertEqual((100, 50), l.getSurface().get_size())
+        self.assertEqual(0.5, l.scale)
+        #
+        # The rendering should be scaled up to the screen
+        r.preRender()
+        self.assertFalse(r.isUsingDirtyRects())
+        l.getSurface().fill((255, 0, 0), (10, 10, 5, 5))
+        r.render()
+        self.assertEqual((255, 0, 0, 255), r.getSurface().get_at((25, 25)))
+        self.assertEqual((0, 0, 0, 255), r.getSurface().get_at((35, 35)))
+        #
+        # Back to full resolution
+        r.setRenderScale(1.0)
+        self.assertEqual((200, 100), r.getRenderSize())
+        self.assertEqual((200, 100), l.getSurface().get_size())
+        self.assertEqual(r.getSurface(), r.getRenderSurface())
+        self.assertEqual(1.0, l.scale)
+        
+    def testActorsRenderAtLowerResolution(self):
+        """testActorsRenderAtLowerResolution: actors should be scaled when rendering at a lower resolution"""
+        serge.visual.Register.registerItem('green', p('greenrect.png'))
+        e = serge.engine.Engine()
+        serge.blocks.utils.createWorldsForEngine(e, ['one'])
+        w = e.getWorld('one')
+        r = e.getRenderer()
+        r.setRenderScale(0.5)
+        l = r.addLayer(serge.render.Layer('one', 0))
+        serge.blocks.utils.addSpriteActorToWorld(w, 'a1', 'a1', 'green', 'one', (150, 150))
+        unbatched = serge.blocks.utils.addVisualActorToWorld(w, 'a2', 'a2', TestUnbatchedDrawing(50, 50), 'one', (350, 150))
+        unbatched.visual.getSurface().fill((0, 0, 255, 255))
+        #
+        r.preRender()
+        w.renderTo(r, 0)
+        r.render()
+        self.checkRect(l.getSurface(), (0, 255, 0, 255), 75, 75, 25, 25, 'green', black=(0, 0, 0, 0))
+        self.checkRect(l.getSurface(), (0, 0, 255, 255), 175, 75, 25, 25, 'blue', black=(0, 0, 0, 0))
+        #
+        # Mouse and camera positions are unchanged
+        self.assertEqual([w.findActorByName('a1')], w.findActorsAt(150, 150))
+        
+    def testUnbatchedVisualsAreScaledOnce(self):
+        """testUnbatchedVisualsAreScaledOnce: visuals that cannot be batched should only be scaled when they change"""
+        r = serge.render.Renderer(200, 100, render_scale=0.5)
+        l = r.addLayer(serge.render.Layer('one', 0))
+        visual = TestUnbatchedDrawing(20, 20)
+        visual.getSurface().fill((0, 0, 255, 255))
+        for i in range(3):
+            l.renderVisual(visual, 0, (20, 20))
+        self.assertEqual(1, visual.rendered)
+        self.assertEqual((0, 0, 255, 255), l.getSurface().get_at((15, 15)))
+        #
+        # Changing the state should render again
+        visual.setSurface(pygame.Surface((20, 20), pygame.SRCALPHA, 32))
+        visual.getSurface().fill((255, 0, 0, 255))
+        l.renderVisual(visual, 0, (20, 20))
+        self.assertEqual(2, visual.rendered)
+        self.assertEqual((255, 0, 0, 255), l.getSurface().get_at((15, 15)))
+        
+    def testCanRescaleImagesDrawnOn(self):
+        """testCanRescaleImagesDrawnOn: should be able to scale images again after drawing on them"""
+        r = serge.render.Renderer(200, 100, render_scale=0.5)
+        l = r.addLayer(serge.render.Layer('one', 0))
+        visual = serge.visual.SurfaceDrawing(20, 20)
+        visual.getSurface().fill((0, 0, 255, 255))
+        l.renderVisual(visual, 0, (20, 20))
+        self.assertEqual((0, 0, 255, 255), l.getSurface().get_at((15, 15)))
+        #
+        # Drawing on the surface is not seen until the renderer is invalidated
+        visual.getSurface().fill((255, 0, 0, 255))
+        l.renderVisual(visual, 0, (20, 20))
+        self.assertEqual((0, 0, 255, 255), l.getSurface().get_at((15, 15)))
+        r.invalidate()
+        l.renderVisual(visual, 0, (20, 20))
+        self.assertEqual((255, 0, 0, 255), l.getSurface().get_at((15, 15)))
+        
+    def testCustomActorsRenderAtFullSize(self):
+        """testCustomActorsRenderAtFullSize: actors with their own rendering should be scaled when rendering at a lower resolution"""
+        e = serge.engine.Engine()
+        serge.blocks.utils.createWorldsForEngine(e, ['one'])
+        w = e.getWorld('one')
+        r = e.getRenderer()
+        r.setRenderScale(0.5)
+        l = r.addLayer(serge.render.Layer('one', 0))
+        a = TestCustomActor('custom')
+        a.setLayerName('one')
+        w.addActor(a)
+        #
+        r.preRender()
+        w.renderTo(r, 0)
+        r.render()
+        self.assertEqual((320, 240), l.getSurface().get_size())
+        self.checkRect(l.getSurface(), (255, 0, 0, 255), 60, 30, 20, 20, 'red', black=(0, 0, 0, 0))
+        
+    def testCustomActorsAreScaledTogether(self):
+        """testCustomActorsAreScaledTogether: a run of actors with their own rendering should be scaled once"""
+        e = serge.engine.Engine()
+        serge.blocks.utils.createWorldsForEngine(e, ['one'])
+        w = e.getWorld('one')
+        r = e.getRenderer()
+        r.setRenderScale(0.5)
+        l = r.addLayer(serge.render.Layer('one', 0))
+        a = TestCustomActor('custom', 'a')
+        b = TestCustomActor('custom', 'b')
+        b.fill_rect = (300, 200, 40, 40)
+        for actor in (a, b):
+            actor.setLayerName('one')
+            w.addActor(actor)
+        #
+        # Count the scalings
+        scalings = []
+        scale = l._scaleImage
+        def countScale(image):
+            scalings.append(image)
+            return scale(image)
+        l._scaleImage = countScale
+        #
+        r.preRender()
+        w.renderTo(r, 0)
+        r.render()
+        self.assertEqual(1, len(scalings))
+        self.checkRect(l.getSurface(), (255, 0, 0, 255), 60, 30, 20, 20, 'red', black=(0, 0, 0, 0))
+        self.checkRect(l.getSurface(), (255, 0, 0, 255), 160, 110, 20, 20, 'red', black=(0, 0, 0, 0))
+        
     ### Virtual Layers ###
     
     def testCanUseAVirtualLayer(self):
@@ -674,6 +1088,50 @@ class TestRender(unittest.TestCase, VisualTester):
         self.assertTrue(os.path.isfile(os.path.join('test', 'junk', 'movie.avi')))
               
         
+class TestUnbatchedDrawing(serge.visual.SurfaceDrawing):
+    """A drawing that cannot be batched"""
+    
+    rendered = 0
+    
+    def getBlit(self, milliseconds, (x, y)):
+        """Return None as we cannot be batched"""
+        return None
+        
+    def renderTo(self, milliseconds, surface, (x, y)):
+        """Render to a surface"""
+        super(TestUnbatchedDrawing, self).renderTo(milliseconds, surface, (x, y))
+        self.rendered += 1
+        
+        
+class TestCustomActor(serge.actor.Actor):
+    """An actor that draws on its layer itself"""
+    
+    fill_rect = (100, 40, 40, 40)
+    
+    def renderTo(self, renderer, interval):
+        """Render to the layer"""
+        renderer.getLayer(self.layer).getSurface().fill((255, 0, 0, 255), self.fill_rect)
+        
+        
+class TestRecordingDrawing(serge.visual.SurfaceDrawing):
+    """A drawing that records the intervals it is rendered with"""
+    
+    def __init__(self, width, height):
+        """Initialise the drawing"""
+        super(TestRecordingDrawing, self).__init__(width, height)
+        self.intervals = []
+        
+    def renderTo(self, milliseconds, surface, (x, y)):
+        """Render to a surface"""
+        self.intervals.append(milliseconds)
+        super(TestRecordingDrawing, self).renderTo(milliseconds, surface, (x, y))
+        
+    def getBlit(self, milliseconds, (x, y)):
+        """Return the blit to render"""
+        self.intervals.append(milliseconds)
+        return super(TestRecordingDrawing, self).getBlit(milliseconds, (x, y))
+        
+        
 class TestLayer(serge.render.Layer):
     """A test layer"""
     
@@ -936,6 +936,23 @@ class TestVisual(unittest.TestCase, VisualTester):
         print 'Times for non/cached are %s' % times
         self.assertTrue(times[0] - times[1] > times[0]/5)
     
+    def testRotationCacheIsShared(self):
+        """testRotationCacheIsShared: copies of a sprite should share cached rotations"""
+        s = serge.visual.Register.registerItem('green', p('allrect.png'), 4)
+        s1, s2 = s.getCopy(), s.getCopy()
+        s1.cache_rotations = s2.cache_rotations = True
+        s1.setAngle(45)
+        s2.setAngle(45)
+        self.assert_(s1.cells is s2.cells)
+        s2.setAngle(30)
+        self.assert_(s1.cells is not s2.cells)
+        #
+        # Cells with alpha are changed so should not be shared
+        s2.setAngle(45)
+        s2.setAlpha(0.5)
+        self.assert_(s1.cells is not s2.cells)
+        self.assertEqual(255, s1.cells[0].get_alpha())
+    
     ### Converting alpha mode ###
       
     def testCanSetConvertAlphaInRegister(self):
@@ -10,6 +10,7 @@ import serge.input
 import serge.engine
 import serge.events
 import serge.render
+import serge.visual
 
 class TestWorlds(unittest.TestCase):
     """Tests for the World"""
@@ -117,18 +118,234 @@ class TestWorlds(unittest.TestCase):
         self.w.addZone(self.z2)
         self.assertRaises(serge.zone.ActorNotFound, self.w.findActorByName, 'a3')
         
+    def testUnzonedActorsAreNotFoundByTagAndName(self):
+        """testUnzonedActorsAreNotFoundByTagAndName: should only find actors that are in a zone by tag and name"""
+        self.w.addZone(self.z1)
+        self.w.clearActors()
+        self.z1.setSpatial(0, 0, 10, 10)
+        self.b1.setSpatial(15, 15, 3, 3)
+        self.w.addActor(self.b1)
+        self.assertEqual(set([self.b1]), self.w.unzoned_actors)
+        self.assertEqual([], self.w.findActorsByTag('b'))
+        self.assertRaises(serge.zone.ActorNotFound, self.w.findActorByName, 'b1')
+        self.assertEqual([self.b1], list(self.w.getActorsWithTag('b')))
+        #
+        # Once it moves into a zone it can be found
+        self.b1.moveTo(5, 5)
+        self.w.rezoneActors()
+        self.assertEqual([self.b1], self.w.findActorsByTag('b'))
+        self.assertEqual(self.b1, self.w.findActorByName('b1'))
+        self.w.removeActor(self.b1)
+        self.assertEqual([], self.w.findActorsByTag('b'))
+        self.assertRaises(serge.zone.ActorNotFound, self.w.findActorByName, 'b1')
+        
+    def testChangingTagAndNameUpdatesIndex(self):
+        """testChangingTagAndNameUpdatesIndex: changing the tag or name of an actor should be seen by the world"""
+        self.w.addZone(self.z1)
+        self.w.addZone(self.z2)
+        self.a1.tag = 'b'
+        self.a1.name = 'new'
+        self.assertEqual([self.a2], self.w.findActorsByTag('a'))
+        self.assertEqual([self.a1], self.w.findActorsByTag('b'))
+        self.assertEqual(self.a1, self.w.findActorByName('new'))
+        self.assertRaises(serge.zone.ActorNotFound, self.w.findActorByName, 'a1')
+        
+    def testCanGetLiveViewOfTag(self):
+        """testCanGetLiveViewOfTag: should be able to get a live view of actors with a tag"""
+        self.w.addZone(self.z1)
+        view = self.w.getActorsWithTag('b')
+        self.assertEqual(0, len(view))
+        self.w.addActor(self.b1)
+        self.assertEqual([self.b1], list(view))
+        self.a1.tag = 'b'
+        self.assertEqual(set([self.a1, self.b1]), set(view))
+        self.w.removeActor(self.b1)
+        self.assertEqual([self.a1], list(view))
+        self.assert_(self.a1 in view)
+        self.assert_(isinstance(view.getActors(), serge.actor.ActorCollection))
+        
     def testCanGetAllActors(self):
         """testCanGetAllActors: should be able to get all actors"""
         self.w.addZone(self.z1)
         self.w.addZone(self.z2)
         self.assertEqual(set([self.a1, self.a2]), set(self.w.getActors()))        
     
+    def testGettingActorsIsCached(self):
+        """testGettingActorsIsCached: getting the actors should be cached until they change"""
+        self.w.addZone(self.z1)
+        actors = self.w.getActors()
+        self.assert_(actors is self.w.getActors())
+        self.w.addActor(self.b1)
+        self.assertEqual([self.a1], actors)
+        self.assertEqual(set([self.a1, self.b1]), set(self.w.getActors()))
+        self.z1.removeActor(self.a1)
+        self.assertEqual([self.b1], self.w.getActors())
+        self.w.clearZones()
+        self.assertEqual([], self.w.getActors())
+        
+    def testCannotChangeCachedActors(self):
+        """testCannotChangeCachedActors: should not be able to change the shared collection of actors"""
+        self.w.addZone(self.z1)
+        actors = self.w.getActors()
+        self.assertRaises(serge.actor.ReadOnlyCollection, actors.append, self.b1)
+        self.assertRaises(serge.actor.ReadOnlyCollection, actors.remove, self.a1)
+        self.assertRaises(serge.actor.ReadOnlyCollection, actors.sort)
+        self.assertRaises(serge.actor.ReadOnlyCollection, actors.__setitem__, 0, self.b1)
+        self.assertRaises(serge.actor.ReadOnlyCollection, actors.__delslice__, 0, 1)
+        self.assertEqual([self.a1], self.w.getActors())
+        #
+        # A copy can be changed
+        copy = serge.actor.ActorCollection(actors)
+        copy.append(self.b1)
+        self.assertEqual([self.a1], self.w.getActors())
+        self.assertEqual(self.b1, copy.findActorsByTag('b')[0])
+        
     def testActorsAreACollection(self):
         """testActorsAreACollection: the actors returned are an actor collection"""
         self.w.addZone(self.z1)
         self.w.addZone(self.z2)
         self.assertEqual(self.a1, self.w.getActors().findActorByName('a1'))        
     
+    def testCanFindActorsByLocation(self):
+        """testCanFindActorsByLocation: should be able to find actors by location"""
+        self.a1.setSpatial(0, 0, 10, 10)
+        self.a2.setSpatial(100, 100, 10, 10)
+        self.w.addZone(self.z1)
+        self.w.addZone(self.z2)
+        self.b1.setSpatial(500, 500, 10, 10)
+        self.w.addActor(self.b1)
+        self.assertEqual([self.a1], self.w.findActorsAt(5, 5))
+        self.assertEqual([self.b1], self.w.findActorsAt(505, 505))
+        self.assertEqual(set([self.a1, self.a2]), set(self.w.findActorsInRectangle(5, 5, 100, 100)))
+        self.assertEqual([self.a2], self.w.findActorsInRadius(100, 100, 10))
+        self.assertEqual([], self.w.findActorsInRadius(300, 300, 100))
+        self.assert_(isinstance(self.w.findActorsInRadius(100, 100, 10), serge.actor.ActorCollection))
+
+    def testMovingActorsUpdatesLocationIndex(self):
+        """testMovingActorsUpdatesLocationIndex: moving and removing actors should update the location index"""
+        self.w.addActor(self.b1)
+        self.b1.setSpatialCentered(0, 0, 10, 10)
+        self.assertEqual([self.b1], self.w.findActorsAt(0, 0))
+        self.b1.moveTo(200, 200)
+        self.assertEqual([], self.w.findActorsAt(0, 0))
+        self.assertEqual([self.b1], self.w.findActorsAt(200, 200))
+        self.b1.resizeTo(100, 100)
+        self.assertEqual([self.b1], self.w.findActorsAt(245, 245))
+        self.w.removeActor(self.b1)
+        self.assertEqual([], self.w.findActorsAt(200, 200))
+        self.b1.moveTo(0, 0)
+        self.assertEqual([], self.w.findActorsAt(0, 0))
+
+    def testCanGetActorZone(self):
+        """testCanGetActorZone: should be able to find the zone an actor is in"""
+        self.w.addZone(self.z1)
+        self.b1.setSpatial(5000, 5000, 10, 10)
+        self.w.addActor(self.b1)
+        self.assertEqual(self.z1, self.w.getActorZone(self.a1))
+        self.assertEqual(None, self.w.getActorZone(self.b1))
+        self.assertRaises(serge.world.UnknownActor, self.w.getActorZone, self.a2)
+        self.z1.removeActor(self.a1)
+        self.assertEqual(False, self.w.hasActor(self.a1))
+        self.assertRaises(serge.world.UnknownActor, self.w.getActorZone, self.a1)
+
+    ### Collisions ###
+
+    def _addCollisionActors(self):
+        """Add the actors to a single zone for the collision tests"""
+        self.z1.removeActor(self.a1)
+        self.z2.removeActor(self.a2)
+        self.w.addZone(self.z3)
+        self.w.addActors([self.a1, self.a2, self.b1])
+
+    def _recordCollisions(self, *actors):
+        """Return a list that the collision events for the actors are recorded in"""
+        seen = []
+        for the_actor in actors:
+            for name in (serge.events.E_COLLISION_ENTER, serge.events.E_COLLISION_STAY, serge.events.E_COLLISION_EXIT):
+                the_actor.linkEvent(name, lambda obj, (a, n): seen.append((n, a.name, obj.name)), (the_actor, name))
+        return seen
+
+    def testCanCheckCollisions(self):
+        """testCanCheckCollisions: should be able to get collision events for actors with tags"""
+        self.a1.setSpatial(0, 0, 10, 10)
+        self.a2.setSpatial(100, 100, 10, 10)
+        self.b1.setSpatial(5, 5, 10, 10)
+        self._addCollisionActors()
+        self.w.addCollisionTags('a', 'b')
+        seen = self._recordCollisions(self.a1, self.a2, self.b1)
+        #
+        self.w.updateWorld(0)
+        self.assertEqual(set([('collision-enter', 'a1', 'b1'), ('collision-enter', 'b1', 'a1')]), set(seen))
+        self.assertEqual([(self.a1, self.b1)], [tuple(sorted(p, key=lambda a: a.name)) for p in self.w.getCollisions()])
+        del(seen[:])
+        self.w.updateWorld(0)
+        self.assertEqual(set([('collision-stay', 'a1', 'b1'), ('collision-stay', 'b1', 'a1')]), set(seen))
+        del(seen[:])
+        self.b1.moveTo(105, 105)
+        self.w.updateWorld(0)
+        self.assertEqual(set([
+            ('collision-exit', 'a1', 'b1'), ('collision-exit', 'b1', 'a1'),
+            ('collision-enter', 'a2', 'b1'), ('collision-enter', 'b1', 'a2')]), set(seen))
+        #
+        # Can stop checking
+        del(seen[:])
+        self.w.removeCollisionTags('b', 'a')
+        self.w.updateWorld(0)
+        self.assertEqual(set([('collision-exit', 'a2', 'b1'), ('collision-exit', 'b1', 'a2')]), set(seen))
+        self.assertEqual([], self.w.getCollisions())
+
+    def testCanCheckCollisionsWithSameTag(self):
+        """testCanCheckCollisionsWithSameTag: should be able to check collisions between actors with the same tag"""
+        self.a1.setSpatial(0, 0, 10, 10)
+        self.a2.setSpatial(5, 5, 10, 10)
+        self.b1.setSpatial(5, 5, 10, 10)
+        self._addCollisionActors()
+        self.w.addCollisionTags('a')
+        seen = self._recordCollisions(self.a1, self.a2, self.b1)
+        self.w.updateWorld(0)
+        self.assertEqual(sorted([('collision-enter', 'a1', 'a2'), ('collision-enter', 'a2', 'a1')]), sorted(seen))
+
+    def testCollisionsIgnoreInactiveAndRemovedActors(self):
+        """testCollisionsIgnoreInactiveAndRemovedActors: collisions should ignore inactive and removed actors"""
+        self.a1.setSpatial(0, 0, 10, 10)
+        self.a2.setSpatial(0, 0, 10, 10)
+        self.b1.setSpatial(5, 5, 10, 10)
+        self._addCollisionActors()
+        self.w.addCollisionTags('a', 'b')
+        self.a2.active = False
+        seen = self._recordCollisions(self.a1, self.a2, self.b1)
+        self.w.updateWorld(0)
+        self.assertEqual(2, len(seen))
+        #
+        del(seen[:])
+        self.w.removeActor(self.a1)
+        self.w.updateWorld(0)
+        self.assertEqual([('collision-exit', 'b1', 'a1')], seen)
+
+    ### Proximity ###
+
+    def testCanGetTagPositions(self):
+        """testCanGetTagPositions: should be able to get the positions of actors with a tag"""
+        self.w.addZone(self.z1)
+        self.w.addZone(self.z2)
+        self.a1.moveTo(10, 20)
+        self.a2.moveTo(30, 40)
+        g = self.w.getTagPositions('a')
+        self.assertEqual(set([(10, 20), (30, 40)]), set(map(tuple, g.positions.tolist())))
+        self.assert_(g is self.w.getTagPositions('a'))
+        self.assertEqual(0, len(self.w.getTagPositions('b')))
+        #
+        # Should update when actors move, change or are added
+        self.a1.moveTo(50, 60)
+        self.assertEqual(set([(50, 60), (30, 40)]), set(map(tuple, self.w.getTagPositions('a').positions.tolist())))
+        self.b1.moveTo(1, 2)
+        self.w.addActor(self.b1)
+        self.assertEqual([[1, 2]], self.w.getTagPositions('b').positions.tolist())
+        self.a1.tag = 'b'
+        self.assertEqual([[30, 40]], self.w.getTagPositions('a').positions.tolist())
+        self.w.removeActor(self.a2)
+        self.assertEqual(0, len(self.w.getTagPositions('a')))
+
     ### Rezoning ###
     
     def testCanRezoneBasedOnSpace(self):
@@ -168,6 +385,43 @@ class TestWorlds(unittest.TestCase):
         self.assertEqual(set([self.a2]), self.z1.actors)
         self.assertEqual(set([self.a1]), self.z2.actors) # a1 comes back
         
+    def testRezoningOnlyChecksMovedActors(self):
+        """testRezoningOnlyChecksMovedActors: rezoning should only check actors that have moved"""
+        self.w.addZone(self.z1)
+        self.w.addZone(self.z2)
+        self.z1.setSpatial(0, 0, 10, 10)
+        self.z2.setSpatial(10, 0, 10, 10)
+        self.a1.setSpatial(5, 5, 3, 3)
+        self.a2.setSpatial(15, 5, 3, 3)
+        self.w.rezoneActors()
+        #
+        # Changing the rectangle directly does not tell the world
+        self.a1.rect = serge.geometry.SimpleRect(15, 5, 3, 3)
+        self.w.rezoneActors()
+        self.assertEqual(set([self.a1]), self.z1.actors)
+        #
+        # Changing a zone checks everything
+        self.z2.setSpatial(10, 0, 10, 10)
+        self.w.rezoneActors()
+        self.assertEqual(set([]), self.z1.actors)
+        self.assertEqual(set([self.a1, self.a2]), self.z2.actors)
+        
+    def testCanAutoRezone(self):
+        """testCanAutoRezone: should be able to rezone automatically after updating"""
+        self.w.addZone(self.z1)
+        self.w.addZone(self.z2)
+        self.z1.setSpatial(0, 0, 10, 10)
+        self.z2.setSpatial(10, 0, 10, 10)
+        self.a1.setSpatial(5, 5, 3, 3)
+        self.a2.setSpatial(15, 5, 3, 3)
+        self.w.rezoneActors()
+        self.a1.setSpatial(15, 5, 3, 3)
+        self.w.updateWorld(10)
+        self.assertEqual(set([self.a1]), self.z1.actors)
+        self.w.setAutoRezone(True)
+        self.w.updateWorld(10)
+        self.assertEqual(set([self.a1, self.a2]), self.z2.actors)
+        
     def testUnzonedActorsAreNotUpdated(self):
         """testUnzonedActorsAreNotUpdated: unzoned actors are not updated"""
         self.w.addZone(self.z1)
@@ -366,6 +620,76 @@ class TestWorlds(unittest.TestCase):
         # Should have seen this
         self.assertEqual(True, self.a1.was_added)
         
+    def testCanAddAndRemoveActorsTogether(self):
+        """testCanAddAndRemoveActorsTogether: should be able to add and remove many actors at once"""
+        self.w.addZone(self.z1)
+        self.z1.setSpatial(0, 0, 100, 100)
+        self.a2.setSpatialCentered(50, 50, 10, 10)
+        self.b1.setSpatialCentered(500, 500, 10, 10)
+        self.w.addActors([self.a2, self.b1])
+        self.assertEqual(set([self.a1, self.a2]), self.z1.actors)
+        self.assertEqual(set([self.b1]), self.w.unzoned_actors)
+        self.assertEqual(True, self.a2.was_added)
+        self.assertEqual(True, self.b1.was_added)
+        #
+        self.w.removeActors([self.a1, self.b1, self.b1])
+        self.assertEqual(set([self.a2]), self.z1.actors)
+        self.assertEqual(set(), self.w.unzoned_actors)
+        self.assertEqual(True, self.a1.was_removed)
+        self.assertEqual(True, self.b1.was_removed)
+        
+    def testFailAddActorsShouldAddNone(self):
+        """testFailAddActorsShouldAddNone: should not add any actors if one is already there"""
+        self.w.addActor(self.a2)
+        self.assertRaises(serge.world.DuplicateActor, self.w.addActors, [self.b1, self.a2])
+        self.assertEqual(False, self.w.hasActor(self.b1))
+        self.assertRaises(serge.world.DuplicateActor, self.w.addActors, [self.b1, self.b1])
+        self.assertRaises(serge.world.UnknownActor, self.w.removeActors, [self.a2, self.b1])
+        self.assertEqual(True, self.w.hasActor(self.a2))
+        
+    def testCanBatchActorChanges(self):
+        """testCanBatchActorChanges: should be able to batch adding and removing actors"""
+        self.w.addActor(self.a1)
+        with self.w.batch():
+            self.w.addActor(self.a2)
+            self.w.removeActor(self.a1)
+            with self.w.batch():
+                self.w.addActor(self.b1)
+            self.assertEqual(False, self.w.hasActor(self.b1))
+            self.assertEqual(True, self.w.hasActor(self.a1))
+        self.assertEqual(set([self.a2, self.b1]), set(self.w.getActors()))
+        self.assertEqual(True, self.b1.was_added)
+        self.assertEqual(True, self.a1.was_removed)
+        
+    def testBatchCanCancelChanges(self):
+        """testBatchCanCancelChanges: adding and removing in a batch should cancel out"""
+        with self.w.batch():
+            self.w.addActor(self.b1)
+            self.w.removeActor(self.b1)
+        self.assertEqual(False, self.w.hasActor(self.b1))
+        self.assertEqual(False, self.b1.was_added)
+        
+    def testBatchWithErrorMakesNoChanges(self):
+        """testBatchWithErrorMakesNoChanges: an error in a batch should leave the world alone"""
+        def doit():
+            with self.w.batch():
+                self.w.addActor(self.b1)
+                raise ValueError('failed')
+        self.assertRaises(ValueError, doit)
+        self.assertEqual(False, self.w.hasActor(self.b1))
+        self.w.addActor(self.b1)
+        self.assertEqual(True, self.w.hasActor(self.b1))
+        
+    def testCanAddCompositeActorsTogether(self):
+        """testCanAddCompositeActorsTogether: should be able to add and remove composite actors with their children"""
+        parent = serge.actor.CompositeActor('parent', 'parent')
+        child = serge.actor.Actor('child', 'child')
+        parent.addChild(child)
+        self.w.addActors([parent, child])
+        self.assertEqual(set([parent, child]), set(self.w.getActors()))
+        self.w.removeActors([child, parent])
+        self.assertEqual([], self.w.getActors())
+        
     def testCanScheduleDeletion(self):
         """testCanScheduleDeletion: should be able to schedule deletion of an object"""
         self.w.addZone(self.z1)
@@ -839,6 +1163,76 @@ class TestWorlds(unittest.TestCase):
         self.assertEqual(True, doit.called)
         
         
+    def testActorsRenderInLayerOrder(self):
+        """testActorsRenderInLayerOrder: actors should render in the order of their layers"""
+        rendered = []
+        for actor in (self.a1, self.a2, self.b1):
+            actor.renderTo = lambda renderer, interval, actor=actor: rendered.append(actor)
+        self.a1.setLayerName('three')
+        self.a2.setLayerName('one')
+        self.b1.setLayerName('two')
+        self.w.addZone(self.z1)
+        self.w.addZone(self.z2)
+        self.w.addActor(self.b1)
+        self.w.renderTo(self.r, 0)
+        self.assertEqual([self.a2, self.b1, self.a1], rendered)
+        #
+        # Changing layers and removing actors should be seen
+        rendered[:] = []
+        self.a1.setLayerName('one')
+        self.w.removeActor(self.b1)
+        self.w.renderTo(self.r, 0)
+        self.assertEqual([self.a2, self.a1], rendered)
+        #
+        # Changing layer order should be seen
+        rendered[:] = []
+        self.r.getLayer('one').order = 10
+        self.a2.setLayerName('two')
+        self.w.renderTo(self.r, 0)
+        self.assertEqual([self.a2, self.a1], rendered)
+
+    def testBatchedRenderingKeepsOrder(self):
+        """testBatchedRenderingKeepsOrder: batched rendering should keep the order of actors on a layer"""
+        surface = self.r.getLayer('one').getSurface()
+        self.w.addZone(self.z3)
+        actors = []
+        for colour, visual in (((255, 0, 0), serge.visual.SurfaceDrawing(10, 10)),
+                               ((0, 255, 0), TestDrawing(10, 10)),
+                               ((0, 0, 255), serge.visual.SurfaceDrawing(10, 10))):
+            visual.getSurface().fill(colour)
+            a = serge.actor.Actor('batched')
+            a.visual = visual
+            a.setLayerName('one')
+            a.moveTo(50, 50)
+            self.w.addActor(a)
+            actors.append(a)
+        self.a1.setLayerName('one')
+        self.w.addActor(self.a1)
+        #
+        self.w.renderTo(self.r, 0)
+        self.assertEqual((0, 0, 255, 255), surface.get_at((50, 50)))
+        self.assertEqual(1, actors[1].visual.rendered)
+        self.assertEqual(1, self.a1.rendered)
+        #
+        self.w.removeActor(actors[2])
+        self.r.getLayer('one').clearSurface()
+        self.w.renderTo(self.r, 0)
+        self.assertEqual((0, 255, 0, 255), surface.get_at((50, 50)))
+        
+    def testDrawingsOverridingRenderToAreNotBatched(self):
+        """testDrawingsOverridingRenderToAreNotBatched: drawings that override renderTo should not be batched"""
+        surface = self.r.getLayer('one').getSurface()
+        self.w.addZone(self.z3)
+        a = serge.actor.Actor('custom')
+        a.visual = TestCustomDrawing(10, 10)
+        a.setLayerName('one')
+        a.moveTo(50, 50)
+        self.w.addActor(a)
+        #
+        self.w.renderTo(self.r, 0)
+        self.assertEqual(1, a.visual.rendered)
+        self.assertEqual((255, 0, 0, 255), surface.get_at((50, 50)))
+        
     def testCanHookPostRendering(self):
         """testCanHookPostRendering: should be able to hook after rendering"""
         self.w.addZone(self.z1)
@@ -925,6 +1319,30 @@ class TestActor(serge.actor.Actor):
         """Being rendered"""
         self.rendered += 1
 
+class TestDrawing(serge.visual.SurfaceDrawing):
+    """A drawing that cannot be batched"""
+    
+    rendered = 0
+    
+    def getBlit(self, milliseconds, (x, y)):
+        """Return None as we cannot be batched"""
+        return None
+        
+    def renderTo(self, milliseconds, surface, (x, y)):
+        """Render to a surface"""
+        super(TestDrawing, self).renderTo(milliseconds, surface, (x, y))
+        self.rendered += 1
+        
+class TestCustomDrawing(serge.visual.SurfaceDrawing):
+    """A drawing that draws itself in renderTo"""
+    
+    rendered = 0
+    
+    def renderTo(self, milliseconds, surface, (x, y)):
+        """Render to a surface"""
+        surface.fill((255, 0, 0), (x, y, self.width, self.height))
+        self.rendered += 1
+        
 class TestAddingActor(serge.actor.Actor):
     """An actor that tries to add another during an update"""
     
@@ -8,6 +8,7 @@ import serge.actor
 import serge.geometry
 import serge.render
 import serge.world
+import serge.engine
 
 class TestZones(unittest.TestCase):
     """Tests for the Zone"""
@@ -45,6 +46,54 @@ class TestZones(unittest.TestCase):
         self.assertEqual(0, self.a1.counter)
         self.assertEqual(100, self.a2.counter)
         
+
+    def testDistantZonesUpdateLessOften(self):
+        """testDistantZonesUpdateLessOften: zones far from the camera should update less often"""
+        engine = serge.engine.Engine()
+        engine.getRenderer().getCamera().setSpatial(0, 0, 100, 100)
+        self.w.setEngine(engine)
+        self.z1.addActor(self.a1)
+        self.z1.setSpatial(300, 0, 100, 100)
+        self.z1.setLOD(100, 50)
+        #
+        # Near enough
+        self.z1.setLOD(500, 50)
+        self.z1.updateZone(10, self.w)
+        self.assertEqual(10, self.a1.counter)
+        #
+        # Far away so the time should build up
+        self.z1.setLOD(100, 50)
+        for i in range(4):
+            self.z1.updateZone(10, self.w)
+        self.assertEqual(10, self.a1.counter)
+        self.z1.updateZone(10, self.w)
+        self.assertEqual(60, self.a1.counter)
+        
+    def testVeryDistantZonesAreFrozen(self):
+        """testVeryDistantZonesAreFrozen: zones very far from the camera should not update"""
+        engine = serge.engine.Engine()
+        engine.getRenderer().getCamera().setSpatial(0, 0, 100, 100)
+        self.w.setEngine(engine)
+        self.z1.addActor(self.a1)
+        self.z1.setSpatial(300, 0, 100, 100)
+        self.z1.setLOD(100, 50, 150)
+        for i in range(10):
+            self.z1.updateZone(10, self.w)
+        self.assertEqual(0, self.a1.counter)
+        #
+        # When the camera comes close it updates at full rate
+        engine.getRenderer().getCamera().setSpatial(250, 0, 100, 100)
+        self.z1.updateZone(10, self.w)
+        self.assertEqual(10, self.a1.counter)
+        
+    def testZonesWithoutEngineAlwaysUpdate(self):
+        """testZonesWithoutEngineAlwaysUpdate: zones should update if there is no camera"""
+        self.z1.addActor(self.a1)
+        self.z1.setLOD(1, 50, 2)
+        self.z1.updateZone(10, self.w)
+        self.z1.updateZone(10, None)
+        self.assertEqual(20, self.a1.counter)
+        
            
     ### Adding and removing actors ###
     
@@ -4,6 +4,7 @@ import pygame
 import os
 import copy
 import re
+import weakref
 
 pygame.font.init()
 
@@ -230,10 +231,28 @@ class Drawing(object):
         """Render to a surface"""
         raise NotImplementedError('renderTo not implemented on %s' % self)
 
+    def getBlit(self, milliseconds, (x, y)):
+        """Return the (surface, (x, y)) to blit to render the drawing
+        
+        This lets the rendering of many drawings be batched together. None
+        means that the drawing cannot be batched and renderTo must be used.
+        
+        """
+        return None
+
     def setAlpha(self, alpha):
         """Set the overall alpha"""
         raise NotImplementedError('setAlpha not implemented on %s' % self)
 
+    def getRenderState(self):
+        """Return a value that changes whenever the drawing would render differently
+        
+        This is used by cached layers to tell when they need to be redrawn. None
+        means that the state is not known and the drawing must always be redrawn.
+        
+        """
+        return None
+
     def _setAlphaForSurface(self, surface, alpha):
         """Set the alpha for a surface"""
         #
@@ -300,6 +319,20 @@ class SurfaceDrawing(Drawing):
         """Render to a surface"""
         surface.blit(self.getSurface(), (x, y))
 
+    def getBlit(self, milliseconds, (x, y)):
+        """Return the (surface, (x, y)) to blit to render the drawing"""
+        return self.getSurface(), (x, y)
+
+    def getRenderState(self):
+        """Return a value that changes whenever the drawing would render differently
+        
+        Drawing directly on to our surface is not detected so if you do this
+        then invalidate any cached layer that we are rendered on, and the
+        renderer if it is using dirty rectangles or a lower resolution.
+        
+        """
+        return self.surface
+
     def scaleBy(self, factor):
         """Scale the image by a factor"""
         if factor <= 0:
@@ -341,9 +374,14 @@ class Sprite(Drawing):
     #
     rotate = smooth_rotate
     
-    # Set the following to True to allow caching of rotations of a sprite to the given number of degrees
+    # Set the following to True to allow caching of rotations of a sprite to the given number of degrees.
+    # The cache is shared by all the copies of a sprite so actors using the same sprite
+    # at the same angle (eg mounted actors rotating with their parent) only rotate the image once
     cache_rotations = False
     cache_granularity = 1.0 
+    #
+    # The cached cells for each raw image
+    _cell_cache = weakref.WeakKeyDictionary()
     
     def getCopy(self):
         """Return a copy of this sprite"""
@@ -353,18 +391,14 @@ class Sprite(Drawing):
 
     def setAlpha(self, alpha):
         """Set the overall alpha"""
+        self._alpha = alpha
         self.setCells()
         for idx, cell in enumerate(self.cells):
             self._setAlphaForSurface(cell, alpha)
-        self._alpha = alpha
 
     def setImage(self, image, (width, height), framerate=0, running=False, loop=True, one_direction=False, convert_alpha=False):
         """Set the image of this sprite"""
         #
-        # Store cells of the image for speed - use of the cache is determined by the
-        # cache_rotations property
-        self._cell_cache = {}
-        #
         # Store raw image
         self.raw_image = image if not convert_alpha else image.convert_alpha()
         #
@@ -383,10 +417,10 @@ class Sprite(Drawing):
         self.zoom = 1.0
         self.angle = 0.0
         self.fixed_size = None
+        self._alpha = 1.0
         #
         self.setCells()
         self.current_cell = 0
-        self._alpha = 1.0
         
     ### Cells ###
         
@@ -394,11 +428,15 @@ class Sprite(Drawing):
         """Create the cells for the animation of this sprite"""
         self.cells = []
         #
-        # Have we cached this set of cells
-        if self.cache_rotations:
+        # Have we cached this set of cells - cells with alpha are changed in place so cannot be shared
+        use_cache = self.cache_rotations and self._alpha == 1.0
+        if use_cache:
             granular_angle = (self.angle//self.cache_granularity)*self.cache_granularity
+            key = (granular_angle, self.zoom, self.fixed_size, self.horizontal_flip, self.vertical_flip,
+                   self.raw_width, self.raw_height)
+            cache = self._cell_cache.setdefault(self.raw_image, {})
             try:
-                self.cells = self._cell_cache[granular_angle]
+                self.cells = cache[key]
             except KeyError:
                 # Oh, well - not in the cache after all
                 pass
@@ -430,8 +468,8 @@ class Sprite(Drawing):
             self.cy = self.height/2
             self.radius = max(self.width, self.height)/2
         #
-        if self.cache_rotations:
-            self._cell_cache[granular_angle] = self.cells
+        if use_cache:
+            cache[key] = self.cells
 
     def setSize(self, width, height):
         """Set the size of the drawing directly"""
@@ -483,8 +521,16 @@ class Sprite(Drawing):
         
     def renderTo(self, milliseconds, surface, (x, y)):
         """Render to a surface"""
-        #
-        # Update current frame
+        self._updateAnimation(milliseconds)
+        surface.blit(self.cells[self.current_cell], (x, y))
+
+    def getBlit(self, milliseconds, (x, y)):
+        """Return the (surface, (x, y)) to blit to render the sprite"""
+        self._updateAnimation(milliseconds)
+        return self.cells[self.current_cell], (x, y)
+
+    def _updateAnimation(self, milliseconds):
+        """Move the animation on by a number of milliseconds"""
         if self.framerate and self.running:
             self.last_time += milliseconds
             #
@@ -508,9 +554,6 @@ class Sprite(Drawing):
                         self.running = False
                     elif not self.one_direction:
                         self.direction *= -1
-        #
-        # Draw to the surface
-        surface.blit(self.cells[self.current_cell], (x, y))
 
     def _mapVirtualToRealCell(self, n):
         """Map a virtual cell number to a real one
@@ -564,6 +607,12 @@ class Sprite(Drawing):
     def getSurface(self):
         """Return the current surface"""
         return self.cells[self.current_cell]
+
+    def getRenderState(self):
+        """Return a value that changes whenever the sprite would render differently"""
+        if self.framerate and self.running:
+            return None
+        return self.cells[self.current_cell]
         
                  
 class Text(Drawing):
@@ -653,10 +702,18 @@ class Text(Drawing):
         
     def renderTo(self, milliseconds, surface, (x, y)):
         """Render to a surface"""
+        surface.blit(*self.getBlit(milliseconds, (x, y)))
+        
+    def getBlit(self, milliseconds, (x, y)):
+        """Return the (surface, (x, y)) to blit to render the text"""
         if self.justify == 'left':
-            surface.blit(self.surface, (x+self.width/2, y+self.height/2))
+            return self.surface, (x+self.width/2, y+self.height/2)
         else:
-            surface.blit(self.surface, (x, y))
+            return self.surface, (x, y)
+
+    def getRenderState(self):
+        """Return a value that changes whenever the text would render differently"""
+        return self.surface, self.justify
         
     def setAngle(self, angle):
         """Rotate our sprite by a certain angle"""
@@ -1,5 +1,7 @@
 """The main world definition"""
 
+import collections
+
 import common
 import zone
 import serialize
@@ -7,6 +9,7 @@ import geometry
 import events 
 import actor
 import profiler
+import render
 
 class UnknownActor(Exception): """Could not find the actor"""
 class DuplicateActor(Exception): """The actor was already in the world"""
@@ -24,6 +27,8 @@ class World(common.Loggable, serialize.Serializable, common.EventAware):
         serialize.S('name', '', 'the name of this world'),
         serialize.L('zones', set(), 'the zones in this world'),
         serialize.L('unzoned_actors', set(), 'the actors not in any zone in this world'),
+        serialize.B('auto_rezone', False, 'whether to rezone actors after each update'),
+        serialize.L('collision_tags', [], 'the pairs of tags to check for overlapping actors'),
     )    
         
     def __init__(self, name):
@@ -34,6 +39,8 @@ class World(common.Loggable, serialize.Serializable, common.EventAware):
         self.engine = None
         self.zones = set()
         self.unzoned_actors = set() # Actors get put here if then end up in no zone
+        self.auto_rezone = False
+        self.collision_tags = []
         self.event_handlers = {}
         self.init()
         
@@ -46,18 +53,30 @@ class World(common.Loggable, serialize.Serializable, common.EventAware):
         self.log.info('Initializing world %s' % self.name)
         super(World, self).__init__()
         self.engine = None
-        #
-        # This list is used to order the processing of actors in rendering. The 
-        # flag is used to tell us when we need to resort them
-        self._sorted_actors = []
-        self._actors_need_resorting = False
         self._scheduled_deletions = set()
         #
+        # Batches of actors being added or removed
+        self._batch = None
+        self._batch_added = set()
+        self._batch_removed = set()
+        #
         # Now process actors
         for zone in self.zones:
             zone.init()
-        for actor in self.unzoned_actors:
-            actor.init()
+            zone.setWorld(self)
+        for the_actor in self.unzoned_actors:
+            the_actor.init()
+        #
+        # The indexes let us find actors by location, tag and name without checking them all
+        self._spatial_index = geometry.SpatialHash()
+        self._actor_index = actor.ActorIndex()
+        self._actor_zones = {}
+        self._actor_cache = None
+        self._rebuildIndexes()
+        self._rezone_all = True
+        self._dirty_transforms = []
+        self._collisions = set()
+        self._tag_positions = {}
 
     ### Zones ###
     
@@ -67,11 +86,24 @@ class World(common.Loggable, serialize.Serializable, common.EventAware):
             raise DuplicateZone('The zone %s is already in the world' % zone)
         else:
             self.zones.add(zone)
-        self._actors_need_resorting = True
+            zone.setWorld(self)
+            for the_actor in zone.getActors():
+                self.indexActor(the_actor, zone)
+        
+    def zoneChanged(self, zone):
+        """Called by a zone when its location or size changes"""
+        self._rezone_all = True
+        
+    def setAutoRezone(self, auto_rezone):
+        """Set whether actors are rezoned automatically after each update"""
+        self.auto_rezone = auto_rezone
         
     def clearZones(self):
         """Remove all the zones"""
+        for zone in self.zones:
+            zone.setWorld(None)
         self.zones = set()
+        self._rebuildIndexes()
         
     ### Main ###
                 
@@ -88,6 +120,12 @@ class World(common.Loggable, serialize.Serializable, common.EventAware):
             except UnknownActor:
                 # Ok, the actor must have been removed directly
                 pass
+        #
+        self.updateTransforms()
+        if self.collision_tags or self._collisions:
+            self.checkCollisions()
+        if self.auto_rezone:
+            self.rezoneActors()
 
     def setEngine(self, engine):
         """Set the engine that we are owned by"""
@@ -96,59 +134,233 @@ class World(common.Loggable, serialize.Serializable, common.EventAware):
     def getEngine(self):
         """Return the engine that we are owned by"""
         return self.engine
+
+    def getProfiler(self):
+        """Return the profiler selected by our engine"""
+        return self.engine.getProfiler() if self.engine else profiler.NULL_PROFILER
         
     def findActorsByTag(self, tag):
-        """Return all the actors in all zones based on the tag"""
-        results = actor.ActorCollection()
-        for z in self.zones:
-            results.extend(z.findActorsByTag(tag))
-        return results    
+        """Return all the actors in all zones based on the tag
+        
+        Unzoned actors are not included - use getActorsWithTag for a view that
+        includes them.
+        
+        """
+        return actor.ActorCollection([the_actor for the_actor in self._actor_index.findActorsByTag(tag)
+                                        if self._actor_zones.get(the_actor) is not None])
+    
+    def getActorsWithTag(self, tag):
+        """Return a live, read only view of the actors in the world with the tag
+        
+        The view is updated as actors are added and removed so it can
+        be kept and used every frame.
+        
+        """
+        return self._actor_index.getTagView(tag)
     
     def findActorByName(self, name):
         """Return the actor with the give name in all zones"""
-        for z in self.zones:
-            try:
-                return z.findActorByName(name)
-            except zone.ActorNotFound:
-                pass
-        else:
-            raise zone.ActorNotFound('Unable to find actor named "%s" in any zone' % name)
+        for the_actor in self._actor_index.findActorsByName(name):
+            if self._actor_zones.get(the_actor) is not None:
+                return the_actor
+        raise zone.ActorNotFound('Unable to find actor named "%s" in any zone' % name)
 
     def findActorsAt(self, x, y):
         """Return the actors at a certain location"""
         actors = actor.ActorCollection()
         test = geometry.Point(x, y)
-        for the_actor in self.getActors():
+        for the_actor in self._spatial_index.findAtPoint(x, y):
             if test.isInside(the_actor):
                 actors.append(the_actor)
         return actors
+
+    def findActorsInRectangle(self, x, y, w, h):
+        """Return the actors overlapping a rectangle"""
+        test = geometry.Rectangle(x, y, w, h)
+        return actor.ActorCollection([the_actor for the_actor in self._spatial_index.findInRectangle(x, y, w, h)
+                                      if test.isOverlapping(the_actor)])
+
+    def findActorsInRadius(self, x, y, radius):
+        """Return the actors whose centers are within a radius of a point"""
+        return actor.ActorCollection(self._spatial_index.findInRadius(x, y, radius))
+
+    ### Collisions ###
+    
+    def addCollisionTags(self, tag1, tag2=None):
+        """Check for overlaps between actors with one tag and actors with another tag
         
-    def getActors(self):
-        """Return all the actors"""
-        actors = actor.ActorCollection(self.unzoned_actors)
+        If the second tag is not given then overlaps between actors with the
+        first tag are checked. Overlaps are checked after each update and the
+        actors are sent E_COLLISION_ENTER, E_COLLISION_STAY and E_COLLISION_EXIT
+        events with the other actor as the argument.
+        
+        """
+        tags = (tag1, tag1 if tag2 is None else tag2)
+        if tags not in self.collision_tags and tags[::-1] not in self.collision_tags:
+            self.collision_tags.append(tags)
+            
+    def removeCollisionTags(self, tag1, tag2=None):
+        """Stop checking for overlaps between actors with the tags"""
+        tags = (tag1, tag1 if tag2 is None else tag2)
+        self.collision_tags = [item for item in self.collision_tags if item != tags and item != tags[::-1]]
+        
+    def getCollisions(self):
+        """Return the pairs of actors that were overlapping after the last check"""
+        return list(self._collisions)
+        
+    def checkCollisions(self):
+        """Find the actors with the collision tags that overlap and send them the collision events"""
+        collisions = set()
+        for tag1, tag2 in self.collision_tags:
+            actors, others = self.getActorsWithTag(tag1), self.getActorsWithTag(tag2)
+            #
+            # Look around the smaller group
+            if len(others) < len(actors):
+                actors, tag2 = others, tag1
+            for the_actor in actors:
+                if not the_actor.active:
+                    continue
+                rect = the_actor.rect
+                for other in self._spatial_index.findInRectangle(*rect):
+                    if other.tag == tag2 and other is not the_actor and other.active and rect.colliderect(other.rect):
+                        collisions.add((the_actor, other) if id(the_actor) < id(other) else (other, the_actor))
+        #
+        # Send the events
+        old_collisions, self._collisions = self._collisions, collisions
+        for actor1, actor2 in collisions:
+            name = events.E_COLLISION_STAY if (actor1, actor2) in old_collisions else events.E_COLLISION_ENTER
+            actor1.processEvent((name, actor2))
+            actor2.processEvent((name, actor1))
+        for actor1, actor2 in old_collisions - collisions:
+            if actor1 in self._actor_zones:
+                actor1.processEvent((events.E_COLLISION_EXIT, actor2))
+            if actor2 in self._actor_zones:
+                actor2.processEvent((events.E_COLLISION_EXIT, actor1))
+    
+    ### Spatial ###
+    
+    def getTagPositions(self, tag):
+        """Return a geometry.PointGroup of the actors with a tag
+        
+        The group is cached until actors move or are added or removed so
+        calling this every frame is cheap.
+        
+        """
+        version = (self._spatial_index.version, self._actor_index.version)
+        try:
+            group, group_version = self._tag_positions[tag]
+        except KeyError:
+            group_version = None
+        if group_version != version:
+            group = geometry.PointGroup(self._actor_index.getTagView(tag))
+            self._tag_positions[tag] = (group, version)
+        return group
+    
+    def setSpatialCellSize(self, cell_size):
+        """Set the size of the cells used to index the locations of actors
+        
+        The best size is around the size of a typical actor.
+        
+        """
+        self._spatial_index = geometry.SpatialHash(cell_size)
+        self._tag_positions = {}
+        self._rebuildIndexes()
+
+    def _rebuildIndexes(self):
+        """Rebuild the indexes from all our actors"""
+        for the_actor in self._spatial_index.getItems():
+            the_actor.setSpatialIndex(None)
+        self._spatial_index.clear()
+        self._actor_index.clear()
+        self._actor_zones = {}
+        self._actor_cache = None
+        for the_actor in self.unzoned_actors:
+            self.indexActor(the_actor)
         for z in self.zones:
-            actors.extend(z.getActors())
-        return actors
+            for the_actor in z.getActors():
+                self.indexActor(the_actor, z)
+
+    def indexActor(self, the_actor, the_zone=None):
+        """Add an actor to the indexes - zones call this when actors are added to them"""
+        self._actor_zones[the_actor] = the_zone
+        self._actor_cache = None
+        if self._spatial_index.hasItem(the_actor):
+            self._spatial_index.updateItem(the_actor)
+        else:
+            self._spatial_index.addItem(the_actor)
+        the_actor.setSpatialIndex(self._spatial_index)
+        self._actor_index.addActor(the_actor)
+
+    def unindexActor(self, the_actor):
+        """Remove an actor from the indexes - zones call this when actors are removed from them"""
+        self._actor_zones.pop(the_actor, None)
+        self._actor_cache = None
+        if self._spatial_index.hasItem(the_actor):
+            self._spatial_index.removeItem(the_actor)
+        the_actor.setSpatialIndex(None)
+        self._actor_index.removeActor(the_actor)
+        
+    def getActors(self):
+        """Return all the actors
+        
+        The collection is cached until actors are added or removed so
+        calling this repeatedly is cheap. The collection is shared so it
+        cannot be changed - create an ActorCollection from it if you need to.
+        
+        """
+        if self._actor_cache is None:
+            self._actor_cache = actor.FrozenActorCollection(self._actor_zones)
+        return self._actor_cache
+      
+    def transformChanged(self, the_actor):
+        """Called by a mountable actor when it moves or rotates so its mounted actors can be updated"""
+        self._dirty_transforms.append(the_actor)
+        
+    def updateTransforms(self):
+        """Move and rotate the mounted actors of any actors that have moved or rotated
+        
+        This is done after the world updates and before it renders. You
+        can also call it directly if you need to know the location of
+        mounted actors before then.
+        
+        """
+        while self._dirty_transforms:
+            dirty, self._dirty_transforms = self._dirty_transforms, []
+            for the_actor in dirty:
+                the_actor.updateTransforms()
       
     def rezoneActors(self):
-        """Move actors to the right zone based on their spatial location"""
+        """Move actors to the right zone based on their spatial location
+        
+        Only the actors that have moved or changed size since the last
+        rezoning are checked, unless a zone has changed in which case
+        all the actors are checked.
+        
+        """
         #
         # Start with a list of actors to find homes for based on any that
         # were not in any zones at all
         moved = self.unzoned_actors
         self.unzoned_actors = set()
         #
+        # Find the actors that might have left their zone
+        candidates = self._spatial_index.popUpdatedItems()
+        if self._rezone_all:
+            candidates = self._actor_zones.keys()
+            self._rezone_all = False
+        #
         # Find all the actors that are no longer in the right zone
         # and remove them from their current zone
-        for z in self.zones:
-            for actor in z.actors.copy():
-                if not actor.isOverlapping(z):
-                    z.removeActor(actor)
-                    moved.add(actor)
+        for actor in candidates:
+            z = self._actor_zones.get(actor)
+            if z is not None and not actor.isOverlapping(z):
+                z.removeActor(actor)
+                moved.add(actor)
         #
         # Now find the place for the moved actors
         for actor in moved:
-            self.addActor(actor)
+            self._placeActor(actor)
+            actor.addedToWorld(self)
             
     def clearActors(self):
         """Clear all the actors"""
@@ -166,6 +378,7 @@ class World(common.Loggable, serialize.Serializable, common.EventAware):
         for actor in list(self.unzoned_actors):
             if actor.tag not in tags:
                 self.unzoned_actors.remove(actor)
+                self.unindexActor(actor)
 
     def clearActorsWithTags(self, tags):
         """Clear all actors with a tag in the list of tags"""
@@ -179,10 +392,17 @@ class World(common.Loggable, serialize.Serializable, common.EventAware):
         for actor in list(self.unzoned_actors):
             if actor.tag not in tags:
                 self.unzoned_actors.remove(actor)
+                self.unindexActor(actor)
        
         
     def addActor(self, actor):
         """Add an actor to the world"""
+        if self._batch is not None:
+            self._batch.addActor(actor)
+            return
+        elif actor in self._batch_added:
+            # Already added as part of the batch being added now
+            return
         #
         self.log.debug('Adding %s to world %s' % (actor.getNiceName(), self.name))
         #
@@ -190,7 +410,47 @@ class World(common.Loggable, serialize.Serializable, common.EventAware):
         if self.hasActor(actor):
             raise DuplicateActor('The actor %s is already in the world' % actor.getNiceName())
         #
-        # Try to put the actor in the right zone
+        self._placeActor(actor)
+        #
+        # Tell the actor about it
+        actor.addedToWorld(self)
+        
+    def addActors(self, actors):
+        """Add a number of actors to the world at once
+        
+        All the actors are checked before any are added and then
+        the actors are told they were added once they are all in
+        the world.
+        
+        """
+        if self._batch is not None:
+            for the_actor in actors:
+                self._batch.addActor(the_actor)
+            return
+        #
+        # Make sure none of the actors are already here
+        actors = list(actors)
+        added = set()
+        for the_actor in actors:
+            if the_actor in added or self.hasActor(the_actor):
+                raise DuplicateActor('The actor %s is already in the world' % the_actor.getNiceName())
+            added.add(the_actor)
+        #
+        self.log.debug('Adding %d actors to world %s' % (len(actors), self.name))
+        for the_actor in actors:
+            self._placeActor(the_actor)
+        #
+        # Tell the actors about it - composite actors will try to add their
+        # children but we can ignore the ones we have just added
+        self._batch_added = added
+        try:
+            for the_actor in actors:
+                the_actor.addedToWorld(self)
+        finally:
+            self._batch_added = set()
+        
+    def _placeActor(self, actor):
+        """Put the actor in the right zone or with the unzoned actors"""
         for z in self.zones:
             if z.wouldContain(actor):
                 z.addActor(actor)
@@ -198,34 +458,81 @@ class World(common.Loggable, serialize.Serializable, common.EventAware):
         else:
             # The actor is not in any zones, store for later
             self.unzoned_actors.add(actor)
-        #
-        # Tell the actor about it
-        actor.addedToWorld(self)
-        #
-        self._actors_need_resorting = True
+            self.indexActor(actor)
         
     def removeActor(self, actor):
         """Remove the actor from the world"""
-        self.log.debug('Removing "%s" actor (%s)' % (actor.tag, actor.getNiceName()))
+        if self._batch is not None:
+            self._batch.removeActor(actor)
+            return
+        elif actor in self._batch_removed:
+            # Already removed as part of the batch being removed now
+            return
         #
-        self._actors_need_resorting = True
+        self.log.debug('Removing "%s" actor (%s)' % (actor.tag, actor.getNiceName()))
         #
-        # Try to remove from zones
-        for z in self.zones:
-            if z.hasActor(actor):
-                z.removeActor(actor)
-                break
-        else:
-            #
-            # We didn't find it in the zone - maybe in the unzoned
-            if actor in self.unzoned_actors:
-                self.unzoned_actors.remove(actor)
-            else:
-                raise UnknownActor('The actor %s was not found in the world' % actor)
+        self._displaceActor(actor)
         #
         # Tell the actor about it
         actor.removedFromWorld(self)
 
+    def removeActors(self, actors):
+        """Remove a number of actors from the world at once
+        
+        All the actors are checked before any are removed and then
+        the actors are told they were removed once they are all out
+        of the world.
+        
+        """
+        if self._batch is not None:
+            for the_actor in actors:
+                self._batch.removeActor(the_actor)
+            return
+        #
+        # Make sure all the actors are here
+        actors = collections.OrderedDict.fromkeys(actors).keys()
+        for the_actor in actors:
+            if not self.hasActor(the_actor):
+                raise UnknownActor('The actor %s was not found in the world' % the_actor)
+        #
+        self.log.debug('Removing %d actors from world %s' % (len(actors), self.name))
+        for the_actor in actors:
+            self._displaceActor(the_actor)
+        #
+        # Tell the actors about it - composite actors will try to remove their
+        # children but we can ignore the ones we have just removed
+        self._batch_removed = set(actors)
+        try:
+            for the_actor in actors:
+                the_actor.removedFromWorld(self)
+        finally:
+            self._batch_removed = set()
+
+    def _displaceActor(self, actor):
+        """Take the actor out of its zone or the unzoned actors"""
+        z = self.getActorZone(actor)
+        if z is not None:
+            z.removeActor(actor)
+        else:
+            self.unzoned_actors.remove(actor)
+            self.unindexActor(actor)
+        #
+        # The actor might be reused (eg from a pool) so forget any pending removal
+        self._scheduled_deletions.discard(actor)
+
+    def batch(self):
+        """Return a batch to collect actors added to and removed from the world
+        
+        Use this as a context manager. While the batch is open calls to
+        addActor and removeActor are collected and then applied in one go
+        with removeActors and addActors when the batch closes. Batches
+        can be nested, in which case the outermost batch applies the changes.
+        
+        """
+        if self._batch is None:
+            self._batch = ActorBatch(self)
+        return self._batch
+
     def scheduleActorRemoval(self, actor):
         """Remove an actor at the end of the next update for the world
         
@@ -239,39 +546,127 @@ class World(common.Loggable, serialize.Serializable, common.EventAware):
 
     def hasActor(self, actor):
         """Return True if this actor is in the world"""
-        #
-        # Try to remove from zones
-        for z in self.zones:
-            if z.hasActor(actor):
-                return True
-        #
-        # We didn't find it in the zone - maybe in the unzoned
-        return actor in self.unzoned_actors
+        return actor in self._actor_zones
+
+    def getActorZone(self, actor):
+        """Return the zone that the actor is in or None if it is not in any zone"""
+        try:
+            return self._actor_zones[actor]
+        except KeyError:
+            raise UnknownActor('The actor %s was not found in the world' % actor)
 
     def renderTo(self, renderer, interval):
         """Render all of our actors in active zones"""
-        #
-        # Watch out in case we need to reorder our actors
-        if self._actors_need_resorting:
-            self.log.debug('Sorting actors now')
-            self._sorted_actors = renderer.orderActors(self.getActors())
-            self._actors_need_resorting = False
-        #
         camera = renderer.getCamera()
         self.processEvent((events.E_BEFORE_RENDER, self))
+        self.updateTransforms()
         #
         # Render all of the actors
-        for actor in self._sorted_actors:
+        the_profiler = self.getProfiler()
+        if the_profiler.enabled:
+            the_profiler.start(None, 'renderWorld')
+        #
+        # The actors are kept in buckets for each layer so we only need to order the layers. Cached
+        # layers, and all layers when using dirty rectangles, are always checked because they need
+        # redrawing when their last actor goes.
+        dirty = renderer.isUsingDirtyRects()
+        checked = dict([(layer.name, layer) for layer in renderer.getLayers()
+            if layer.active and (layer.cached or dirty)])
+        layer_names = set(self._actor_index.getLayerNames())
+        layer_names.update(checked)
+        for layer_name in renderer.orderLayerNames(layer_names):
+            actors = self._actor_index.getActorsOnLayer(layer_name)
+            try:
+                layer = renderer.getLayer(layer_name)
+            except render.UnknownLayer:
+                layer = None
+            if layer_name not in checked:
+                self._renderActors(actors, renderer, interval, the_profiler, layer)
+            elif dirty:
+                #
+                # Only redraw the actors in the dirty parts of the layer. An actor in more than one
+                # part is only moved on by the interval the first time so it animates at the right rate.
+                surface = layer.getSurface()
+                rendered = set()
+                for rect in layer.findDirtyRects(actors, camera):
+                    renderer.addDirtyRect(rect)
+                    surface.set_clip(rect)
+                    self._renderActors([actor for actor in actors if layer.isRenderedIn(actor, rect)],
+                        renderer, interval, the_profiler, layer, rendered)
+                surface.set_clip(None)
+            elif layer.needsRedraw(actors, camera):
+                self._renderActors(actors, renderer, interval, the_profiler, layer)
+        if the_profiler.enabled:
+            the_profiler.end()
+        #
+        self.processEvent((events.E_AFTER_RENDER, self))
+
+    def _renderActors(self, actors, renderer, interval, the_profiler, layer=None, rendered=None):
+        """Render the active and visible actors
+        
+        When the layer is given the actors that use the standard rendering
+        are batched together and blitted to the layer in one go. Actors with
+        their own rendering are rendered at full size when the layer is at a
+        lower resolution, unless they support the render scale.
+        
+        If a set is given then the ids of the actors are added to it and
+        actors that are already in it are rendered with no interval.
+        
+        """
+        camera = renderer.camera
+        queue = render.RenderQueue(layer.getSurface()) if layer else None
+        scaled = layer is not None and layer.scale != 1.0
+        full_size = False
+        for actor in actors:
             if actor.active and actor.visible:
-                profiler.PROFILER.start(actor, 'renderActor')
+                if the_profiler.enabled:
+                    the_profiler.start(actor, 'renderActor')
+                actor_interval = interval
+                if rendered is not None:
+                    if id(actor) in rendered:
+                        actor_interval = 0
+                    else:
+                        rendered.add(id(actor))
                 try:
-                    actor.renderTo(renderer, interval)
+                    if queue and _canQueueRender(actor):
+                        if full_size:
+                            layer.stopFullSize()
+                            full_size = False
+                        actor.queueRender(queue, layer, camera, actor_interval)
+                    else:
+                        if queue:
+                            queue.flush()
+                        #
+                        # Runs of actors that draw at screen size are drawn together and scaled once
+                        if scaled and not getattr(actor, 'supports_render_scale', False):
+                            self._warnFullSize(actor)
+                            if not full_size:
+                                layer.startFullSize(renderer)
+                                full_size = True
+                        elif full_size:
+                            layer.stopFullSize()
+                            full_size = False
+                        actor.renderTo(renderer, actor_interval)
                 except Exception, err:
                     self.log.error('Failed rendering "%s" actor "%s": %s' % (actor.tag, actor, err))
+                    if full_size:
+                        layer.stopFullSize()
                     raise
-                profiler.PROFILER.end()
-        #
-        self.processEvent((events.E_AFTER_RENDER, self))
+                if the_profiler.enabled:
+                    the_profiler.end()
+        if full_size:
+            layer.stopFullSize()
+        if queue:
+            queue.flush()
+
+    def _warnFullSize(self, actor):
+        """Warn the first time an actor class has to be rendered at full size and scaled"""
+        cls = actor.__class__
+        if cls not in _warned_full_size:
+            _warned_full_size.add(cls)
+            self.log.warning('Actor class %s does not support rendering at a lower resolution so it is '
+                'rendered at full size and scaled, which is slow - set supports_render_scale if it '
+                'renders using RenderingLayer.renderVisual' % cls.__name__)
 
     def setZoom(self, zoom, x, y):
         """Set the visual zoom on this world to zoom centered on x, y"""
@@ -322,9 +717,9 @@ class World(common.Loggable, serialize.Serializable, common.EventAware):
         
         """
         for actor in actors:
-            for z in self.zones:
-                if z.hasActor(actor):
-                    z.sleepActor(actor)
+            z = self._actor_zones.get(actor)
+            if z is not None:
+                z.sleepActor(actor)
 
     def wakePhysicsForActors(self, actors):
         """Tell the actors to go to wake up from a physics perspective 
@@ -334,8 +729,69 @@ class World(common.Loggable, serialize.Serializable, common.EventAware):
         
         """
         for actor in actors:
-            for z in self.zones:
-                if z.hasActor(actor):
-                    z.wakeActor(actor)
+            z = self._actor_zones.get(actor)
+            if z is not None:
+                z.wakeActor(actor)
+        
         
+
+
+class ActorBatch(object):
+    """A batch of actors to add to and remove from a world
+    
+    Create these using World.batch().
+    
+    """
+    
+    def __init__(self, world):
+        """Initialise the ActorBatch"""
+        self.world = world
+        self.added = collections.OrderedDict()
+        self.removed = collections.OrderedDict()
+        self._depth = 0
+        
+    def addActor(self, actor):
+        """Add an actor when the batch closes"""
+        if actor in self.removed:
+            del(self.removed[actor])
+        elif actor in self.added:
+            raise DuplicateActor('The actor %s is already in the batch' % actor.getNiceName())
+        else:
+            self.added[actor] = True
         
+    def removeActor(self, actor):
+        """Remove an actor when the batch closes"""
+        if actor in self.added:
+            del(self.added[actor])
+        else:
+            self.removed[actor] = True
+        
+    def __enter__(self):
+        """Open the batch"""
+        self._depth += 1
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the batch and apply the changes unless there was an error"""
+        self._depth -= 1
+        if self._depth == 0:
+            self.world._batch = None
+            if exc_type is None:
+                self.world.removeActors(self.removed.keys())
+                self.world.addActors(self.added.keys())
+
+
+# Actor classes whose rendering can be queued by the world - those that do not override renderTo
+_queueable = {}
+
+# Actor classes that have been warned about being rendered at full size at a lower resolution
+_warned_full_size = set()
+
+def _canQueueRender(an_actor):
+    """Return True if the rendering of an actor can be added to a render queue"""
+    cls = an_actor.__class__
+    try:
+        return _queueable[cls]
+    except KeyError:
+        result = _queueable[cls] = getattr(cls.renderTo, 'im_func', None) is actor.Actor.renderTo.im_func
+        return result
@@ -29,8 +29,14 @@ class Zone(geometry.Rectangle, common.Loggable):
         serialize.F('physics_stepsize', 10.0, 'the size of physics steps in ms'),
         serialize.L('global_force', (0,0), 'the global force for physics'),
         serialize.F('_rtf', 1.0, 'debugging aid to slow down physics'),
+        serialize.F('lod_distance', 0.0, 'distance from the camera after which we update less often (0=never)'),
+        serialize.F('lod_interval', 0.0, 'the time between updates when we are far from the camera'),
+        serialize.F('freeze_distance', 0.0, 'distance from the camera after which we do not update (0=never)'),
     )
     
+    # The world we are in - set by the world
+    _world = None
+    
     def __init__(self):
         """Initialise the zone"""
         super(Zone, self).__init__()
@@ -42,6 +48,10 @@ class Zone(geometry.Rectangle, common.Loggable):
         self.clearActors()
         self._initPhysics()
         self._rtf = 1.0 # A debugging aid to slow down physics
+        self.lod_distance = 0.0
+        self.lod_interval = 0.0
+        self.freeze_distance = 0.0
+        self._lod_accumulator = 0.0
 
     ### Serializing ###
     
@@ -51,6 +61,7 @@ class Zone(geometry.Rectangle, common.Loggable):
         self.log.info('Initializing zone %s' % self)
         super(Zone, self).init()
         self._initPhysics()
+        self._lod_accumulator = 0.0
         for actor in self.actors:
             actor.init()
             if actor.getPhysical():
@@ -63,19 +74,76 @@ class Zone(geometry.Rectangle, common.Loggable):
     def updateZone(self, interval, world):
         """Update the objects in the zone"""
         #
+        # Far away zones may update less often or not at all
+        if self.lod_distance or self.freeze_distance:
+            interval = self._getLODInterval(interval, world)
+            if interval is None:
+                return
+        #
         # Iterate through actors - use a list of the actors
         # in case the actor wants to update the list of
         # actors during this iteration
-        for actor in list(self.actors):
-            if actor.active:
-                profiler.PROFILER.start(actor, 'updateActor')
-                actor.updateActor(interval, world)
-                profiler.PROFILER.end()
-        #
-        # Do physics if we need to
-        if self._physics_objects:
-            self.updatePhysics(interval)
+        the_profiler = world.getProfiler() if world else profiler.NULL_PROFILER
+        if the_profiler.enabled:
+            the_profiler.start(None, 'updateZone')
+            for actor in list(self.actors):
+                if actor.active:
+                    the_profiler.start(actor, 'updateActor')
+                    actor.updateActor(interval, world)
+                    the_profiler.end()
+            #
+            # Do physics if we need to
+            if self._physics_objects:
+                the_profiler.start(None, 'updatePhysics')
+                self.updatePhysics(interval)
+                the_profiler.end()
+            the_profiler.end()
+        else:
+            for actor in list(self.actors):
+                if actor.active:
+                    actor.updateActor(interval, world)
+            #
+            # Do physics if we need to
+            if self._physics_objects:
+                self.updatePhysics(interval)
     
+    def setLOD(self, distance, interval, freeze_distance=0.0):
+        """Set the level of detail for updating the zone based on the distance from the camera
+        
+        :param distance: when the zone is further than this from the camera it is only updated 
+            every interval ms (0 to always update)
+        :param interval: the time between updates when far away. The update is for all the time
+            since the last update
+        :param freeze_distance: when the zone is further than this from the camera it is not updated
+            at all, including the physics (0 to never freeze)
+        
+        """
+        self.lod_distance = distance
+        self.lod_interval = interval
+        self.freeze_distance = freeze_distance
+        self._lod_accumulator = 0.0
+        
+    def _getLODInterval(self, interval, world):
+        """Return the interval to update by given our distance from the camera or None to skip the update"""
+        engine = world.getEngine() if world else None
+        if engine is None:
+            return interval
+        distance = self.getEdgeDistanceFrom(engine.getRenderer().getCamera())
+        #
+        if self.freeze_distance and distance > self.freeze_distance:
+            # Time stands still in frozen zones
+            self._lod_accumulator = 0.0
+            return None
+        elif self.lod_distance and distance > self.lod_distance:
+            self._lod_accumulator += interval
+            if self._lod_accumulator < self.lod_interval:
+                return None
+        else:
+            self._lod_accumulator += interval
+        #
+        interval, self._lod_accumulator = self._lod_accumulator, 0.0
+        return interval
+        
     def wouldContain(self, actor):
         """Return True if this zone would contain the actor as it is right now
         
@@ -94,6 +162,8 @@ class Zone(geometry.Rectangle, common.Loggable):
             self.actors.add(actor)
             if actor.getPhysical():
                 self._addPhysicalActor(actor)
+            if self._world is not None:
+                self._world.indexActor(actor, self)
 
     def hasActor(self, actor):
         """Return True if the actor is in this zone"""
@@ -106,6 +176,8 @@ class Zone(geometry.Rectangle, common.Loggable):
         except KeyError:
             raise ActorNotFound('The actor %s was not in the zone' % actor)       
         else:
+            if self._world is not None:
+                self._world.unindexActor(actor)
             if actor in self._physics_objects:
                 self._physics_objects.remove(actor)
                 p = actor.getPhysical()
@@ -123,8 +195,35 @@ class Zone(geometry.Rectangle, common.Loggable):
                 
     def clearActors(self):
         """Remove all actors"""
+        if self._world is not None:
+            for actor in self.actors:
+                self._world.unindexActor(actor)
         self.actors = set()
         
+    def setWorld(self, world):
+        """Set the world that we are in"""
+        self._world = world
+        
+    ### Spatial ###
+    
+    def setSpatial(self, x, y, w, h):
+        """Set the spatial details of the zone"""
+        super(Zone, self).setSpatial(x, y, w, h)
+        if self._world is not None:
+            self._world.zoneChanged(self)
+        
+    def moveTo(self, x, y, override_lock=False):
+        """Move the center of the zone to the given location"""
+        super(Zone, self).moveTo(x, y, override_lock)
+        if self._world is not None:
+            self._world.zoneChanged(self)
+        
+    def resizeBy(self, w, h):
+        """Resize the zone by the given extent"""
+        super(Zone, self).resizeBy(w, h)
+        if self._world is not None:
+            self._world.zoneChanged(self)
+        
     ### Finding ###
     
     def findActorByName(self, name):